@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Benchmark concurrent writers against the SQLite job queue.
+
+Each writer is its own process (as concurrent run_codex_task.sh runners are) and records
+``--jobs`` runs, one ``enqueue`` plus one ``update`` per run. Two access paths are timed on
+fresh databases:
+
+  per-call   the pre-JobQueue path: a new connection, the schema script and a commit for
+             every call, in the default rollback-journal mode with a 5s lock timeout
+  pooled     job_queue.JobQueue: one long-lived WAL connection per writer, schema set up once
+
+Locked-database failures are counted rather than fatal, since that is the failure mode the
+pooled path removes.
+
+Typical use:
+  benchmarks/bench_job_queue.py --writers 8 --jobs 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "future-plans" / "queue"))
+
+import job_queue  # noqa: E402
+
+MODES = ("per-call", "pooled")
+
+# The per-call path writes the original (schema v1) columns only.
+PER_CALL_INSERT_SQL = """
+    INSERT INTO jobs (task, status, repo, mode, tier, created_at, started_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def per_call_connect(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    job_queue._migrate_v1(conn)
+    conn.commit()
+    return conn
+
+
+def per_call_run(db_path: Path, writer: int, index: int) -> None:
+    conn = per_call_connect(db_path)
+    now_iso = job_queue.utc_now()
+    cur = conn.execute(PER_CALL_INSERT_SQL, (f"bench {writer}/{index}", "running", "/bench/repo", "codex", "low", now_iso, now_iso))
+    conn.commit()
+    job_id = cur.lastrowid
+    conn = per_call_connect(db_path)
+    conn.execute("UPDATE jobs SET status=?, completed_at=?, error=? WHERE id=?", ("completed", job_queue.utc_now(), "", job_id))
+    conn.commit()
+
+
+def writer_main(mode: str, db_path: Path, writer: int, jobs: int, start: Any, results: Any) -> None:
+    errors = 0
+    queue = job_queue.JobQueue(db_path) if mode == "pooled" else None
+    start.wait()
+    started = time.perf_counter()
+    for index in range(jobs):
+        try:
+            if queue is None:
+                per_call_run(db_path, writer, index)
+            else:
+                job_id = queue.enqueue(f"bench {writer}/{index}", status="running", repo="/bench/repo", mode="codex", tier="low")
+                queue.update_job(job_id, status="completed", exit_code=0)
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put((time.perf_counter() - started, errors))
+    if queue is not None:
+        queue.close()
+
+
+def bench_mode(mode: str, work_dir: Path, writers: int, jobs: int) -> dict[str, Any]:
+    db_path = work_dir / f"bench-{mode}.sqlite3"
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+    if mode == "pooled":
+        job_queue.JobQueue(db_path).close()
+    else:
+        per_call_connect(db_path).close()
+
+    ctx = multiprocessing.get_context("fork")
+    start = ctx.Barrier(writers + 1)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=writer_main, args=(mode, db_path, w, jobs, start, results)) for w in range(writers)]
+    for proc in procs:
+        proc.start()
+    start.wait()
+    started = time.perf_counter()
+    outcomes = [results.get() for _ in procs]
+    wall = time.perf_counter() - started
+    for proc in procs:
+        proc.join()
+
+    errors = sum(e for _, e in outcomes)
+    runs = writers * jobs - errors
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT COUNT(*) FROM jobs WHERE status='completed'").fetchone()[0]
+    return {
+        "mode": mode,
+        "writers": writers,
+        "jobs": writers * jobs,
+        "completed_rows": rows,
+        "errors": errors,
+        "wall_s": round(wall, 4),
+        "runs_per_sec": round(runs / wall, 1) if wall > 0 else None,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark concurrent job queue writers (per-call vs pooled connections).")
+    parser.add_argument("--writers", type=int, default=8, help="Concurrent writer processes (default: 8)")
+    parser.add_argument("--jobs", type=int, default=200, help="Runs recorded per writer (default: 200)")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Comma-separated modes (default: {','.join(MODES)})")
+    parser.add_argument("--work-dir", type=Path, help="Where to keep the databases (default: a temp dir, removed afterwards)")
+    parser.add_argument("--out", type=Path, help="Write results JSON here")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = sorted(set(modes) - set(MODES))
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(unknown)}")
+    if args.writers < 1 or args.jobs < 1:
+        parser.error("--writers and --jobs must be at least 1")
+
+    temp_dir = None
+    work_dir = args.work_dir
+    if work_dir is None:
+        temp_dir = tempfile.TemporaryDirectory(prefix="codex-queue-bench-")
+        work_dir = Path(temp_dir.name)
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    results: dict[str, dict[str, Any]] = {}
+    try:
+        for mode in modes:
+            row = results[mode] = bench_mode(mode, work_dir, args.writers, args.jobs)
+            print(
+                f"{mode:<9} wall={row['wall_s']:>8.3f}s runs/s={row['runs_per_sec']:>9} "
+                f"errors={row['errors']} completed={row['completed_rows']}/{row['jobs']}",
+                file=sys.stderr,
+            )
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    report: dict[str, Any] = {
+        "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if {"per-call", "pooled"} <= results.keys() and results["per-call"]["runs_per_sec"]:
+        report["speedup"] = round(results["pooled"]["runs_per_sec"] / results["per-call"]["runs_per_sec"], 2)
+        print(f"speedup   {report['speedup']}x", file=sys.stderr)
+    payload = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(payload, encoding="utf-8")
+    else:
+        sys.stdout.write(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Benchmark the Codex summary pipeline against synthetic logs and track a JSON baseline.
+
+Each stage runs as its own process, exactly as run_codex_task.sh invokes it, so wall time
+includes interpreter start-up and peak RSS is the child's own high-water mark:
+
+  parse      codex-job/scripts/parse_codex_run.py --log <log> --meta <meta>
+  summarize  codex-job/scripts/summarize_codex_run.py --summary <summary>
+  minify     scripts/summary_minifier.py --input <summary>
+
+Typical use:
+  benchmarks/bench_pipeline.py --sizes 1K,1M,100M --write-baseline benchmarks/baseline.json
+  benchmarks/bench_pipeline.py --sizes 1K,1M,100M --compare benchmarks/baseline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Mapping
+
+from gen_codex_log import generate, parse_size
+
+ROOT = Path(__file__).resolve().parent.parent
+PARSER = ROOT / "codex-job" / "scripts" / "parse_codex_run.py"
+SUMMARIZER = ROOT / "codex-job" / "scripts" / "summarize_codex_run.py"
+MINIFIER = ROOT / "scripts" / "summary_minifier.py"
+
+DEFAULT_SIZES = "1K,100K,10M,100M"
+STAGES = ("parse", "summarize", "minify")
+BASELINE_VERSION = 1
+
+
+def run_stage(cmd: list[str], stdout_path: Path | None) -> tuple[float, int, int]:
+    """Run ``cmd`` and return (wall seconds, peak RSS in KB, exit code) for that child alone."""
+    stdout = stdout_path.open("wb") if stdout_path else subprocess.DEVNULL
+    try:
+        started = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=stdout, stderr=subprocess.DEVNULL)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - started
+    finally:
+        if stdout_path:
+            stdout.close()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return wall, rss_kb, proc.returncode
+
+
+def count_lines(path: Path) -> int:
+    lines = 0
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            lines += block.count(b"\n")
+    return lines
+
+
+def prepare_log(work_dir: Path, label: str, size: int, log_format: str, seed: int) -> tuple[Path, Path, int]:
+    """Generate (or reuse) the log and meta file for one size and return their paths and line count."""
+    log_path = work_dir / f"codex-run-bench-{label}-{log_format}-{seed}.log"
+    meta_path = log_path.with_name(log_path.name[: -len(".log")] + ".meta.json")
+    if not log_path.exists():
+        generate(log_path, size, seed=seed, log_format=log_format)
+    meta = {
+        "run_id": f"bench-{label}",
+        "repo": "/bench/repo",
+        "task": "benchmark",
+        "exit_code": 0,
+        "log_file": str(log_path),
+        "meta_file": str(meta_path),
+        "log_format": log_format,
+    }
+    meta_path.write_text(json.dumps(meta), encoding="utf-8")
+    return log_path, meta_path, count_lines(log_path)
+
+
+def bench_size(work_dir: Path, label: str, size: int, log_format: str, seed: int, repeat: int) -> dict[str, dict[str, Any]]:
+    log_path, meta_path, log_lines = prepare_log(work_dir, label, size, log_format, seed)
+    summary_path = log_path.with_name(log_path.name[: -len(".log")] + ".summary.json")
+    commands = {
+        "parse": ([sys.executable, str(PARSER), "--log", str(log_path), "--meta", str(meta_path)], summary_path),
+        "summarize": ([sys.executable, str(SUMMARIZER), "--summary", str(summary_path)], None),
+        "minify": ([sys.executable, str(MINIFIER), "--input", str(summary_path)], None),
+    }
+
+    results: dict[str, dict[str, Any]] = {}
+    for stage in STAGES:
+        cmd, stdout_path = commands[stage]
+        walls: list[float] = []
+        peak_rss = 0
+        for _ in range(repeat):
+            wall, rss_kb, code = run_stage(cmd, stdout_path)
+            if code != 0:
+                raise RuntimeError(f"{stage} failed on {log_path} with exit code {code}")
+            walls.append(wall)
+            peak_rss = max(peak_rss, rss_kb)
+        input_path = log_path if stage == "parse" else summary_path
+        lines = log_lines if stage == "parse" else count_lines(input_path)
+        wall = min(walls)
+        results[f"{stage}:{label}"] = {
+            "stage": stage,
+            "size": label,
+            "bytes": input_path.stat().st_size,
+            "lines": lines,
+            "wall_s": round(wall, 4),
+            "rss_kb": peak_rss,
+            "lines_per_sec": round(lines / wall, 1) if wall > 0 else None,
+        }
+    return results
+
+
+def compare(
+    results: Mapping[str, Mapping[str, Any]],
+    baseline: Mapping[str, Any],
+    tolerance: float,
+    min_wall_delta: float,
+) -> list[str]:
+    """Return one message per metric that regressed beyond ``tolerance`` relative to ``baseline``."""
+    regressions: list[str] = []
+    base_results = baseline.get("results") or {}
+    for key, current in results.items():
+        base = base_results.get(key)
+        if not isinstance(base, Mapping):
+            continue
+        base_wall = float(base.get("wall_s") or 0)
+        wall = float(current["wall_s"])
+        if wall > base_wall * (1 + tolerance) and wall - base_wall > min_wall_delta:
+            regressions.append(f"{key}: wall {base_wall:.3f}s -> {wall:.3f}s")
+        base_rss = int(base.get("rss_kb") or 0)
+        rss = int(current["rss_kb"])
+        if base_rss and rss > base_rss * (1 + tolerance):
+            regressions.append(f"{key}: rss {base_rss}KB -> {rss}KB")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark parse/summarize/minify on synthetic Codex logs.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma-separated log sizes (default: {DEFAULT_SIZES}; up to 1G)")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text", help="Synthetic log format (default: text)")
+    parser.add_argument("--seed", type=int, default=0, help="Generator seed (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest wall time is kept (default: 3)")
+    parser.add_argument("--work-dir", type=Path, help="Where to keep generated logs (default: a temp dir, removed afterwards)")
+    parser.add_argument("--out", type=Path, help="Write this run's results JSON here")
+    parser.add_argument("--write-baseline", type=Path, help="Write results as the new baseline JSON")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown/RSS growth (default: 0.25)")
+    parser.add_argument(
+        "--min-wall-delta",
+        type=float,
+        default=0.05,
+        help="Ignore wall-time regressions smaller than this many seconds (default: 0.05)",
+    )
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    sizes = [(label.strip().upper(), parse_size(label)) for label in args.sizes.split(",") if label.strip()]
+
+    temp_dir = None
+    work_dir = args.work_dir
+    if work_dir is None:
+        temp_dir = tempfile.TemporaryDirectory(prefix="codex-bench-")
+        work_dir = Path(temp_dir.name)
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    results: dict[str, dict[str, Any]] = {}
+    try:
+        for label, size in sizes:
+            size_results = bench_size(work_dir, label, size, args.format, args.seed, args.repeat)
+            for key, row in size_results.items():
+                print(
+                    f"{key:<18} wall={row['wall_s']:>8.3f}s rss={row['rss_kb']:>8}KB "
+                    f"lines={row['lines']:>10} lines/s={row['lines_per_sec']}",
+                    file=sys.stderr,
+                )
+            results.update(size_results)
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    report = {
+        "v": BASELINE_VERSION,
+        "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "format": args.format,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    payload = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    for path in (args.out, args.write_baseline):
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(payload, encoding="utf-8")
+    if not args.out and not args.write_baseline:
+        sys.stdout.write(payload)
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance, args.min_wall_delta)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%}).", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Generate synthetic Codex run logs for parser benchmarks.
+
+Logs mimic what run_codex_task.sh captures: a runner header, long stretches of agent
+prose and tool output, intermediate "tokens used" checkpoints, and the final usage/cost
+lines near the end followed by the runner trailer. The noise deliberately contains "$",
+"tokens", "cost" and "usd" in places the parser must reject, plus adversarial long lines
+that stress the regex engine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+from pathlib import Path
+from typing import TextIO
+
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+NOISE_LINES = [
+    "thinking: the fix touches parse_codex_run.py and the runner trailer",
+    "exec bash -lc 'rg -n \"tokens\" codex-job/scripts' in /repo succeeded in 42ms:",
+    "This refactor saves $5 of API spend per run and far fewer tokens overall.",
+    "The word tokens appears here, as do input and output, but never as a field.",
+    "Estimated savings: about $120/month if cost per token stays flat.",
+    "Total: 3 files changed, 41 insertions(+), 7 deletions(-)",
+    "codex: I'll update the tests so the total cost of a retry is covered.",
+    "diff --git a/README.md b/README.md",
+    "+- `--json-events` prints usage; the usd value is reported separately.",
+    "  File \"/repo/app.py\", line 88, in handle_tokens",
+    "tool output: {\"status\": \"ok\", \"elapsed_ms\": 1532, \"items\": [1, 2, 3]}",
+    "prices in $USD: input 0.10 / output 0.40 per 1k tokens (see available_models.jsonl)",
+    "Ran 212 tests in 4.031s — OK (skipped=3)",
+    "grep: cost_usd not found in summarize_codex_run.py",
+    "user wants fewer tokens used by the summary, so keep keys short",
+]
+
+# Long lines full of near-misses: each fragment starts like a field but never completes.
+ADVERSARIAL_FRAGMENTS = [
+    "tokens ",
+    "input_tokens ",
+    "cost ",
+    "usd ",
+    "total tokens ",
+    "\"input_tokens\" ",
+    "in= tok ",
+    "$ ",
+    "estimated_cost ",
+]
+
+HEADER_TEMPLATE = [
+    "codex_run_id={run_id}",
+    "log_file=runs/codex-run-{run_id}.log",
+    "meta_file=runs/codex-run-{run_id}.meta.json",
+    "summary_file_pending=runs/codex-run-{run_id}.summary.json",
+    "session id: {session}",
+]
+
+
+def parse_size(text: str) -> int:
+    match = re.fullmatch(r"\s*([0-9]+)\s*([KMG]?)B?\s*", text.upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r} (use e.g. 1K, 10M, 1G)")
+    return int(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+def _usage_lines(rng: random.Random, log_format: str) -> list[str]:
+    tokens_in = rng.randint(2_000, 400_000)
+    tokens_out = rng.randint(100, 40_000)
+    if log_format == "jsonl":
+        usage = {
+            "input_tokens": tokens_in,
+            "cached_input_tokens": tokens_in // 2,
+            "output_tokens": tokens_out,
+            "reasoning_output_tokens": tokens_out // 3,
+        }
+        return [json.dumps({"type": "turn.completed", "usage": usage}, separators=(",", ":"))]
+    return [
+        f"input_tokens: {tokens_in:,}",
+        f"output_tokens: {tokens_out:,}",
+        "tokens used",
+        f"{tokens_in + tokens_out:,}",
+        f"estimated_cost_usd: {rng.uniform(0.01, 4):.4f}",
+    ]
+
+
+def _noise_line(rng: random.Random, log_format: str) -> str:
+    line = rng.choice(NOISE_LINES)
+    if log_format == "jsonl":
+        return json.dumps({"type": "item.completed", "item": {"type": "agent_message", "text": line}}, separators=(",", ":"))
+    return line
+
+
+def _adversarial_line(rng: random.Random, length: int) -> str:
+    parts: list[str] = []
+    total = 0
+    while total < length:
+        fragment = rng.choice(ADVERSARIAL_FRAGMENTS)
+        parts.append(fragment)
+        total += len(fragment)
+    return "".join(parts)
+
+
+def write_log(
+    out: TextIO,
+    size: int,
+    *,
+    seed: int = 0,
+    log_format: str = "text",
+    long_line_every: int = 2_000,
+    long_line_bytes: int = 256 << 10,
+) -> int:
+    """Write roughly ``size`` bytes of synthetic log to ``out`` and return the line count."""
+    rng = random.Random(seed)
+    run_id = f"20260101-000000-{seed:06d}"
+    lines = [template.format(run_id=run_id, session=f"0199a213-81c0-7800-8aa1-{seed:012d}") for template in HEADER_TEMPLATE]
+    trailer = [f"codex_run_id={run_id}", "codex_exit_code=0", "cache_status=miss"]
+    final_usage = _usage_lines(rng, log_format)
+
+    written = 0
+    count = 0
+    reserve = sum(len(line) + 1 for line in final_usage + trailer)
+
+    def emit(line: str) -> None:
+        nonlocal written, count
+        out.write(line)
+        out.write("\n")
+        written += len(line) + 1
+        count += 1
+
+    for line in lines:
+        emit(line)
+
+    # Intermediate checkpoints are spread through the body so the last one is not the answer.
+    checkpoint_every = max(64 << 10, size // 8)
+    next_checkpoint = checkpoint_every
+    body_lines = 0
+    while written + reserve < size:
+        body_lines += 1
+        if long_line_every and body_lines % long_line_every == 0:
+            budget = size - reserve - written - 1
+            if budget > 0:
+                emit(_adversarial_line(rng, min(long_line_bytes, budget)))
+            continue
+        if written >= next_checkpoint and written + reserve * 2 < size:
+            for line in _usage_lines(rng, log_format):
+                emit(line)
+            next_checkpoint += checkpoint_every
+            continue
+        emit(_noise_line(rng, log_format))
+
+    for line in final_usage + trailer:
+        emit(line)
+    return count
+
+
+def generate(path: Path, size: int, **kwargs: object) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8", buffering=1 << 20) as out:
+        return write_log(out, size, **kwargs)  # type: ignore[arg-type]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic Codex run log for benchmarks.")
+    parser.add_argument("--size", type=parse_size, required=True, help="Approximate size, e.g. 1K, 10M, 1G")
+    parser.add_argument("--out", type=Path, required=True, help="Log path to write")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text", help="Plain text or codex exec --json events")
+    parser.add_argument("--long-line-every", type=int, default=2_000, help="Insert an adversarial long line every N lines (0 disables)")
+    parser.add_argument("--long-line-bytes", type=parse_size, default=256 << 10, help="Length of each adversarial line (default: 256K)")
+    args = parser.parse_args()
+
+    lines = generate(
+        args.out,
+        args.size,
+        seed=args.seed,
+        log_format=args.format,
+        long_line_every=args.long_line_every,
+        long_line_bytes=args.long_line_bytes,
+    )
+    print(json.dumps({"log": str(args.out), "bytes": args.out.stat().st_size, "lines": lines}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1054 @@
+#!/usr/bin/env python3
+"""Result cache manager for run_codex_task.sh.
+
+Each cache entry is a directory ``<cache_dir>/<key>/`` holding summary.json, meta.json and
+the run log, plus a ``manifest.json`` with each file's size (and sha256 for summary/meta).
+Entries are built in ``<cache_dir>/.staging/`` and published with one directory rename, and
+removed by renaming them into ``.trash/`` first, so readers (which validate the manifest)
+never see a half-written entry and concurrent writers never interleave. Logs are stored
+once, compressed, under ``<cache_dir>/objects/`` by the sha256 of their content, and
+hardlinked into each entry as ``log.txt.zst`` (Python 3.14+) or ``log.txt.gz``; removing
+an entry deletes its object once no other entry links to it. The hit path only reads
+summary.json. ``codex_cache.py log <key>`` decompresses a log on demand. A
+SQLite index (``<cache_dir>/index.sqlite3``) records every entry's size, store time and
+last hit, so lookups update recency with one row write and eviction never has to walk the
+cache directory.
+
+Limits (0 disables a limit):
+  CODEX_CACHE_MAX_BYTES    total size, e.g. 500M or 2G (default: 1G)
+  CODEX_CACHE_MAX_ENTRIES  number of entries (default: 1000)
+  CODEX_CACHE_TTL_SECONDS  age since the entry was stored (default: 30 days)
+
+Expired entries go first, then least recently used ones until both size and count fit.
+The index also keeps each looked-up key's parts (repo, head, dirty state, model, task hash,
+...), so a miss can name the parts that differ from the closest stored entry.
+
+Identical concurrent runs are coalesced ("single flight"): the first runner to miss takes
+an flock on ``<cache_dir>/inflight/<key>.lock`` and holds it until its entry is stored;
+later runners wait on the lock and then re-check the cache. The kernel drops the lock when
+the holder exits, so a crashed runner hands the key to the next waiter.
+
+Lookups, stores and evictions are appended to ``<cache_dir>/events.jsonl``.
+``codex_cache.py stats`` reports hit rates and the time and money hits saved. It folds new
+events into ``events.rollup.json`` incrementally, so it never re-reads the whole log.
+Run ``codex_cache.py gc`` to apply the limits (and reconcile the index) on demand; it also
+compresses plain ``log.txt`` files left by older entries and prunes unreferenced objects.
+"""
+
+from __future__ import annotations
+
+import argparse
+import errno
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator, Mapping, Sequence
+
+import summary_schema
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    zstd = None
+
+INDEX_NAME = "index.sqlite3"
+# PRAGMA user_version of an index whose tables match ensure_schema; bump it when they change.
+INDEX_VERSION = 1
+OBJECTS_DIR = "objects"
+INFLIGHT_DIR = "inflight"
+STAGING_DIR = ".staging"
+TRASH_DIR = ".trash"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+EVENTS_NAME = "events.jsonl"
+ROLLUP_NAME = "events.rollup.json"
+ROLLUP_VERSION = 2
+STATS_DIMENSIONS = ("repo", "tier", "model")
+DEFAULT_MODELS_FILE = Path(__file__).resolve().parent.parent / "references" / "available_models.jsonl"
+ENTRY_FILES = ("summary.json", "meta.json")
+# Compressed log links first; plain log.txt is what entries stored before compression hold.
+LOG_NAMES = ("log.txt.zst", "log.txt.gz", "log.txt")
+LOG_SUFFIX = ".zst" if zstd is not None else ".gz"
+COPY_CHUNK = 1 << 20
+# Cache key parts in key-text order; a miss reports which of these changed.
+KEY_PARTS = ("repo", "head", "dirty", "mode", "model", "tier", "preamble", "task")
+ENTRY_NAME_RE = re.compile(r"[0-9a-f]{64}")
+
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+DEFAULT_MAX_BYTES = 1 << 30
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+
+
+def parse_size(text: str) -> int:
+    match = re.fullmatch(r"\s*([0-9]+)\s*([KMGT]?)B?\s*", text.upper())
+    if not match:
+        raise ValueError(f"invalid size: {text!r} (use e.g. 500M, 2G)")
+    return int(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+def _env_int(env: Mapping[str, str], name: str, default: int) -> int:
+    raw = env.get(name, "")
+    if raw == "":
+        return default
+    if not raw.isdigit():
+        raise ValueError(f"{name} must be a non-negative integer, got {raw!r}")
+    return int(raw)
+
+
+@dataclass(frozen=True)
+class CacheLimits:
+    max_bytes: int = DEFAULT_MAX_BYTES
+    max_entries: int = DEFAULT_MAX_ENTRIES
+    ttl_seconds: int = DEFAULT_TTL_SECONDS
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str] = os.environ) -> "CacheLimits":
+        raw_bytes = env.get("CODEX_CACHE_MAX_BYTES", "")
+        return cls(
+            max_bytes=parse_size(raw_bytes) if raw_bytes else DEFAULT_MAX_BYTES,
+            max_entries=_env_int(env, "CODEX_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+            ttl_seconds=_env_int(env, "CODEX_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS),
+        )
+
+
+def default_cache_dir(env: Mapping[str, str] = os.environ) -> Path:
+    """Mirror resolve_cache_dir in run_codex_task.sh."""
+    if env.get("CODEX_CACHE_DIR"):
+        return Path(env["CODEX_CACHE_DIR"])
+    if env.get("XDG_CACHE_HOME"):
+        return Path(env["XDG_CACHE_HOME"]) / "codex-job"
+    return Path(env.get("HOME") or ".").expanduser() / ".cache" / "codex-job"
+
+
+def connect(cache_dir: Path) -> sqlite3.Connection:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Concurrent runs share the index; wait for their short write transactions.
+    conn = sqlite3.connect(cache_dir / INDEX_NAME, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if conn.execute("PRAGMA user_version").fetchone()[0] < INDEX_VERSION:
+        ensure_schema(conn)
+    return conn
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Create the index tables (idempotent, so racing first opens are harmless) and stamp the version."""
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            bytes INTEGER NOT NULL,
+            stored_at REAL NOT NULL,
+            last_hit_at REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_last_hit ON entries(last_hit_at);
+        CREATE INDEX IF NOT EXISTS idx_entries_stored ON entries(stored_at);
+        CREATE TABLE IF NOT EXISTS key_parts (
+            key TEXT PRIMARY KEY,
+            repo TEXT NOT NULL,
+            head TEXT,
+            dirty TEXT,
+            mode TEXT,
+            model TEXT,
+            tier TEXT,
+            preamble TEXT,
+            task TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_key_parts_repo ON key_parts(repo);
+        """
+        f"PRAGMA user_version = {INDEX_VERSION};"
+    )
+    conn.commit()
+
+
+@contextmanager
+def open_index(cache_dir: Path) -> Iterator[sqlite3.Connection]:
+    """Yield an index connection inside one transaction, then close it."""
+    conn = connect(cache_dir)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def entry_log(path: Path) -> Path | None:
+    for name in LOG_NAMES:
+        if (path / name).is_file():
+            return path / name
+    return None
+
+
+def read_manifest(path: Path) -> dict | None:
+    try:
+        manifest = json.loads((path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return manifest if isinstance(manifest, dict) and isinstance(manifest.get("files"), dict) else None
+
+
+def write_manifest(path: Path, key: str, log: Path, log_sha256: str) -> None:
+    """Describe the entry in ``path``: size and sha256 of summary/meta, size and content hash of the log.
+
+    The log is checked by size only; its sha256 is of the uncompressed content (its object name).
+    """
+    files = {name: {"bytes": (path / name).stat().st_size, "sha256": _file_sha256(path / name)} for name in ENTRY_FILES}
+    files[log.name] = {"bytes": log.stat().st_size, "content_sha256": log_sha256}
+    manifest = {"v": MANIFEST_VERSION, "key": key, "files": files}
+    (path / MANIFEST_NAME).write_text(json.dumps(manifest, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def manifest_valid(path: Path, manifest: Mapping) -> bool:
+    if manifest.get("key") != path.name:
+        return False
+    files = manifest["files"]
+    if not all(name in files for name in ENTRY_FILES) or not any(name in files for name in LOG_NAMES):
+        return False
+    for name, expected in files.items():
+        try:
+            if not isinstance(expected, Mapping) or (path / name).stat().st_size != expected.get("bytes"):
+                return False
+            if "sha256" in expected and _file_sha256(path / name) != expected["sha256"]:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def entry_complete(path: Path) -> bool:
+    """True if ``path`` holds a whole entry: its manifest validates, or (entries published
+    before manifests existed) all files are present and there is no manifest at all."""
+    if (path / MANIFEST_NAME).exists():
+        manifest = read_manifest(path)
+        return manifest is not None and manifest_valid(path, manifest)
+    return all((path / name).is_file() for name in ENTRY_FILES) and entry_log(path) is not None
+
+
+def _scratch_dir(cache_dir: Path, area: str, name: str) -> Path:
+    root = cache_dir / area
+    root.mkdir(parents=True, exist_ok=True)
+    path = Path(tempfile.mkdtemp(prefix=f"{name}.", dir=root))
+    # mkdtemp creates 0700; published entries should be as readable as ones made by mkdir.
+    path.chmod(0o755)
+    return path
+
+
+def prune_scratch(cache_dir: Path, older_than: float, dry_run: bool = False) -> int:
+    """Delete staging/trash directories left by writers that died before cleaning up."""
+    removed = 0
+    for area in (STAGING_DIR, TRASH_DIR):
+        root = cache_dir / area
+        if not root.is_dir():
+            continue
+        for child in root.iterdir():
+            try:
+                if child.stat().st_mtime >= older_than:
+                    continue
+            except OSError:
+                continue
+            removed += 1
+            if not dry_run:
+                shutil.rmtree(child, ignore_errors=True)
+    return removed
+
+
+def discard(cache_dir: Path, path: Path) -> None:
+    """Remove an entry directory: rename it out of place first, then delete it.
+
+    The entry's log object goes with it if no other entry links to it.
+    """
+    trash = _scratch_dir(cache_dir, TRASH_DIR, path.name)
+    try:
+        os.rename(path, trash / path.name)
+    except FileNotFoundError:
+        pass
+    obj = entry_object(cache_dir, trash / path.name)
+    shutil.rmtree(trash, ignore_errors=True)
+    if obj is not None:
+        release_object(obj)
+
+
+def publish(cache_dir: Path, key: str, staging: Path, replace: bool = False) -> bool:
+    """Move a staged entry into place with one rename; return False if another writer won.
+
+    An existing complete entry is kept unless ``replace``; an incomplete one is discarded.
+    """
+    path = cache_dir / key
+    for _ in range(3):
+        try:
+            os.rename(staging, path)
+            return True
+        except OSError as exc:
+            if exc.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                raise
+        if not replace and entry_complete(path):
+            return False
+        discard(cache_dir, path)
+    return False
+
+
+def open_log(path: Path) -> BinaryIO:
+    """Open a cached log for reading, decompressing by suffix."""
+    if path.suffix == ".zst":
+        if zstd is None:
+            raise RuntimeError(f"{path} is zstd-compressed; reading it needs Python 3.14+")
+        return zstd.open(path, "rb")
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    return path.open("rb")
+
+
+def _compress_to(source: BinaryIO, dest: Path) -> None:
+    if zstd is not None:
+        out = zstd.open(dest, "wb")
+    else:
+        # mtime=0 keeps the bytes a pure function of the log content.
+        out = gzip.GzipFile(dest, "wb", compresslevel=6, mtime=0)
+    with out:
+        shutil.copyfileobj(source, out, COPY_CHUNK)
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(COPY_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def object_path(cache_dir: Path, digest: str, suffix: str = LOG_SUFFIX) -> Path:
+    return cache_dir / OBJECTS_DIR / digest[:2] / f"{digest}{suffix}"
+
+
+def entry_object(cache_dir: Path, path: Path) -> Path | None:
+    """The object the entry at ``path`` links its log from, as named by its manifest."""
+    manifest = read_manifest(path)
+    if manifest is None:
+        return None
+    for name in LOG_NAMES[:-1]:
+        info = manifest["files"].get(name)
+        digest = info.get("content_sha256") if isinstance(info, Mapping) else None
+        if isinstance(digest, str) and ENTRY_NAME_RE.fullmatch(digest):
+            return object_path(cache_dir, digest, Path(name).suffix)
+    return None
+
+
+def release_object(obj: Path) -> None:
+    """Delete one log object if no entry links to it any more; ``gc`` sweeps the rest."""
+    try:
+        if obj.stat().st_nlink == 1:
+            obj.unlink()
+    except OSError:
+        pass
+
+
+def link_log(cache_dir: Path, source: Path, dest_dir: Path) -> tuple[Path, str]:
+    """Link the content-addressed compressed copy of ``source`` into ``dest_dir``.
+
+    The object is compressed only when no entry holds the same log yet. A new object is
+    linked into the entry before it is renamed into ``objects/``, so it never sits there
+    unreferenced where a concurrent prune could take it. Filesystems without hardlinks get
+    a private copy instead. Returns the linked path and the log's sha256.
+    """
+    digest = _file_sha256(source)
+    obj = object_path(cache_dir, digest)
+    dest = dest_dir / f"log.txt{LOG_SUFFIX}"
+    for name in LOG_NAMES:
+        (dest_dir / name).unlink(missing_ok=True)
+    try:
+        os.link(obj, dest)
+        return dest, digest
+    except FileNotFoundError:
+        pass
+    except OSError:
+        shutil.copyfile(obj, dest)
+        return dest, digest
+
+    obj.parent.mkdir(parents=True, exist_ok=True)
+    tmp = obj.with_name(f".{obj.name}.{os.getpid()}.tmp")
+    with source.open("rb") as handle:
+        _compress_to(handle, tmp)
+    try:
+        os.link(tmp, dest)
+    except OSError:
+        shutil.copyfile(tmp, dest)
+    os.replace(tmp, obj)
+    return dest, digest
+
+
+def prune_objects(cache_dir: Path, dry_run: bool = False) -> tuple[int, int]:
+    """Delete log objects no entry links to; return (objects, bytes) removed."""
+    root = cache_dir / OBJECTS_DIR
+    if not root.is_dir():
+        return 0, 0
+    count = total = 0
+    for shard in root.iterdir():
+        if not shard.is_dir():
+            continue
+        for obj in shard.iterdir():
+            if obj.name.startswith("."):
+                continue
+            try:
+                info = obj.stat()
+            except OSError:
+                continue
+            if info.st_nlink > 1:
+                continue
+            count += 1
+            total += info.st_size
+            if not dry_run:
+                obj.unlink(missing_ok=True)
+    return count, total
+
+
+def dir_bytes(path: Path) -> int:
+    total = 0
+    for child in path.iterdir():
+        try:
+            total += child.stat().st_size
+        except OSError:
+            pass
+    return total
+
+
+def _register(conn: sqlite3.Connection, cache_dir: Path, key: str) -> sqlite3.Row:
+    """Index an entry written before the index existed, dated by its summary's mtime."""
+    path = cache_dir / key
+    stored_at = (path / "summary.json").stat().st_mtime
+    conn.execute(
+        "INSERT OR REPLACE INTO entries (key, bytes, stored_at, last_hit_at, hits) VALUES (?, ?, ?, ?, 0)",
+        (key, dir_bytes(path), stored_at, stored_at),
+    )
+    return conn.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+
+
+def remove_entry(conn: sqlite3.Connection, cache_dir: Path, key: str) -> None:
+    discard(cache_dir, cache_dir / key)
+    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+    conn.execute("DELETE FROM key_parts WHERE key = ?", (key,))
+
+
+def record_event(cache_dir: Path, event: Mapping[str, Any]) -> None:
+    """Append one event line to events.jsonl; analytics never fail a run."""
+    line = json.dumps({"ts": round(time.time(), 3), **event}, ensure_ascii=True, separators=(",", ":")) + "\n"
+    try:
+        # One O_APPEND write per event keeps concurrent runners' lines whole.
+        fd = os.open(cache_dir / EVENTS_NAME, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _summary_savings(summary_path: Path) -> dict[str, Any]:
+    """Original run time and token counts of an entry, as recorded in events."""
+    try:
+        summary = json.loads(summary_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(summary, dict):
+        return {}
+    tok = summary_schema.token_usage(summary)
+    return {
+        "time": summary_schema.coerce_int(summary_schema.pick(summary, "time")) or 0,
+        "in": summary_schema.coerce_int(tok.get("in")) or 0,
+        "out": summary_schema.coerce_int(tok.get("out")) or 0,
+        "tot": summary_schema.coerce_int(tok.get("tot")) or 0,
+    }
+
+
+def record_lookup(cache_dir: Path, key: str, hit: bool, reason: str, repo: str, tier: str, model: str) -> None:
+    """Record a run's final cache outcome; hits carry what the original run cost."""
+    event: dict[str, Any] = {"ev": "hit" if hit else "miss", "key": key, "reason": reason, "repo": repo, "tier": tier, "model": model}
+    if hit:
+        event.update(_summary_savings(cache_dir / key / "summary.json"))
+    record_event(cache_dir, event)
+
+
+def record_key_parts(conn: sqlite3.Connection, key: str, parts: Mapping[str, str | None]) -> None:
+    conn.execute(
+        f"INSERT OR REPLACE INTO key_parts (key, {', '.join(KEY_PARTS)}) VALUES (?{', ?' * len(KEY_PARTS)})",
+        (key, *(parts.get(name) for name in KEY_PARTS)),
+    )
+
+
+def explain_miss(conn: sqlite3.Connection, key: str, parts: Mapping[str, str | None]) -> str:
+    """Name the key parts that differ from the closest stored entry for the same repo.
+
+    Returns ``changed:<part>[,<part>...]``, or ``no_prior_entry`` when the repo has no
+    stored entries with recorded parts.
+    """
+    rows = conn.execute(
+        "SELECT p.*, e.last_hit_at FROM key_parts p JOIN entries e ON e.key = p.key WHERE p.repo = ? AND p.key != ?",
+        (parts.get("repo"), key),
+    ).fetchall()
+    best: Sequence[str] | None = None
+    best_rank: tuple[int, float] | None = None
+    for row in rows:
+        changed = [name for name in KEY_PARTS if row[name] != parts.get(name)]
+        rank = (len(changed), -row["last_hit_at"])
+        if best_rank is None or rank < best_rank:
+            best, best_rank = changed, rank
+    if best is None:
+        return "no_prior_entry"
+    return "changed:" + (",".join(best) or "none")
+
+
+def expired(row: sqlite3.Row, limits: CacheLimits, now: float) -> bool:
+    return bool(limits.ttl_seconds) and row["stored_at"] + limits.ttl_seconds <= now
+
+
+def lookup(
+    cache_dir: Path,
+    key: str,
+    limits: CacheLimits,
+    now: float | None = None,
+    parts: Mapping[str, str | None] | None = None,
+) -> tuple[bool, str]:
+    """Look up ``key``, recording a hit or dropping an expired/partial entry.
+
+    Returns (hit, reason): reason is ``hit``, ``expired``, ``incomplete``, or on a plain
+    miss what ``explain_miss`` says about ``parts`` (``no_prior_entry`` without them).
+    """
+    now = time.time() if now is None else now
+    path = cache_dir / key
+    with open_index(cache_dir) as conn:
+        if parts is not None:
+            record_key_parts(conn, key, parts)
+        row = conn.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+        if not entry_complete(path):
+            if row is not None:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return False, "incomplete"
+            return False, explain_miss(conn, key, parts) if parts is not None else "no_prior_entry"
+        if row is None:
+            row = _register(conn, cache_dir, key)
+        if expired(row, limits, now):
+            remove_entry(conn, cache_dir, key)
+            record_event(cache_dir, {"ev": "evict", "key": key, "bytes": row["bytes"], "cause": "ttl"})
+            if parts is not None:
+                record_key_parts(conn, key, parts)
+            return False, "expired"
+        conn.execute("UPDATE entries SET last_hit_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+    return True, "hit"
+
+
+def enforce(
+    conn: sqlite3.Connection,
+    cache_dir: Path,
+    limits: CacheLimits,
+    now: float,
+    keep: str | None = None,
+    dry_run: bool = False,
+) -> list[tuple[str, int]]:
+    """Evict expired entries, then LRU ones until size and count fit; return (key, bytes) evicted.
+
+    Works from the index alone: one aggregate query, and a walk in last-hit order only while
+    a limit is still exceeded.
+    """
+    count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+    evicted: list[tuple[str, int]] = []
+
+    def evict(key: str, size: int, cause: str) -> None:
+        nonlocal count, total
+        if not dry_run:
+            remove_entry(conn, cache_dir, key)
+            record_event(cache_dir, {"ev": "evict", "key": key, "bytes": size, "cause": cause})
+        evicted.append((key, size))
+        count -= 1
+        total -= size
+
+    if limits.ttl_seconds:
+        stale = conn.execute(
+            "SELECT key, bytes FROM entries WHERE stored_at <= ? AND key IS NOT ? ORDER BY stored_at",
+            (now - limits.ttl_seconds, keep),
+        ).fetchall()
+        for key, size in stale:
+            evict(key, size, "ttl")
+
+    def over() -> bool:
+        return bool(limits.max_entries and count > limits.max_entries) or bool(limits.max_bytes and total > limits.max_bytes)
+
+    if over():
+        gone = {key for key, _ in evicted}
+        lru = conn.execute("SELECT key, bytes FROM entries WHERE key IS NOT ? ORDER BY last_hit_at, key", (keep,)).fetchall()
+        for key, size in lru:
+            if not over():
+                break
+            if key not in gone:
+                evict(key, size, "lru")
+    return evicted
+
+
+def store(cache_dir: Path, key: str, sources: Mapping[str, Path], limits: CacheLimits, now: float | None = None) -> bool:
+    """Store a finished run in the cache and apply the limits; False if it cannot fit.
+
+    ``sources`` maps summary.json and meta.json to files to copy, and ``log`` to the run log.
+    Entry sizes count the compressed log, so entries sharing one log are each charged for it.
+    """
+    now = time.time() if now is None else now
+    staging = _scratch_dir(cache_dir, STAGING_DIR, key)
+    log_sha256 = None
+    try:
+        for name in ENTRY_FILES:
+            shutil.copyfile(sources[name], staging / name)
+        log, log_sha256 = link_log(cache_dir, sources["log"], staging)
+        write_manifest(staging, key, log, log_sha256)
+        size = dir_bytes(staging)
+        if limits.max_bytes and size > limits.max_bytes:
+            evicted = [(key, size)]
+        else:
+            # A concurrent writer may have published this key first; its entry is as good.
+            publish(cache_dir, key, staging)
+            with open_index(cache_dir) as conn:
+                stored_bytes = dir_bytes(cache_dir / key)
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, bytes, stored_at, last_hit_at, hits) VALUES (?, ?, ?, ?, 0)",
+                    (key, stored_bytes, now, now),
+                )
+                parts = conn.execute("SELECT repo, tier, model FROM key_parts WHERE key = ?", (key,)).fetchone()
+                event = {"ev": "store", "key": key, "bytes": stored_bytes, **(dict(parts) if parts else {})}
+                event["time"] = _summary_savings(sources["summary.json"]).get("time", 0)
+                record_event(cache_dir, event)
+                evicted = enforce(conn, cache_dir, limits, now, keep=key)
+    finally:
+        # Staging is still there only if the entry was never published; its log link may
+        # have been the only one to a new object.
+        unpublished = staging.exists()
+        shutil.rmtree(staging, ignore_errors=True)
+        if unpublished and log_sha256 is not None:
+            release_object(object_path(cache_dir, log_sha256))
+    return not any(evicted_key == key for evicted_key, _ in evicted)
+
+
+def inflight_path(cache_dir: Path, key: str) -> Path:
+    return cache_dir / INFLIGHT_DIR / f"{key}.lock"
+
+
+def try_claim(cache_dir: Path, key: str, owner: str) -> int | None:
+    """Take the single-flight lock for ``key`` without waiting; return its fd, or None if held.
+
+    ``owner`` is written into the lock file so waiting runners can say whom they wait on.
+    """
+    path = inflight_path(cache_dir, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    os.ftruncate(fd, 0)
+    os.pwrite(fd, owner.encode("utf-8"), 0)
+    return fd
+
+
+def claim_owner(cache_dir: Path, key: str) -> str:
+    try:
+        return inflight_path(cache_dir, key).read_text(encoding="utf-8").strip()
+    except OSError:
+        return ""
+
+
+def wait_claim(
+    cache_dir: Path,
+    key: str,
+    owner: str,
+    timeout: float,
+    abandoned: Callable[[], bool] = lambda: False,
+    poll: float = 0.2,
+) -> int | None:
+    """Poll for the single-flight lock until ``timeout`` seconds pass or ``abandoned()``."""
+    deadline = time.monotonic() + timeout
+    while True:
+        fd = try_claim(cache_dir, key, owner)
+        if fd is not None:
+            return fd
+        if time.monotonic() >= deadline or abandoned():
+            return None
+        time.sleep(poll)
+
+
+def release_claim(fd: int) -> None:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def prune_inflight(cache_dir: Path, older_than: float, dry_run: bool = False) -> int:
+    """Delete unlocked lock files last touched before ``older_than``; return how many."""
+    root = cache_dir / INFLIGHT_DIR
+    if not root.is_dir():
+        return 0
+    removed = 0
+    for path in root.glob("*.lock"):
+        try:
+            if path.stat().st_mtime >= older_than:
+                continue
+            fd = os.open(path, os.O_RDWR)
+        except OSError:
+            continue
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        removed += 1
+        if not dry_run:
+            path.unlink(missing_ok=True)
+        release_claim(fd)
+    return removed
+
+
+def compress_plain_logs(conn: sqlite3.Connection, cache_dir: Path, dry_run: bool = False) -> int:
+    """Move plain log.txt files from older entries into compressed objects; return how many."""
+    converted = 0
+    for row in conn.execute("SELECT key FROM entries").fetchall():
+        path = cache_dir / row["key"]
+        if entry_log(path) != path / "log.txt":
+            continue
+        converted += 1
+        if dry_run:
+            continue
+        # Rebuild the entry with a manifest and swap it in whole, as store does.
+        staging = _scratch_dir(cache_dir, STAGING_DIR, row["key"])
+        try:
+            for name in ENTRY_FILES:
+                shutil.copyfile(path / name, staging / name)
+            log, log_sha256 = link_log(cache_dir, path / "log.txt", staging)
+            write_manifest(staging, row["key"], log, log_sha256)
+            publish(cache_dir, row["key"], staging, replace=True)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        conn.execute("UPDATE entries SET bytes = ? WHERE key = ?", (dir_bytes(path), row["key"]))
+    return converted
+
+
+def reconcile(conn: sqlite3.Connection, cache_dir: Path, dry_run: bool = False) -> tuple[int, int]:
+    """Drop index rows for missing entries and index complete entries the index lacks.
+
+    Returns (rows dropped, entries adopted). Only gc calls this; it walks the directory.
+    """
+    dropped = adopted = 0
+    indexed = {row["key"] for row in conn.execute("SELECT key FROM entries")}
+    for key in indexed:
+        if not entry_complete(cache_dir / key):
+            dropped += 1
+            if not dry_run:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+    if not dry_run:
+        conn.execute("DELETE FROM key_parts WHERE key NOT IN (SELECT key FROM entries)")
+    for child in cache_dir.iterdir():
+        if child.name in indexed or not child.is_dir() or not ENTRY_NAME_RE.fullmatch(child.name):
+            continue
+        if entry_complete(child):
+            adopted += 1
+            if not dry_run:
+                _register(conn, cache_dir, child.name)
+    return dropped, adopted
+
+
+def run_gc(args: argparse.Namespace) -> int:
+    try:
+        env_limits = CacheLimits.from_env()
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    limits = CacheLimits(
+        max_bytes=env_limits.max_bytes if args.max_bytes is None else args.max_bytes,
+        max_entries=env_limits.max_entries if args.max_entries is None else args.max_entries,
+        ttl_seconds=env_limits.ttl_seconds if args.ttl_seconds is None else args.ttl_seconds,
+    )
+    cache_dir = args.cache_dir or default_cache_dir()
+    if not cache_dir.is_dir():
+        print(f"cache_dir={cache_dir} cache_entries=0 cache_bytes=0 evicted=0 freed_bytes=0", file=sys.stderr)
+        return 0
+
+    with open_index(cache_dir) as conn:
+        dropped, adopted = reconcile(conn, cache_dir, args.dry_run)
+        evicted = enforce(conn, cache_dir, limits, time.time(), dry_run=args.dry_run)
+        compressed = compress_plain_logs(conn, cache_dir, args.dry_run)
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+    objects_pruned, objects_bytes = prune_objects(cache_dir, args.dry_run)
+    # Lock files are reused per key; an idle day-old one belongs to no running runner.
+    locks_pruned = prune_inflight(cache_dir, time.time() - 86400, args.dry_run)
+    scratch_pruned = prune_scratch(cache_dir, time.time() - 86400, args.dry_run)
+    if args.dry_run:
+        count -= len(evicted)
+        total -= sum(size for _, size in evicted)
+
+    for key, size in evicted:
+        print(f"{'would evict' if args.dry_run else 'evicted'} {key} bytes={size}")
+    print(
+        f"cache_dir={cache_dir} cache_entries={count} cache_bytes={total} evicted={len(evicted)} "
+        f"freed_bytes={sum(size for _, size in evicted)} index_dropped={dropped} index_adopted={adopted} "
+        f"logs_compressed={compressed} objects_pruned={objects_pruned} objects_freed_bytes={objects_bytes} "
+        f"locks_pruned={locks_pruned} scratch_pruned={scratch_pruned}"
+        + (" dry_run=1" if args.dry_run else ""),
+        file=sys.stderr,
+    )
+    return 0
+
+
+def run_log(args: argparse.Namespace) -> int:
+    cache_dir = args.cache_dir or default_cache_dir()
+    log = entry_log(cache_dir / args.key) if ENTRY_NAME_RE.fullmatch(args.key) else None
+    if log is None:
+        print(f"Error: no cached log for key: {args.key}", file=sys.stderr)
+        return 1
+    try:
+        with open_log(log) as handle:
+            shutil.copyfileobj(handle, sys.stdout.buffer, COPY_CHUNK)
+    except (OSError, RuntimeError) as exc:
+        print(f"Error: cannot read {log}: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def load_prices(models_file: Path) -> dict[str, tuple[float, float]]:
+    """Map model_id to (USD per 1k input tokens, USD per 1k output tokens)."""
+    prices: dict[str, tuple[float, float]] = {}
+    if not models_file.is_file():
+        return prices
+    with models_file.open(encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                model = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(model, dict) and model.get("model_id"):
+                prices[str(model["model_id"])] = (
+                    float(model.get("cost_per_1k_input_tokens") or 0),
+                    float(model.get("cost_per_1k_output_tokens") or 0),
+                )
+    return prices
+
+
+def _new_group() -> dict[str, int]:
+    return {
+        "hits": 0,
+        "misses": 0,
+        "saved_seconds": 0,
+        "saved_in": 0,
+        "saved_out": 0,
+        "unpriced_tokens": 0,
+        "stored": 0,
+        "stored_bytes": 0,
+    }
+
+
+def _new_row() -> dict[str, Any]:
+    return {**_new_group(), "saved_usd": 0.0, "unpriced_hits": 0}
+
+
+def _empty_rollup() -> dict[str, Any]:
+    return {"v": ROLLUP_VERSION, "offset": 0, "ino": None, "groups": {}, "reasons": {}, "evicted": 0, "evicted_bytes": 0}
+
+
+def _parse_events(data: bytes) -> list[dict[str, Any]]:
+    """Decode whole JSON lines; one array parse for the batch, per line only if one is bad."""
+    if not data:
+        return []
+    try:
+        events = json.loads(b"[" + data.rstrip(b"\n").replace(b"\n", b",") + b"]")
+    except ValueError:
+        events = []
+        for raw in data.splitlines():
+            try:
+                events.append(json.loads(raw))
+            except ValueError:
+                continue
+    return [event for event in events if isinstance(event, dict)]
+
+
+def update_rollup(cache_dir: Path, persist: bool = True) -> dict[str, Any]:
+    """Fold events appended since the last call into the saved rollup and return it.
+
+    Groups are keyed by the JSON list [repo, tier, model]. Only whole lines are consumed, so a
+    line a runner is still writing is picked up next time. The log is re-read from the start
+    if it was replaced or truncated.
+    """
+    events_path = cache_dir / EVENTS_NAME
+    rollup_path = cache_dir / ROLLUP_NAME
+    try:
+        rollup = json.loads(rollup_path.read_text(encoding="utf-8"))
+        if not isinstance(rollup, dict) or rollup.get("v") != ROLLUP_VERSION:
+            rollup = _empty_rollup()
+    except (OSError, ValueError):
+        rollup = _empty_rollup()
+    try:
+        info = events_path.stat()
+    except FileNotFoundError:
+        return _empty_rollup()
+    if rollup["ino"] != info.st_ino or rollup["offset"] > info.st_size:
+        rollup = _empty_rollup()
+    rollup["ino"] = info.st_ino
+
+    # Accumulate under tuple keys; serialising a key per event would dominate the loop.
+    groups: dict[tuple, dict[str, int]] = {tuple(json.loads(key)): group for key, group in rollup["groups"].items()}
+    reasons: dict[str, int] = rollup["reasons"]
+    with events_path.open("rb") as handle:
+        handle.seek(rollup["offset"])
+        data = handle.read()
+    end = data.rfind(b"\n") + 1
+    for event in _parse_events(data[:end]):
+        kind = event.get("ev")
+        if kind == "evict":
+            rollup["evicted"] += 1
+            rollup["evicted_bytes"] += int(event.get("bytes") or 0)
+            continue
+        group_key = (event.get("repo") or "unknown", event.get("tier") or "unknown", event.get("model") or "unknown")
+        group = groups.get(group_key)
+        if group is None:
+            group = groups[group_key] = _new_group()
+        if kind == "hit":
+            group["hits"] += 1
+            group["saved_seconds"] += int(event.get("time") or 0)
+            saved_in, saved_out = int(event.get("in") or 0), int(event.get("out") or 0)
+            group["saved_in"] += saved_in
+            group["saved_out"] += saved_out
+            # A log that only reported a total cannot be split into input and output prices.
+            if not saved_in and not saved_out:
+                group["unpriced_tokens"] += int(event.get("tot") or 0)
+        elif kind == "miss":
+            group["misses"] += 1
+            reason = str(event.get("reason") or "unknown")
+            reasons[reason] = reasons.get(reason, 0) + 1
+        elif kind == "store":
+            group["stored"] += 1
+            group["stored_bytes"] += int(event.get("bytes") or 0)
+    rollup["offset"] += end
+    rollup["groups"] = {json.dumps(list(key)): group for key, group in groups.items()}
+
+    if persist and end:
+        tmp = rollup_path.with_name(f".{rollup_path.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps(rollup, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, rollup_path)
+        except OSError:
+            pass
+    return rollup
+
+
+def summarize_groups(
+    rollup: Mapping[str, Any], prices: Mapping[str, tuple[float, float]], by: str | None = None
+) -> dict[str, dict[str, Any]]:
+    """Aggregate rollup groups by one dimension (or all together when ``by`` is None)."""
+    index = STATS_DIMENSIONS.index(by) if by else None
+    out: dict[str, dict[str, Any]] = {} if by else {"all": _new_row()}
+    for group_key, group in rollup["groups"].items():
+        dims = json.loads(group_key)
+        name = dims[index] if index is not None else "all"
+        row = out.setdefault(name, _new_row())
+        for field, value in group.items():
+            row[field] += value
+        price = prices.get(dims[STATS_DIMENSIONS.index("model")])
+        if price is None:
+            row["unpriced_hits"] += group["hits"]
+        else:
+            row["saved_usd"] += group["saved_in"] / 1000 * price[0] + group["saved_out"] / 1000 * price[1]
+    for row in out.values():
+        lookups = row["hits"] + row["misses"]
+        row["lookups"] = lookups
+        row["hit_rate"] = round(row["hits"] / lookups, 4) if lookups else None
+        row["saved_usd"] = round(row["saved_usd"], 6)
+    return out
+
+
+def _format_row(prefix: str, row: Mapping[str, Any]) -> str:
+    fields = ["lookups", "hits", "misses", "hit_rate", "stored", "stored_bytes", "saved_seconds", "saved_usd"]
+    if row["unpriced_hits"]:
+        fields.append("unpriced_hits")
+    if row["unpriced_tokens"]:
+        fields.append("unpriced_tokens")
+    hit_rate = row["hit_rate"]
+    values = {**row, "hit_rate": "n/a" if hit_rate is None else f"{hit_rate:.4f}", "saved_usd": f"{row['saved_usd']:.4f}"}
+    return prefix + " ".join(f"{field}={values[field]}" for field in fields)
+
+
+def run_stats(args: argparse.Namespace) -> int:
+    cache_dir = args.cache_dir or default_cache_dir()
+    rollup = update_rollup(cache_dir, persist=not args.no_save) if cache_dir.is_dir() else _empty_rollup()
+    prices = load_prices(args.models_file)
+    dimensions = args.by or list(STATS_DIMENSIONS)
+    total = summarize_groups(rollup, prices)["all"]
+
+    if args.json:
+        report = {
+            "cache_dir": str(cache_dir),
+            "total": total,
+            "evicted": rollup["evicted"],
+            "evicted_bytes": rollup["evicted_bytes"],
+            "miss_reasons": rollup["reasons"],
+            "by": {dim: summarize_groups(rollup, prices, dim) for dim in dimensions},
+        }
+        print(json.dumps(report, indent=2, sort_keys=True))
+        return 0
+
+    print(_format_row("", total) + f" evicted={rollup['evicted']} evicted_bytes={rollup['evicted_bytes']}")
+    if rollup["reasons"]:
+        ordered = sorted(rollup["reasons"].items(), key=lambda item: (-item[1], item[0]))
+        print("miss_reasons " + " ".join(f"{reason}={count}" for reason, count in ordered))
+    for dim in dimensions:
+        rows = summarize_groups(rollup, prices, dim)
+        for name in sorted(rows, key=lambda item: (-rows[item]["lookups"], item)):
+            print(_format_row(f"by={dim} {dim}={name} ", rows[name]))
+    return 0
+
+
+def _size_arg(text: str) -> int:
+    try:
+        return parse_size(text)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc)) from exc
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Manage the run_codex_task.sh result cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gc = sub.add_parser("gc", help="Evict expired and least recently used entries until the limits fit")
+    gc.add_argument("--cache-dir", type=Path, help="Cache directory (default: same resolution as run_codex_task.sh)")
+    gc.add_argument("--max-bytes", type=_size_arg, help="Override CODEX_CACHE_MAX_BYTES (0 disables)")
+    gc.add_argument("--max-entries", type=int, help="Override CODEX_CACHE_MAX_ENTRIES (0 disables)")
+    gc.add_argument("--ttl-seconds", type=int, help="Override CODEX_CACHE_TTL_SECONDS (0 disables)")
+    gc.add_argument("--dry-run", action="store_true", help="Report what would be evicted without deleting")
+    gc.set_defaults(func=run_gc)
+
+    stats = sub.add_parser("stats", help="Report hit rates and the time and money cache hits saved")
+    stats.add_argument("--cache-dir", type=Path, help="Cache directory (default: same resolution as run_codex_task.sh)")
+    stats.add_argument("--by", action="append", choices=STATS_DIMENSIONS, help="Break down by repo, tier or model (repeatable; default: all)")
+    stats.add_argument("--models-file", type=Path, default=DEFAULT_MODELS_FILE, help="Model registry with cost_per_1k_* prices")
+    stats.add_argument("--json", action="store_true", help="Print the report as JSON")
+    stats.add_argument("--no-save", action="store_true", help="Do not update events.rollup.json")
+    stats.set_defaults(func=run_stats)
+
+    log = sub.add_parser("log", help="Print a cached run log, decompressed")
+    log.add_argument("key", help="Cache key (the entry directory name)")
+    log.add_argument("--cache-dir", type=Path, help="Cache directory (default: same resolution as run_codex_task.sh)")
+    log.set_defaults(func=run_log)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""Long-lived helper process for run_codex_task.sh.
+
+The runner starts this once per run as a bash coprocess and sends it requests instead of
+spawning a fresh ``python3`` for every meta file, event, and summary it writes.
+
+Protocol (stdin/stdout, NUL-delimited):
+  request:  <command> NUL <key=value> NUL ... NUL NUL     (an empty field ends the request)
+  response: ok|error NUL <payload> NUL
+
+Every request carries the runner's current run state as ``key=value`` fields. The process
+ignores SIGINT/SIGTERM so the runner's own signal handling can still finalize the run, and
+exits when its stdin closes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator, Mapping
+
+import codex_cache
+import parse_codex_run
+import repo_fingerprint
+import summarize_codex_run
+import summary_schema
+import task_key
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_MODELS_FILE = SCRIPT_DIR.parent / "references" / "available_models.jsonl"
+DEFAULT_TIER_MODELS = {"low": "gpt-5.1-codex-mini", "medium": "gpt-5.4-mini", "high": "gpt-5.4-mini"}
+
+Fields = Mapping[str, str]
+
+
+class RequestError(Exception):
+    """A request that cannot be served; reported back to the runner as an ``error`` reply."""
+
+
+def _text(fields: Fields, key: str) -> str:
+    return fields.get(key, "")
+
+
+def _or_none(fields: Fields, key: str) -> str | None:
+    return fields.get(key) or None
+
+
+def _nullable(fields: Fields, key: str) -> str | None:
+    value = fields.get(key, "")
+    return None if value in ("", "unknown") else value
+
+
+def _int(fields: Fields, key: str, default: int) -> int:
+    value = fields.get(key, "")
+    if value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise RequestError(f"{key} must be an integer, got {value!r}") from exc
+
+
+def _nullable_int(fields: Fields, key: str) -> int | None:
+    try:
+        return int(fields.get(key, ""))
+    except ValueError:
+        return None
+
+
+def _dump_compact(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=True, separators=(",", ":"))
+
+
+def _write(path_text: str, content: str) -> None:
+    if not path_text:
+        raise RequestError("missing output path")
+    Path(path_text).write_text(content, encoding="utf-8")
+
+
+def model_for_tier(fields: Fields) -> str:
+    tier = _text(fields, "tier")
+    provider = _text(fields, "provider") or "openai"
+    models_file = Path(fields.get("models_file") or DEFAULT_MODELS_FILE)
+    if models_file.is_file():
+        with models_file.open(encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    model = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(model, dict) and model.get("tier") == tier and model.get("provider") == provider:
+                    return str(model["model_id"])
+    if tier not in DEFAULT_TIER_MODELS:
+        raise RequestError(f"unknown tier: {tier}")
+    return DEFAULT_TIER_MODELS[tier]
+
+
+def event_json(fields: Fields) -> str:
+    obj = {
+        "event": _text(fields, "event"),
+        "status": _text(fields, "event_status"),
+        "run_id": _nullable(fields, "run_id"),
+        "session_id": _nullable(fields, "session_id"),
+        "repo": _nullable(fields, "repo"),
+        "mode": _nullable(fields, "mode"),
+        "exit_code": _nullable_int(fields, "event_exit"),
+        "log_file": _nullable(fields, "log_file"),
+        "meta_file": _nullable(fields, "meta_file"),
+        "summary_file": _nullable(fields, "summary_file"),
+        "started_at": _nullable(fields, "started_at"),
+        "ended_at": _nullable(fields, "ended_at"),
+        "elapsed_seconds": _nullable_int(fields, "elapsed_seconds"),
+        "source": "run_codex_task.sh",
+        "ts": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    return json.dumps(obj, ensure_ascii=True)
+
+
+def write_meta(fields: Fields) -> str:
+    obj = {
+        "run_id": _text(fields, "run_id"),
+        "session_id": _nullable(fields, "session_id"),
+        "repo": _text(fields, "repo"),
+        "task": _or_none(fields, "task"),
+        "task_file": _or_none(fields, "task_file"),
+        "resume_session": _or_none(fields, "resume_session"),
+        "codex_bin": _text(fields, "codex_bin"),
+        "log_file": _text(fields, "log_file"),
+        "meta_file": _text(fields, "meta_file"),
+        "started_at": _text(fields, "started_at"),
+        "ended_at": _text(fields, "ended_at"),
+        "elapsed_seconds": _int(fields, "elapsed_seconds", 0),
+        "exit_code": _int(fields, "exit_code", 1),
+        "model": _or_none(fields, "model"),
+        "model_tier": _or_none(fields, "model_tier"),
+        "model_source": _or_none(fields, "model_source"),
+        "cache_status": _or_none(fields, "cache_status"),
+        "cache_key": _or_none(fields, "cache_key"),
+        "cache_reason": _or_none(fields, "cache_reason"),
+        "one_line_summary": _or_none(fields, "one_line_summary"),
+        "log_format": fields.get("log_format") or "text",
+    }
+    _write(_text(fields, "meta_file"), json.dumps(obj, ensure_ascii=True, indent=2) + "\n")
+    return ""
+
+
+def write_fallback_summary(fields: Fields) -> str:
+    exit_code = _int(fields, "exit_code", 1)
+    obj = {
+        "v": summary_schema.SUMMARY_VERSION,
+        "id": _text(fields, "run_id"),
+        "sid": _nullable(fields, "session_id"),
+        "repo": _text(fields, "repo"),
+        "task": _or_none(fields, "task"),
+        "resume": _or_none(fields, "resume_session"),
+        "start": _text(fields, "started_at"),
+        "end": _text(fields, "ended_at"),
+        "time": _int(fields, "elapsed_seconds", 0),
+        "exit": exit_code,
+        "ok": exit_code == 0,
+        "mdl": _or_none(fields, "model"),
+        "tier": _or_none(fields, "model_tier"),
+        "msrc": _or_none(fields, "model_source"),
+        "log": _text(fields, "log_file"),
+        "meta": _text(fields, "meta_file"),
+        "tok": None,
+        "cost": None,
+        "err": _or_none(fields, "err"),
+        "cache": {
+            "status": _or_none(fields, "cache_status"),
+            "key": _or_none(fields, "cache_key"),
+            "reason": _or_none(fields, "cache_reason"),
+        },
+        "src": "run_codex_task.sh",
+    }
+    _write(_text(fields, "summary_file"), _dump_compact(obj) + "\n")
+    return ""
+
+
+def write_parsed_summary(fields: Fields) -> str:
+    """Run the log parser in-process, as ``parse_codex_run.py --log --meta`` would."""
+    summary = parse_codex_run.summarize_run(Path(_text(fields, "log_file")), _text(fields, "meta_file") or None)
+    _write(_text(fields, "summary_file"), _dump_compact(summary) + "\n")
+    return ""
+
+
+def write_cached_summary(fields: Fields) -> str:
+    try:
+        base = json.loads(Path(_text(fields, "cached_summary")).read_text(encoding="utf-8"))
+    except Exception:
+        base = {}
+    if not isinstance(base, dict):
+        base = {}
+
+    # Entries stored before v2 are upgraded as they are reused.
+    summary = summary_schema.to_v2(base)
+    exit_code = _int(fields, "exit_code", 0)
+    summary["id"] = _text(fields, "run_id")
+    summary["sid"] = fields.get("session_id") or None
+    summary["start"] = _text(fields, "started_at")
+    summary["end"] = _text(fields, "ended_at")
+    summary["time"] = _int(fields, "elapsed_seconds", 0)
+    summary["exit"] = exit_code
+    summary["ok"] = exit_code == 0
+    summary["log"] = _text(fields, "log_file")
+    summary["meta"] = _text(fields, "meta_file")
+    summary["cache"] = {
+        "status": "hit",
+        "key": fields.get("cache_key"),
+        "reason": fields.get("cache_reason") or "hit",
+        "dir": fields.get("cache_entry_dir"),
+    }
+
+    _write(_text(fields, "summary_file"), _dump_compact(summary) + "\n")
+    return ""
+
+
+def cache_hit_metadata(fields: Fields) -> str:
+    """Return ``"<exit_code> <session_id>"`` recorded in a cached summary."""
+    exit_code = 0
+    session = "unknown"
+    try:
+        data = json.loads(Path(_text(fields, "cached_summary")).read_text(encoding="utf-8"))
+        if isinstance(data, dict):
+            raw_exit = summary_schema.pick(data, "exit")
+            if isinstance(raw_exit, int):
+                exit_code = raw_exit
+            raw_session = summary_schema.pick(data, "sid")
+            if isinstance(raw_session, str) and raw_session:
+                session = raw_session
+    except Exception:
+        pass
+    return f"{exit_code} {session}"
+
+
+def one_line_summary(fields: Fields) -> str:
+    """Summarize in-process with the bundled summarizer; run any other summarizer as before."""
+    summary_path = Path(_text(fields, "summary_path"))
+    summarizer = Path(fields.get("summarizer") or SCRIPT_DIR / "summarize_codex_run.py")
+    if summarizer.resolve() == (SCRIPT_DIR / "summarize_codex_run.py"):
+        try:
+            return summarize_codex_run.summarize(summarize_codex_run.load_summary(summary_path))
+        except (FileNotFoundError, ValueError) as exc:
+            raise RequestError(str(exc)) from exc
+
+    cmd = [str(summarizer)] if os.access(summarizer, os.X_OK) else [sys.executable, str(summarizer)]
+    proc = subprocess.run([*cmd, "--summary", str(summary_path)], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RequestError(f"summarizer exited with {proc.returncode}")
+    return proc.stdout.splitlines()[0] if proc.stdout else ""
+
+
+def _cache_dir(fields: Fields) -> Path:
+    cache_dir = _text(fields, "cache_dir")
+    if not cache_dir or not _text(fields, "cache_key"):
+        raise RequestError("cache_dir and cache_key are required")
+    return Path(cache_dir)
+
+
+def _cache_limits() -> codex_cache.CacheLimits:
+    try:
+        return codex_cache.CacheLimits.from_env()
+    except ValueError as exc:
+        raise RequestError(str(exc)) from exc
+
+
+# Key parts computed by cache_key, kept for the lookup that follows it in the same run.
+_KEY_PARTS: dict[str, dict[str, str | None]] = {}
+
+
+def cache_key(fields: Fields) -> str:
+    """Build the cache key from the repo state, run settings and canonical task text.
+
+    The key text matches what the runner hashed before task canonicalization, so tasks that
+    were already canonical and carry no guardrail preamble keep their cache entries.
+    """
+    repo_path = _text(fields, "repo_path")
+    if not repo_path:
+        raise RequestError("repo_path is required")
+    cache_dir = _text(fields, "cache_dir")
+    memo_dir = Path(cache_dir) / "repo-state" if cache_dir else None
+    head, dirty = repo_fingerprint.tree_state(Path(repo_path), memo_dir)
+    try:
+        canonical = task_key.canonicalize(_text(fields, "task"), task_key.ignore_patterns_from_env())
+    except (OSError, ValueError) as exc:
+        raise RequestError(f"cannot load task ignore patterns: {exc}") from exc
+
+    lines = [
+        f"repo={repo_path}",
+        f"head={head}",
+        f"dirty={dirty}",
+        f"mode={_text(fields, 'mode')}",
+        f"model={_text(fields, 'model')}",
+        f"tier={_text(fields, 'model_tier')}",
+    ]
+    if canonical.preamble:
+        lines.append(f"preamble={canonical.preamble}")
+    lines.append(f"task={canonical.text}")
+    key = hashlib.sha256(("\n".join(lines) + "\n").encode("utf-8", errors="surrogateescape")).hexdigest()
+
+    _KEY_PARTS[key] = {
+        "repo": repo_path,
+        "head": head,
+        "dirty": dirty,
+        "mode": _text(fields, "mode"),
+        "model": _text(fields, "model"),
+        "tier": _text(fields, "model_tier"),
+        "preamble": canonical.preamble,
+        "task": canonical.digest,
+        "normalized": "1" if canonical.preamble or canonical.text != _text(fields, "task") else "",
+    }
+    return key
+
+
+def cache_lookup(fields: Fields) -> str:
+    """Return ``"hit|miss <reason>"``; see codex_cache.lookup for the reasons."""
+    key = _text(fields, "cache_key")
+    parts = _KEY_PARTS.get(key)
+    hit, reason = codex_cache.lookup(_cache_dir(fields), key, _cache_limits(), parts=parts)
+    if hit and parts and parts["normalized"]:
+        reason = "hit:normalized"
+    return f"{'hit' if hit else 'miss'} {reason}"
+
+
+def cache_record_lookup(fields: Fields) -> str:
+    """Append the run's final lookup outcome (after any single-flight wait) to events.jsonl."""
+    codex_cache.record_lookup(
+        _cache_dir(fields),
+        _text(fields, "cache_key"),
+        _text(fields, "cache_status") == "hit",
+        _text(fields, "cache_reason"),
+        _text(fields, "repo_path") or _text(fields, "repo"),
+        _text(fields, "model_tier"),
+        _text(fields, "model"),
+    )
+    return ""
+
+
+# Single-flight locks this run holds, by cache key; the kernel releases them if we exit.
+_CLAIMS: dict[str, int] = {}
+
+
+def cache_claim(fields: Fields) -> str:
+    """Take the single-flight lock for the run's cache key.
+
+    With ``wait_seconds=0`` returns ``leader`` or ``busy <owner>`` at once; otherwise waits for
+    the lock and returns ``leader`` or ``timeout``. A new leader re-checks the cache first and
+    returns ``hit hit:coalesced`` (releasing the lock) when the previous holder stored the entry.
+    """
+    cache_dir = _cache_dir(fields)
+    key = _text(fields, "cache_key")
+    if key in _CLAIMS:
+        return "leader"
+    owner = f"run_id={_text(fields, 'run_id')} pid={os.getppid()} since={datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}"
+    wait_seconds = _int(fields, "wait_seconds", 0)
+    if wait_seconds <= 0:
+        fd = codex_cache.try_claim(cache_dir, key, owner)
+        if fd is None:
+            return f"busy {codex_cache.claim_owner(cache_dir, key) or 'unknown'}"
+    else:
+        runner = os.getppid()
+        fd = codex_cache.wait_claim(cache_dir, key, owner, wait_seconds, abandoned=lambda: os.getppid() != runner)
+        if fd is None:
+            return "timeout"
+
+    hit, _ = codex_cache.lookup(cache_dir, key, _cache_limits())
+    if hit:
+        codex_cache.release_claim(fd)
+        return "hit hit:coalesced"
+    _CLAIMS[key] = fd
+    return "leader"
+
+
+def cache_release(fields: Fields) -> str:
+    fd = _CLAIMS.pop(_text(fields, "cache_key"), None)
+    if fd is not None:
+        codex_cache.release_claim(fd)
+    return ""
+
+
+def cache_store(fields: Fields) -> str:
+    sources = {
+        "summary.json": Path(_text(fields, "summary_file")),
+        "meta.json": Path(_text(fields, "meta_file")),
+        "log": Path(_text(fields, "log_file")),
+    }
+    stored = codex_cache.store(_cache_dir(fields), _text(fields, "cache_key"), sources, _cache_limits())
+    return "stored" if stored else "skipped"
+
+
+COMMANDS: dict[str, Callable[[Fields], str]] = {
+    "model_for_tier": model_for_tier,
+    "event": event_json,
+    "write_meta": write_meta,
+    "write_fallback_summary": write_fallback_summary,
+    "write_parsed_summary": write_parsed_summary,
+    "write_cached_summary": write_cached_summary,
+    "cache_hit_metadata": cache_hit_metadata,
+    "one_line_summary": one_line_summary,
+    "cache_lookup": cache_lookup,
+    "cache_store": cache_store,
+    "cache_claim": cache_claim,
+    "cache_record_lookup": cache_record_lookup,
+    "cache_release": cache_release,
+    "cache_key": cache_key,
+}
+
+
+def read_requests(fd: int) -> Iterator[list[str]]:
+    """Yield each request's fields (command first) until ``fd`` reaches EOF."""
+    buffer = b""
+    fields: list[str] = []
+    while True:
+        chunk = os.read(fd, 1 << 16)
+        if not chunk:
+            return
+        buffer += chunk
+        *complete, buffer = buffer.split(b"\0")
+        for raw in complete:
+            if raw:
+                fields.append(raw.decode("utf-8", errors="surrogateescape"))
+            elif fields:
+                yield fields
+                fields = []
+
+
+def handle(fields: list[str]) -> tuple[str, str]:
+    command, pairs = fields[0], fields[1:]
+    handler = COMMANDS.get(command)
+    if handler is None:
+        return "error", f"unknown command: {command}"
+    values: dict[str, str] = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            return "error", f"malformed field: {pair!r}"
+        values[key] = value
+    try:
+        return "ok", handler(values)
+    except RequestError as exc:
+        return "error", str(exc)
+    except Exception as exc:  # keep serving; the runner falls back per request
+        return "error", f"{type(exc).__name__}: {exc}"
+
+
+def serve(in_fd: int = 0, out_fd: int = 1) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    for fields in read_requests(in_fd):
+        status, payload = handle(fields)
+        reply = f"{status}\0{payload.replace(chr(0), '')}\0".encode("utf-8", errors="surrogateescape")
+        while reply:
+            written = os.write(out_fd, reply)
+            reply = reply[written:]
+
+
+if __name__ == "__main__":
+    serve()
@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
 import argparse
 import json
+import mmap
+import multiprocessing
 import os
 import re
+import signal
+import sys
+import time
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Mapping
+from typing import Any, Iterator, Mapping
+
+from summary_schema import SUMMARY_VERSION, compact_cost, compact_token_usage, coerce_int, legacy_view
 
 
 def parse_int(text: str) -> int | None:
@@ -28,28 +36,137 @@ def load_json(path: Path) -> dict[str, Any]:
         return {}
 
 
-def extract_token_usage(log_text: str) -> dict[str, Any]:
-    patterns = {
-        "input_tokens": [
-            r"input[_\s-]?tokens?\s*[:=]\s*([0-9][0-9,]*)",
-            r"prompt[_\s-]?tokens?\s*[:=]\s*([0-9][0-9,]*)",
-            r'"input_tokens"\s*:\s*([0-9][0-9,]*)',
-            r'"prompt_tokens"\s*:\s*([0-9][0-9,]*)',
-            r'in(?:put)?\s*=\s*([0-9][0-9,]*)\s*(?:tok|tokens?)\s*out',
-        ],
-        "output_tokens": [
-            r"output[_\s-]?tokens?\s*[:=]\s*([0-9][0-9,]*)",
-            r"completion[_\s-]?tokens?\s*[:=]\s*([0-9][0-9,]*)",
-            r'"output_tokens"\s*:\s*([0-9][0-9,]*)',
-            r'"completion_tokens"\s*:\s*([0-9][0-9,]*)',
-            r'out(?:put)?\s*=\s*([0-9][0-9,]*)\s*tok',
-        ],
-        "total_tokens": [
-            r"total[_\s-]?tokens?\s*[:=]\s*([0-9][0-9,]*)",
-            r"tokens?\s+used\s*(?:[:=]\s*)?([0-9][0-9,]*)",
-        ],
-    }
-
+TOKEN_PATTERNS: dict[str, list[str]] = {
+    "input_tokens": [
+        r"input[_\s-]?tokens?\s*[:=]\s*([0-9][0-9,]*)",
+        r"prompt[_\s-]?tokens?\s*[:=]\s*([0-9][0-9,]*)",
+        r'"input_tokens"\s*:\s*([0-9][0-9,]*)',
+        r'"prompt_tokens"\s*:\s*([0-9][0-9,]*)',
+        r'in(?:put)?\s*=\s*([0-9][0-9,]*)\s*(?:tok|tokens?)\s*out',
+    ],
+    "output_tokens": [
+        r"output[_\s-]?tokens?\s*[:=]\s*([0-9][0-9,]*)",
+        r"completion[_\s-]?tokens?\s*[:=]\s*([0-9][0-9,]*)",
+        r'"output_tokens"\s*:\s*([0-9][0-9,]*)',
+        r'"completion_tokens"\s*:\s*([0-9][0-9,]*)',
+        r'out(?:put)?\s*=\s*([0-9][0-9,]*)\s*tok',
+    ],
+    "total_tokens": [
+        r"total[_\s-]?tokens?\s*[:=]\s*([0-9][0-9,]*)",
+        r"tokens?\s+used\s*(?:[:=]\s*)?([0-9][0-9,]*)",
+    ],
+}
+
+# Only accept lines that look like explicit cost fields, not arbitrary prose containing "$".
+COST_PATTERNS: list[str] = [
+    r"\bcost(?:_usd)?\s*[:=]\s*\$?\s*([0-9]+(?:\.[0-9]+)?)",
+    r"\bestimated_cost(?:_usd)?\s*[:=]\s*\$?\s*([0-9]+(?:\.[0-9]+)?)",
+    r"\busd\s*[:=]\s*\$?\s*([0-9]+(?:\.[0-9]+)?)",
+    r"\btotal\s+cost\b\s*[:=]\s*\$?\s*([0-9]+(?:\.[0-9]+)?)",
+]
+
+# Cost fields are matched per line (str.splitlines semantics), so inside the combined
+# scanner their whitespace must not cross any of the characters splitlines breaks on.
+_INLINE_SPACE = r"[^\S\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]"
+
+# re.IGNORECASE defeats sre's first-character skip table, so the log is folded to lower
+# case up front and scanned case-sensitively. str.lower() maps every code point to exactly
+# one code point (so offsets stay valid) except U+0130, and it leaves U+0131 and U+017F
+# alone even though IGNORECASE equates them with "i" and "s"; those are patched first.
+_CASE_FOLD_EXTRA = (("\u0130", "i"), ("\u0131", "i"), ("\u017f", "s"))
+
+
+def fold_case(text: str) -> str:
+    if not text.isascii():
+        for src, dst in _CASE_FOLD_EXTRA:
+            if src in text:
+                text = text.replace(src, dst)
+    return text.lower()
+
+
+COST_FIELD = "cost"
+
+# (field, pattern_index) -> (offset of the last match, raw captured value)
+Hits = dict[tuple[str, int], tuple[int, str]]
+
+
+def _build_scanner() -> tuple[re.Pattern[str], list[tuple[str, int, int, int]]]:
+    """Compile every token/cost pattern into one regex that is evaluated in a single pass.
+
+    Patterns are grouped by their leading literal. Each branch consumes that one character,
+    checks that at least one of its patterns matches, then runs one optional lookahead per
+    field that captures the highest-priority pattern matching at that position (the only
+    one that can matter for that field). Because everything after the first character is
+    a lookahead, matches for different fields may overlap, exactly like the independent
+    ``re.findall`` passes this replaces.
+
+    Returns the compiled regex plus ``(field, pattern_index, match_group, value_group)``
+    slots describing where each pattern's match and captured value land.
+    """
+    fields: list[tuple[str, list[str]]] = list(TOKEN_PATTERNS.items())
+    fields.append((COST_FIELD, [pat.replace(r"\s", _INLINE_SPACE) for pat in COST_PATTERNS]))
+
+    branches: dict[str, list[tuple[str, int, str]]] = {}
+    for field_name, pats in fields:
+        for idx, pat in enumerate(pats):
+            guard = ""
+            if pat.startswith(r"\b"):
+                # The first letter is already consumed, so \b becomes "no word char before it".
+                pat = pat[2:]
+                guard = r"(?<!\w.)"
+            if not (pat[0].isalpha() or pat[0] == '"'):
+                raise ValueError(f"pattern must start with a literal character: {pat!r}")
+            branches.setdefault(pat[0], []).append((field_name, idx, guard + pat[1:]))
+
+    group = 0
+    slots: list[tuple[str, int, int, int]] = []
+    parts: list[str] = []
+    for first, items in branches.items():
+        branch = [re.escape(first), f"(?=(?:{'|'.join(rest for _, _, rest in items)}))"]
+        group += sum(re.compile(rest).groups for _, _, rest in items)
+        per_field: dict[str, list[tuple[int, str]]] = {}
+        for field_name, idx, rest in items:
+            per_field.setdefault(field_name, []).append((idx, rest))
+        for field_name, alternatives in per_field.items():
+            wrapped = []
+            for idx, rest in alternatives:
+                match_group = group + 1
+                slots.append((field_name, idx, match_group, match_group + 1))
+                group = match_group + re.compile(rest).groups
+                wrapped.append(f"({rest})")
+            branch.append(f"(?=(?:{'|'.join(wrapped)})?)")
+        parts.append("".join(branch))
+
+    return re.compile("|".join(parts)), slots
+
+
+SCANNER, SCANNER_SLOTS = _build_scanner()
+
+
+def scan_text(log_text: str, hits: Hits | None = None, limit: int | None = None) -> Hits:
+    """Scan ``log_text`` once and record the last match of every token/cost pattern.
+
+    Passing an existing ``hits`` mapping merges into it, keeping whichever match sits later.
+    With ``limit``, only matches starting before that offset are recorded; the text past it
+    is still visible to patterns that run across it.
+    """
+    if hits is None:
+        hits = {}
+    for match in SCANNER.finditer(fold_case(log_text)):
+        pos = match.start()
+        if limit is not None and pos >= limit:
+            break
+        for field_name, idx, match_group, value_group in SCANNER_SLOTS:
+            if match.start(match_group) == -1:
+                continue
+            key = (field_name, idx)
+            prev = hits.get(key)
+            if prev is None or pos >= prev[0]:
+                hits[key] = (pos, match.group(value_group))
+    return hits
+
+
+def resolve_token_usage(hits: Hits) -> dict[str, Any]:
     result: dict[str, Any] = {
         "input_tokens": None,
         "output_tokens": None,
@@ -57,11 +174,11 @@ def extract_token_usage(log_text: str) -> dict[str, Any]:
         "evidence": {},
     }
 
-    for key, key_patterns in patterns.items():
-        for pat in key_patterns:
-            matches = re.findall(pat, log_text, flags=re.IGNORECASE)
-            if matches:
-                raw = matches[-1]
+    for key, key_patterns in TOKEN_PATTERNS.items():
+        for idx, pat in enumerate(key_patterns):
+            hit = hits.get((key, idx))
+            if hit is not None:
+                raw = hit[1]
                 result[key] = parse_int(raw)
                 result["evidence"][key] = {"pattern": pat, "raw": raw}
                 break
@@ -76,18 +193,15 @@ def extract_token_usage(log_text: str) -> dict[str, Any]:
     return result
 
 
-def extract_cost(log_text: str) -> dict[str, Any]:
-    # Only accept lines that look like explicit cost fields, not arbitrary prose containing "$".
-    cost_patterns = [
-        r"\bcost(?:_usd)?\s*[:=]\s*\$?\s*([0-9]+(?:\.[0-9]+)?)",
-        r"\bestimated_cost(?:_usd)?\s*[:=]\s*\$?\s*([0-9]+(?:\.[0-9]+)?)",
-        r"\busd\s*[:=]\s*\$?\s*([0-9]+(?:\.[0-9]+)?)",
-        r"\btotal\s+cost\b\s*[:=]\s*\$?\s*([0-9]+(?:\.[0-9]+)?)",
-    ]
-
-    for line in reversed(log_text.splitlines()):
+def last_cost_offset(hits: Hits) -> int | None:
+    offsets = [hit[0] for (field_name, _), hit in hits.items() if field_name == COST_FIELD]
+    return max(offsets) if offsets else None
+
+
+def cost_from_lines(text: str) -> dict[str, Any]:
+    for line in reversed(text.splitlines()):
         stripped = line.strip()
-        for pat in cost_patterns:
+        for pat in COST_PATTERNS:
             match = re.search(pat, stripped, flags=re.IGNORECASE)
             if match:
                 usd = parse_float(match.group(1))
@@ -97,101 +211,403 @@ def extract_cost(log_text: str) -> dict[str, Any]:
     return {"usd": None, "evidence": None}
 
 
-def coerce_int(value: Any) -> int | None:
-    if isinstance(value, bool):
-        return None
+def resolve_cost(log_text: str, hits: Hits) -> dict[str, Any]:
+    offset = last_cost_offset(hits)
+    if offset is None:
+        return {"usd": None, "evidence": None}
+    # Re-run the per-line rules on just the line holding the last cost match.
+    start = log_text.rfind("\n", 0, offset) + 1
+    end = log_text.find("\n", offset)
+    return cost_from_lines(log_text[start:] if end == -1 else log_text[start:end])
+
+
+# The tail reader decodes the log in line-aligned chunks of roughly this many bytes, and
+# lets each chunk's matches run on into the following lines for up to TAIL_OVERLAP_BYTES.
+TAIL_CHUNK_BYTES = 1 << 20
+TAIL_OVERLAP_BYTES = 64 << 10
+
+
+def _line_start(view: mmap.mmap, offset: int) -> int:
+    return view.rfind(b"\n", 0, offset) + 1 if offset > 0 else 0
+
+
+def _line_end(view: mmap.mmap, offset: int, size: int) -> int:
+    newline = view.find(b"\n", offset) if offset < size else -1
+    return size if newline == -1 else newline + 1
+
+
+# Byte-level pre-check: a lower-cased block of the raw log, with the only non-ASCII letters
+# that fold to ASCII ones (see _CASE_FOLD_EXTRA; plus the Kelvin sign) replaced, contains a
+# match of byte_superset(pat) wherever the decoded log contains a match of pat.
+_FOLDED_LETTER_BYTES = ((b"\xc4\xb0", b"i"), (b"\xc4\xb1", b"i"), (b"\xc5\xbf", b"s"), (b"\xe2\x84\xaa", b"k"))
+# str \s also matches \x1c-\x1f and the Unicode spaces, which are two or three UTF-8 bytes.
+_SPACE_BYTES = r"\s\x1c-\x1f"
+_WIDE_SPACE_BYTES = r"[\x80-\xff]{2,3}"
+CANDIDATE_BLOCK_BYTES = 8 << 20
+
+
+def byte_superset(pattern: str) -> re.Pattern[bytes]:
+    """Compile a token/cost pattern for raw, lower-cased log bytes, allowing false positives.
+
+    ``\\b`` is dropped and ``\\s`` also accepts any two- or three-byte UTF-8 sequence, so
+    the result never misses a position where the original matches the decoded text.
+    """
+    out: list[str] = []
+    pos = 0
+    while pos < len(pattern):
+        char = pattern[pos]
+        if char == "\\":
+            escape = pattern[pos : pos + 2]
+            pos += 2
+            if escape == r"\s":
+                out.append(f"(?:[{_SPACE_BYTES}]|{_WIDE_SPACE_BYTES})")
+            elif escape != r"\b":
+                out.append(escape)
+        elif char == "[" and r"\s" in pattern[pos : pattern.index("]", pos)]:
+            close = pattern.index("]", pos)
+            members = pattern[pos + 1 : close].replace(r"\s", _SPACE_BYTES)
+            out.append(f"(?:[{members}]|{_WIDE_SPACE_BYTES})")
+            pos = close + 1
+        else:
+            out.append(char)
+            pos += 1
+    return re.compile("".join(out).encode("ascii"))
+
+
+def pending_patterns(hits: Hits, cost_found: bool, need_tokens: bool) -> list[str]:
+    """Patterns whose match earlier in the log would still change the resolved result.
+
+    The last cost line wins, so a found cost is final. A token field only gives way to a
+    higher-priority pattern than the best one it has matched so far.
+    """
+    pending = [] if cost_found else list(COST_PATTERNS)
+    if need_tokens:
+        for key, key_patterns in TOKEN_PATTERNS.items():
+            best = min((idx for field_name, idx in hits if field_name == key), default=len(key_patterns))
+            pending.extend(key_patterns[:best])
+    return pending
+
+
+def first_candidate(view: mmap.mmap, patterns: list[str], overlap_bytes: int) -> int:
+    """Offset at or before the first place any of ``patterns`` could match (the size if none).
+
+    Blocks overlap by ``overlap_bytes``, the same reach the tail reader gives matches.
+    """
+    compiled = [byte_superset(pat) for pat in patterns]
+    size = len(view)
+    for block_start in range(0, size, CANDIDATE_BLOCK_BYTES):
+        block = view[block_start : block_start + CANDIDATE_BLOCK_BYTES + overlap_bytes].lower()
+        for folded, letter in _FOLDED_LETTER_BYTES:
+            # Shortening the block only moves candidates earlier, which stays conservative.
+            if folded in block:
+                block = block.replace(folded, letter)
+        found = [match.start() for match in (regex.search(block) for regex in compiled) if match]
+        if found:
+            return block_start + min(found)
+    return size
+
+
+def scan_log_tail(
+    log_path: Path,
+    chunk_bytes: int = TAIL_CHUNK_BYTES,
+    overlap_bytes: int = TAIL_OVERLAP_BYTES,
+    need_tokens: bool = True,
+) -> tuple[Hits, dict[str, Any]]:
+    """Scan a log file backward from its end and return its hits plus the resolved cost.
+
+    The file is memory-mapped and decoded one line-aligned chunk at a time, newest first.
+    Since the last match of each pattern wins, a chunk only fills in slots that later chunks
+    left empty. Scanning stops once no earlier match could change the result: when the cost
+    line and the top-priority pattern of every token field are known, or when the raw bytes
+    before the scanned tail hold no possible match for the patterns still pending (see
+    ``first_candidate``, which runs once and never decodes the log). Otherwise the scan keeps
+    walking back to the first candidate or the start of the file, which yields the same
+    result as ``scan_text`` on the whole log while still holding only one chunk in memory.
+
+    With ``need_tokens=False`` the token fields are not waited for.
+
+    Offsets in the returned hits preserve order but are not character offsets into the log.
+    """
+    hits: Hits = {}
+    cost: dict[str, Any] | None = None
+    floor: int | None = None
+    with log_path.open("rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        if size == 0:
+            return hits, {"usd": None, "evidence": None}
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            end = size
+            while end > 0:
+                start = _line_start(view, max(0, end - chunk_bytes))
+                lookahead = _line_end(view, min(size, end + overlap_bytes), size)
+                body = view[start:end].decode("utf-8", errors="replace")
+                text = body + view[end:lookahead].decode("utf-8", errors="replace")
+                chunk_hits = scan_text(text, limit=len(body))
+                if cost is None and last_cost_offset(chunk_hits) is not None:
+                    cost = resolve_cost(text, chunk_hits)
+                # A character offset never exceeds its byte offset, so start + offset sorts
+                # chunks correctly without re-encoding anything.
+                for key, (offset, raw) in chunk_hits.items():
+                    hits.setdefault(key, (start + offset, raw))
+                pending = pending_patterns(hits, cost is not None, need_tokens)
+                if not pending:
+                    break
+                if floor is None:
+                    floor = first_candidate(view, pending, overlap_bytes)
+                if start <= floor:
+                    break
+                end = start
+    return hits, cost or {"usd": None, "evidence": None}
+
+
+def _read_mapped(log_path: Path, start_hint: int, final: bool) -> tuple[int, int, str] | None:
+    """Decode the complete lines from the line holding ``start_hint`` to the end of the log.
+
+    Returns ``(start, end, text)`` or ``None`` when no complete line lies past ``start_hint``.
+    A ``final`` read also takes a trailing line that has no newline yet.
+    """
+    with log_path.open("rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        if size == 0:
+            return None
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            start = _line_start(view, start_hint)
+            end = size if final else view.rfind(b"\n", start) + 1
+            if end <= start:
+                return None
+            return start, end, view[start:end].decode("utf-8", errors="replace")
+
+
+def follow_step(log_path: Path, checkpoint: dict[str, Any], final: bool = False) -> bool:
+    """Advance ``checkpoint`` over whatever the log gained since the last step.
+
+    The checkpoint holds the byte offset of the first unparsed line plus the hits and cost
+    found so far. Only complete lines are consumed. Each step rescans up to
+    TAIL_OVERLAP_BYTES before that offset so matches that run on across the boundary (a
+    "tokens used" line followed later by its count) are completed; a rescan re-finds every
+    earlier hit it covers, so its results simply replace the stored ones. Returns True if
+    the checkpoint changed.
+    """
+    offset = int(checkpoint.get("offset") or 0)
     try:
-        return int(value)
-    except (TypeError, ValueError):
-        return None
+        size = log_path.stat().st_size
+    except FileNotFoundError:
+        return False
+    if size < offset:
+        # The log was truncated or replaced; start over.
+        checkpoint.clear()
+        offset = 0
+    if size == offset:
+        return False
+
+    window = _read_mapped(log_path, max(0, offset - TAIL_OVERLAP_BYTES), final)
+    if window is None:
+        return False
+    start, end, text = window
+    if end <= offset:
+        return False
+
+    window_hits = scan_text(text)
+    hits = checkpoint_hits(checkpoint)
+    for key, (pos, raw) in window_hits.items():
+        hits[key] = (start + pos, raw)
+    if last_cost_offset(window_hits) is not None:
+        checkpoint["cost"] = resolve_cost(text, window_hits)
+
+    checkpoint["log"] = str(log_path)
+    checkpoint["offset"] = end
+    checkpoint["hits"] = [[field_name, idx, pos, raw] for (field_name, idx), (pos, raw) in sorted(hits.items())]
+    return True
+
+
+def checkpoint_hits(checkpoint: Mapping[str, Any]) -> Hits:
+    hits: Hits = {}
+    for entry in checkpoint.get("hits") or []:
+        try:
+            field_name, idx, pos, raw = entry
+            hits[(str(field_name), int(idx))] = (int(pos), str(raw))
+        except (TypeError, ValueError):
+            continue
+    return hits
 
 
-def compact_token_usage(raw: Mapping[str, Any] | None) -> dict[str, Any] | None:
-    if not isinstance(raw, Mapping):
-        return None
+def progress_payload(checkpoint: Mapping[str, Any], done: bool) -> dict[str, Any]:
+    cost = checkpoint.get("cost") or {"usd": None, "evidence": None}
+    return {
+        "log": checkpoint.get("log"),
+        "bytes": int(checkpoint.get("offset") or 0),
+        "tok": compact_token_usage(resolve_token_usage(checkpoint_hits(checkpoint))),
+        "cost": compact_cost(cost),
+        "done": done,
+        "at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
 
-    def pick(*keys: str) -> Any:
-        for key in keys:
-            if key in raw and raw[key] is not None:
-                return raw[key]
-        return None
 
-    evidence_in = raw.get("evidence") or raw.get("ev") or {}
-    ev: dict[str, Any] = {}
-    for new_key, old_key in [("in", "input_tokens"), ("out", "output_tokens"), ("tot", "total_tokens")]:
-        src = evidence_in.get(new_key) or evidence_in.get(old_key)
-        if isinstance(src, Mapping):
-            ev_entry = {}
-            if src.get("pattern"):
-                ev_entry["pat"] = src["pattern"]
-            if src.get("raw"):
-                ev_entry["raw"] = src["raw"]
-            if src.get("derived"):
-                ev_entry["derived"] = src["derived"]
-            if ev_entry:
-                ev[new_key] = ev_entry
-
-    tok = {
-        "in": coerce_int(pick("in", "input_tokens")),
-        "out": coerce_int(pick("out", "output_tokens")),
-        "tot": coerce_int(pick("tot", "total_tokens")),
-    }
-    if ev:
-        tok["ev"] = ev
+def write_json_atomic(path: Path, payload: Mapping[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(payload, ensure_ascii=True, separators=(",", ":")) + "\n", encoding="utf-8")
+    os.replace(tmp_path, path)
 
-    if all(value is None for value in tok.values() if not isinstance(value, dict)) and "ev" not in tok:
-        return None
-    return tok
 
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def run_incremental(args: argparse.Namespace) -> None:
+    """Parse only the bytes added since the checkpoint, optionally repeating until told to stop.
+
+    Without ``--follow`` this is a single step, suitable for a poller that visits many runs;
+    ``--final`` marks that step as the last one once the run has ended.
+    ``--follow`` repeats every ``--interval`` seconds until ``--pid`` exits or SIGTERM/SIGINT
+    arrives, then finishes with a final step that also takes an unterminated last line.
+    """
+    log_path = Path(args.log)
+    checkpoint_path = Path(args.checkpoint) if args.checkpoint else None
+    progress_path = Path(args.progress) if args.progress else None
+    checkpoint = load_json(checkpoint_path) if checkpoint_path else {}
+    if checkpoint.get("log") not in (None, str(log_path)):
+        checkpoint = {}
+
+    stopping = False
+
+    def request_stop(signum: int, frame: Any) -> None:
+        nonlocal stopping
+        stopping = True
+
+    if args.follow:
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+    def publish(done: bool) -> None:
+        if checkpoint_path:
+            write_json_atomic(checkpoint_path, checkpoint)
+        payload = progress_payload(checkpoint, done)
+        if progress_path:
+            write_json_atomic(progress_path, payload)
+        else:
+            print(json.dumps(payload, ensure_ascii=True, separators=(",", ":")), flush=True)
+
+    while args.follow and not stopping:
+        if follow_step(log_path, checkpoint):
+            publish(done=False)
+        deadline = time.monotonic() + args.interval
+        while not stopping and time.monotonic() < deadline:
+            if args.pid and not pid_alive(args.pid):
+                stopping = True
+                break
+            time.sleep(min(0.2, args.interval))
+
+    final = args.follow or args.final
+    follow_step(log_path, checkpoint, final=final)
+    publish(done=final)
+
+
+# `codex exec --json` writes one JSON event per line. Token usage arrives as cumulative session
+# totals, either on "turn.completed" events ({"usage": {...}}) or on "token_count" messages
+# ({"msg"|"payload": {"type": "token_count", "info": {"total_token_usage": {...}}}}).
+EVENT_TOKEN_FIELDS = ("input_tokens", "output_tokens", "total_tokens", "cached_input_tokens", "reasoning_output_tokens")
+# Cheap byte checks so only the handful of events that can carry usage or a session id get decoded.
+_EVENT_MARKERS = (b'"usage"', b'"token_count"', b'"thread_id"', b'"session_id"')
+
+
+def iter_json_events(log_path: Path, markers: tuple[bytes, ...] = _EVENT_MARKERS) -> Iterator[dict[str, Any]]:
+    """Yield JSON object lines from ``log_path`` one at a time, skipping plain-text lines."""
+    with log_path.open("rb") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line.startswith(b"{") or not any(marker in line for marker in markers):
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict):
+                yield event
+
+
+def _event_body(event: Mapping[str, Any]) -> Mapping[str, Any]:
+    for key in ("msg", "payload"):
+        body = event.get(key)
+        if isinstance(body, Mapping):
+            return body
+    return event
+
+
+def event_usage(event: Mapping[str, Any]) -> tuple[str, Mapping[str, Any]] | None:
+    usage = event.get("usage")
+    if isinstance(usage, Mapping):
+        return str(event.get("type") or "usage"), usage
+    body = _event_body(event)
+    info = body.get("info")
+    if body.get("type") == "token_count" and isinstance(info, Mapping):
+        total = info.get("total_token_usage")
+        if isinstance(total, Mapping):
+            return "token_count", total
+    return None
+
+
+def event_session_id(event: Mapping[str, Any]) -> str | None:
+    if event.get("type") == "thread.started" and event.get("thread_id"):
+        return str(event["thread_id"])
+    body = _event_body(event)
+    for key in ("session_id", "id"):
+        if body.get("type") in ("session_configured", "session_meta") and body.get(key):
+            return str(body[key])
+    if event.get("session_id"):
+        return str(event["session_id"])
+    return None
+
+
+def extract_event_usage(log_path: Path) -> tuple[dict[str, Any] | None, str | None]:
+    """Stream the JSON events in ``log_path`` and return (token usage, session id).
+
+    Token usage is ``None`` when the log holds no usage events, so callers can fall back to
+    the text patterns. Since every usage event carries running totals, the last one wins.
+    """
+    usage: tuple[str, Mapping[str, Any]] | None = None
+    session_id: str | None = None
+    for event in iter_json_events(log_path):
+        found = event_usage(event)
+        if found is not None:
+            usage = found
+        elif session_id is None:
+            session_id = event_session_id(event)
+
+    if usage is None:
+        return None, session_id
+
+    event_type, counts = usage
+    result: dict[str, Any] = {key: None for key in EVENT_TOKEN_FIELDS}
+    result["evidence"] = {}
+    for key in EVENT_TOKEN_FIELDS:
+        value = counts.get(key)
+        if isinstance(value, int) and not isinstance(value, bool):
+            result[key] = value
+            result["evidence"][key] = {"event": event_type, "raw": str(value)}
 
-def compact_cost(raw: Mapping[str, Any] | None) -> dict[str, Any] | None:
-    if not isinstance(raw, Mapping):
-        return None
+    if result["total_tokens"] is None and result["input_tokens"] is not None and result["output_tokens"] is not None:
+        result["total_tokens"] = result["input_tokens"] + result["output_tokens"]
+        result["evidence"]["total_tokens"] = {"derived": "input_tokens + output_tokens"}
 
-    usd = raw.get("usd")
-    if isinstance(usd, str):
-        try:
-            usd = float(usd)
-        except ValueError:
-            usd = None
-    elif not isinstance(usd, (int, float)):
-        usd = None
+    if result["input_tokens"] is None or result["output_tokens"] is None:
+        result["extraction_incomplete"] = True
 
-    ev = raw.get("ev") or raw.get("evidence")
-    if ev is not None and not isinstance(ev, (str, int, float)):
-        ev = str(ev)
+    return result, session_id
 
-    if usd is None and ev is None:
-        return None
-    return {"usd": usd, "ev": ev}
 
+def extract_token_usage(log_text: str) -> dict[str, Any]:
+    return resolve_token_usage(scan_text(log_text))
 
-def build_legacy(
-    meta: Mapping[str, Any],
-    log_path: Path,
-    token_usage: Mapping[str, Any],
-    cost: Mapping[str, Any],
-    success: bool | None,
-) -> dict[str, Any]:
-    return {
-        "run_id": meta.get("run_id"),
-        "session_id": meta.get("session_id"),
-        "resume_session": meta.get("resume_session"),
-        "repo": meta.get("repo"),
-        "task": meta.get("task"),
-        "model": meta.get("model"),
-        "model_tier": meta.get("model_tier"),
-        "model_source": meta.get("model_source"),
-        "started_at": meta.get("started_at"),
-        "ended_at": meta.get("ended_at"),
-        "elapsed_seconds": meta.get("elapsed_seconds"),
-        "exit_code": meta.get("exit_code"),
-        "success": success,
-        "log_file": str(log_path),
-        "meta_file": meta.get("meta_file"),
-        "token_usage": token_usage,
-        "cost": cost,
-    }
+
+def extract_cost(log_text: str) -> dict[str, Any]:
+    return resolve_cost(log_text, scan_text(log_text))
 
 
 def compact_summary(*, meta: Mapping[str, Any], log_path: Path, token_usage: Mapping[str, Any], cost: Mapping[str, Any]) -> dict[str, Any]:
@@ -204,6 +620,7 @@ def compact_summary(*, meta: Mapping[str, Any], log_path: Path, token_usage: Map
         ok = exit_code == 0
 
     summary = {
+        "v": SUMMARY_VERSION,
         "id": meta.get("run_id"),
         "sid": meta.get("session_id"),
         "repo": meta.get("repo"),
@@ -225,37 +642,190 @@ def compact_summary(*, meta: Mapping[str, Any], log_path: Path, token_usage: Map
         "cache": {
             "status": meta.get("cache_status"),
             "key": meta.get("cache_key"),
+            "reason": meta.get("cache_reason"),
         },
         "src": "run_codex_task.sh",
     }
 
-    # Always provide verbose payload for compatibility, nested to avoid top-level bloat.
-    summary["legacy"] = build_legacy(meta, log_path, token_usage, cost, ok)
-
+    # v2 stores each value once; readers derive the verbose view via summary_schema.legacy_view.
     if os.environ.get("SUMMARY_JSON_LEGACY", "0") == "1":
-        summary["legacy_inline"] = build_legacy(meta, log_path, token_usage, cost, ok)
+        summary["legacy"] = legacy_view(summary)
 
     return summary
 
 
+LOG_FORMATS = ("auto", "text", "jsonl")
+
+
+def summarize_run(log_path: Path, meta_file: str | None, log_format: str = "auto") -> dict[str, Any]:
+    """Build the compact summary for one run.
+
+    ``auto`` trusts the ``log_format`` the runner recorded in meta.json. A JSONL log without
+    usage events (or a text log) goes through the regex patterns.
+    """
+    meta = load_json(Path(meta_file)) if meta_file else {}
+    if log_format == "auto":
+        log_format = "jsonl" if meta.get("log_format") == "jsonl" else "text"
+
+    hits: Hits = {}
+    cost: dict[str, Any] = {"usd": None, "evidence": None}
+    event_tokens: dict[str, Any] | None = None
+    if log_path.exists():
+        if log_format == "jsonl":
+            event_tokens, session_id = extract_event_usage(log_path)
+            if session_id and not meta.get("session_id"):
+                meta["session_id"] = session_id
+        hits, cost = scan_log_tail(log_path, need_tokens=event_tokens is None)
+
+    token_usage = event_tokens if event_tokens is not None else resolve_token_usage(hits)
+    meta["meta_file"] = meta_file
+    return compact_summary(meta=meta, log_path=log_path, token_usage=token_usage, cost=cost)
+
+
+RUN_LOG_SUFFIX = ".log"
+
+
+def discover_runs(runs_dir: Path) -> list[tuple[Path, Path | None, Path]]:
+    """Find ``codex-run-<id>.log`` files under ``runs_dir`` with their meta and summary paths."""
+    runs = []
+    for log_path in sorted(runs_dir.rglob(f"codex-run-*{RUN_LOG_SUFFIX}")):
+        stem = log_path.name[: -len(RUN_LOG_SUFFIX)]
+        meta_path = log_path.with_name(f"{stem}.meta.json")
+        runs.append((log_path, meta_path if meta_path.exists() else None, log_path.with_name(f"{stem}.summary.json")))
+    return runs
+
+
+def _batch_worker(run: tuple[Path, Path | None, Path]) -> tuple[tuple[Path, Path | None, Path], dict[str, Any] | None, str | None]:
+    log_path, meta_path, _ = run
+    try:
+        summary = summarize_run(log_path, str(meta_path) if meta_path else None)
+        # Keep the paths the runner originally recorded rather than the ones seen from here.
+        meta = load_json(meta_path) if meta_path else {}
+        if meta.get("log_file"):
+            summary["log"] = str(Path(meta["log_file"]))
+        if meta.get("meta_file"):
+            summary["meta"] = meta["meta_file"]
+        return run, summary, None
+    except Exception as exc:  # one unreadable run must not sink the whole batch
+        return run, None, f"{type(exc).__name__}: {exc}"
+
+
+def run_batch(argv: list[str]) -> int:
+    """Re-derive summaries for every run under a directory on a process pool.
+
+    Finished logs are appended to ``--state`` as they complete, so an interrupted batch picks
+    up where it stopped when re-run with the same state file (and ``--out`` is appended to).
+    """
+    parser = argparse.ArgumentParser(
+        prog="parse_codex_run.py batch",
+        description="Re-parse every codex-run-*.log under a runs directory.",
+    )
+    parser.add_argument("runs_dir", help="Directory to search (recursively) for codex-run-*.log files")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--out", default="-", help="Write compact summaries as JSONL here (default: stdout)")
+    target.add_argument("--in-place", action="store_true", help="Rewrite each run's codex-run-<id>.summary.json instead")
+    parser.add_argument("--jobs", type=int, default=0, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--state", help="Resume file listing logs already processed; created if missing")
+    args = parser.parse_args(argv)
+
+    runs_dir = Path(args.runs_dir)
+    if not runs_dir.is_dir():
+        parser.error(f"not a directory: {runs_dir}")
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+    state_path = Path(args.state) if args.state else None
+    done: set[str] = set()
+    if state_path and state_path.exists():
+        done = {line for line in state_path.read_text(encoding="utf-8").splitlines() if line}
+
+    runs = discover_runs(runs_dir)
+    pending = [run for run in runs if str(run[0]) not in done]
+    skipped = len(runs) - len(pending)
+
+    if args.in_place:
+        out = None
+    elif args.out == "-":
+        out = sys.stdout
+    else:
+        out = open(args.out, "a" if done else "w", encoding="utf-8")
+    state = state_path.open("a", encoding="utf-8") if state_path else None
+
+    parsed = failed = 0
+    started = time.monotonic()
+    pool = multiprocessing.Pool(jobs) if jobs > 1 and len(pending) > 1 else None
+    try:
+        if pool:
+            results = pool.imap_unordered(_batch_worker, pending, chunksize=max(1, min(64, len(pending) // (jobs * 4))))
+        else:
+            results = map(_batch_worker, pending)
+        for (log_path, _, summary_path), summary, error in results:
+            if summary is None:
+                failed += 1
+                print(f"Warning: failed to parse {log_path}: {error}", file=sys.stderr)
+                continue
+            line = json.dumps(summary, ensure_ascii=True, separators=(",", ":"))
+            if out is None:
+                write_json_atomic(summary_path, summary)
+            else:
+                out.write(line + "\n")
+            if state:
+                if out is not None:
+                    out.flush()
+                state.write(f"{log_path}\n")
+                state.flush()
+            parsed += 1
+        if pool:
+            pool.close()
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+        if state:
+            state.close()
+        if out not in (None, sys.stdout):
+            out.close()
+
+    elapsed = time.monotonic() - started
+    rate = parsed / elapsed if elapsed > 0 else 0.0
+    print(
+        f"batch_runs={len(runs)} parsed={parsed} skipped={skipped} failed={failed} "
+        f"jobs={jobs} elapsed_seconds={elapsed:.2f} runs_per_sec={rate:.1f}",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
 def main() -> None:
-    parser = argparse.ArgumentParser(description="Parse Codex run output into normalized JSON summary.")
+    if sys.argv[1:2] == ["batch"]:
+        raise SystemExit(run_batch(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(
+        description="Parse Codex run output into normalized JSON summary.",
+        epilog="Use 'parse_codex_run.py batch <runs_dir>' to re-parse a whole runs directory.",
+    )
     parser.add_argument("--log", required=True, help="Path to raw codex log file")
     parser.add_argument("--meta", help="Path to meta JSON emitted by run_codex_task.sh")
+    parser.add_argument(
+        "--format",
+        choices=LOG_FORMATS,
+        default="auto",
+        help="Log format: jsonl for `codex exec --json` output, text for plain logs (default: auto, from meta.json)",
+    )
+    parser.add_argument("--checkpoint", help="Incremental mode: state file holding the parsed byte offset and partial results")
+    parser.add_argument("--progress", help="Incremental mode: write running totals here instead of stdout")
+    parser.add_argument("--follow", action="store_true", help="Keep parsing new log lines until --pid exits or SIGTERM")
+    parser.add_argument("--final", action="store_true", help="Incremental mode: the log is complete; take any unterminated last line")
+    parser.add_argument("--pid", type=int, help="With --follow, stop once this process exits")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between --follow steps (default: 5)")
     args = parser.parse_args()
 
-    log_path = Path(args.log)
-    meta = load_json(Path(args.meta)) if args.meta else {}
-
-    log_text = ""
-    if log_path.exists():
-        log_text = log_path.read_text(encoding="utf-8", errors="replace")
-
-    token_usage = extract_token_usage(log_text)
-    cost = extract_cost(log_text)
-    meta["meta_file"] = args.meta
+    if args.follow or args.final or args.checkpoint or args.progress:
+        if args.interval <= 0:
+            parser.error("--interval must be positive")
+        run_incremental(args)
+        return
 
-    compact = compact_summary(meta=meta, log_path=log_path, token_usage=token_usage, cost=cost)
+    compact = summarize_run(Path(args.log), args.meta, args.format)
     print(json.dumps(compact, ensure_ascii=True, separators=(",", ":")))
 
 
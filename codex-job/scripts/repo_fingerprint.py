@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Repository state fingerprint for run_codex_task.sh cache keys.
+
+``git status --porcelain`` walks every untracked file, which takes seconds in large
+repositories full of build outputs, and only said whether the tree was dirty. This module
+fingerprints HEAD plus the content of tracked modifications instead:
+
+- staged changes come from ``git diff-index --cached HEAD`` (blob ids, no file reads), and
+  are memoized on the git index file's mtime/size/inode;
+- unstaged changes come from ``git diff-files``, a stat-only pass over tracked files; each
+  reported file is hashed as a git blob, and blob ids are memoized per file stat.
+
+The fingerprint covers each tracked path whose worktree content or mode differs from HEAD,
+so staging a change, or touching a file without changing it, keeps the same key. Untracked
+files are not part of it. ``dirty`` is ``clean`` for an unmodified tree (keeping cache keys
+from before this module) or a sha256 of the modified paths and their blob ids.
+
+Usage:
+  repo_fingerprint.py <repo> [--memo-dir <dir>]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+SUBMODULE_MODE = "160000"
+MEMO_VERSION = 1
+READ_CHUNK = 1 << 20
+
+
+def _git(repo: Path, *args: str) -> subprocess.CompletedProcess[bytes]:
+    return subprocess.run(["git", "-C", str(repo), *args], capture_output=True, check=False)
+
+
+def _diff_records(raw: bytes) -> list[list[str]]:
+    """Parse ``-z`` raw diff output into [old mode, new mode, old id, new id, status, path] lists."""
+    fields = raw.split(b"\0")
+    records = []
+    i = 0
+    while i + 1 < len(fields) and fields[i].startswith(b":"):
+        record = fields[i][1:].decode("ascii").split(" ")
+        record.append(fields[i + 1].decode("utf-8", errors="surrogateescape"))
+        records.append(record)
+        i += 2
+    return records
+
+
+def blob_id(path: Path) -> str:
+    """Return the git blob id (sha1) of a worktree file or symlink."""
+    digest = hashlib.sha1()
+    if path.is_symlink():
+        target = os.fsencode(os.readlink(path))
+        digest.update(b"blob %d\0" % len(target))
+        digest.update(target)
+        return digest.hexdigest()
+    with path.open("rb") as handle:
+        digest.update(b"blob %d\0" % os.fstat(handle.fileno()).st_size)
+        for chunk in iter(lambda: handle.read(READ_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat_key(path: Path) -> list[int] | None:
+    try:
+        info = path.lstat()
+    except OSError:
+        return None
+    return [info.st_mtime_ns, info.st_size, info.st_ino]
+
+
+def _memo_path(memo_dir: Path, toplevel: Path) -> Path:
+    name = hashlib.sha256(os.fsencode(toplevel)).hexdigest()[:32]
+    return memo_dir / f"{name}.json"
+
+
+def _load_memo(path: Path | None) -> dict[str, Any]:
+    if path is None:
+        return {}
+    try:
+        memo = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return memo if isinstance(memo, dict) and memo.get("v") == MEMO_VERSION else {}
+
+
+def _save_memo(path: Path | None, memo: dict[str, Any]) -> None:
+    if path is None:
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(memo, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def tree_state(repo: Path, memo_dir: Path | None = None) -> tuple[str, str]:
+    """Return (head, dirty) for ``repo``; ("nogit", "unknown") outside a git work tree."""
+    located = _git(repo, "rev-parse", "--show-toplevel", "--git-path", "index")
+    if located.returncode != 0:
+        return "nogit", "unknown"
+    toplevel_raw, index_raw = located.stdout.decode("utf-8", errors="surrogateescape").splitlines()[:2]
+    toplevel = Path(toplevel_raw)
+    index_file = Path(index_raw) if os.path.isabs(index_raw) else repo / index_raw
+
+    head_proc = _git(repo, "rev-parse", "-q", "--verify", "HEAD")
+    head = head_proc.stdout.decode("ascii").strip() if head_proc.returncode == 0 else "unknown"
+    base = head if head != "unknown" else EMPTY_TREE
+
+    memo_file = _memo_path(memo_dir, toplevel) if memo_dir is not None else None
+    memo = _load_memo(memo_file)
+    index_key = _stat_key(index_file)
+
+    # The staged side depends only on HEAD and the index file.
+    staged = memo.get("staged") if memo.get("index") == index_key and memo.get("head") == head else None
+    if index_key is None or not isinstance(staged, list):
+        diff = _git(toplevel, "diff-index", "--cached", "--no-renames", "-z", base)
+        if diff.returncode != 0:
+            return head, "unknown"
+        staged = _diff_records(diff.stdout)
+
+    files = _git(toplevel, "diff-files", "--no-renames", "-z")
+    if files.returncode != 0:
+        return head, "unknown"
+
+    # path -> (HEAD state, worktree state); a state is "<mode> <blob id>" or "deleted".
+    changes: dict[str, list[str]] = {}
+    for old_mode, new_mode, old_id, new_id, status, rel in staged:
+        head_state = "deleted" if status == "A" else f"{old_mode} {old_id}"
+        changes[rel] = [head_state, "deleted" if status == "D" else f"{new_mode} {new_id}"]
+
+    known = memo.get("files") if isinstance(memo.get("files"), dict) else {}
+    blobs: dict[str, list[Any]] = {}
+    for old_mode, new_mode, index_id, _, status, rel in _diff_records(files.stdout):
+        head_state = changes[rel][0] if rel in changes else f"{old_mode} {index_id}"
+        path = toplevel / rel
+        if status == "D" or not os.path.lexists(path):
+            changes[rel] = [head_state, "deleted"]
+            continue
+        if new_mode == SUBMODULE_MODE:
+            changes[rel] = [head_state, "submodule modified"]
+            continue
+        stat_key = _stat_key(path)
+        cached = known.get(rel)
+        if isinstance(cached, list) and len(cached) == 2 and cached[0] == stat_key:
+            worktree_id = cached[1]
+        else:
+            try:
+                worktree_id = blob_id(path)
+            except OSError:
+                worktree_id = "unreadable"
+        blobs[rel] = [stat_key, worktree_id]
+        changes[rel] = [head_state, f"{new_mode} {worktree_id}"]
+
+    if index_key is not None:
+        _save_memo(memo_file, {"v": MEMO_VERSION, "index": index_key, "head": head, "staged": staged, "files": blobs})
+
+    # Compare the worktree to HEAD, so staging a change (or touching a file) keeps the key.
+    modified = sorted((rel, state[1]) for rel, state in changes.items() if state[0] != state[1])
+    if not modified:
+        return head, "clean"
+    digest = hashlib.sha256()
+    for rel, state in modified:
+        digest.update(f"{state} {rel}\n".encode("utf-8", errors="surrogateescape"))
+    return head, digest.hexdigest()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Print the HEAD/dirty fingerprint used in Codex cache keys.")
+    parser.add_argument("repo", type=Path)
+    parser.add_argument("--memo-dir", type=Path, help="Directory for memoized index and file hashes")
+    args = parser.parse_args()
+    head, dirty = tree_state(args.repo, args.memo_dir)
+    print(f"head={head}")
+    print(f"dirty={dirty}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
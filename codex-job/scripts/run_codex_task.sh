@@ -21,6 +21,7 @@ Options:
   --tier <level>        Model tier: low (default), medium, high
   --provider <name>     Model provider: openai (default), anthropic
   --no-cache            Disable result cache lookup/store for this run
+  --json-events         Run codex exec --json and parse exact token counts from its event stream
   --cache-dir <path>    Override cache directory (default: $XDG_CACHE_HOME/codex-job or ~/.cache/codex-job)
   --summarize           Emit one-line summary after run completion
   --summarizer <path>   Override one-line summarizer script path
@@ -31,7 +32,13 @@ Options:
 Environment:
   CODEX_API_KEY         Required for Codex CLI authentication
   CODEX_TIMEOUT_SECONDS Timeout for codex command (default: 1800)
+  CODEX_PROGRESS_INTERVAL Seconds between live progress.json updates (default: 5, 0 disables)
   CODEX_CACHE_DIR       Optional cache directory override
+  CODEX_CACHE_MAX_BYTES Cache size limit, e.g. 500M or 2G (default: 1G, 0 disables)
+  CODEX_CACHE_MAX_ENTRIES Cache entry limit (default: 1000, 0 disables)
+  CODEX_CACHE_TTL_SECONDS Cache entry lifetime (default: 2592000 = 30 days, 0 disables)
+  CODEX_CACHE_WAIT_SECONDS How long to wait for an identical in-flight run (default: 1800, 0 disables)
+  CODEX_CACHE_TASK_IGNORE_FILE Regex patterns (one per line) removed from the task before keying
   CODEX_SUMMARIZER_PATH Optional one-line summarizer script path
   CODEX_WEBHOOK_SECRET  Optional signing secret for notify hooks
   WEBHOOK_SECRET        Optional signing secret for notify hooks
@@ -95,9 +102,11 @@ MODEL_TIER=""
 MODEL_PROVIDER=""
 EXTRA_ARGS=()
 ORIGINAL_ARGS=("$@")
+LOG_FORMAT="text"
 CACHE_ENABLED=1
 CACHE_DIR="${CODEX_CACHE_DIR:-}"
 CACHE_KEY=""
+CACHE_REASON=""
 CACHE_ENTRY_DIR=""
 CACHE_STATUS="off"
 CACHE_ELIGIBLE=0
@@ -108,6 +117,7 @@ SUMMARIZER="${CODEX_SUMMARIZER_PATH:-}"
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PARSER="$SCRIPT_DIR/parse_codex_run.py"
+RUNTIME="$SCRIPT_DIR/codex_runtime.py"
 if [[ -z "$SUMMARIZER" ]]; then
   SUMMARIZER="$SCRIPT_DIR/summarize_codex_run.py"
 fi
@@ -116,6 +126,9 @@ RUN_ID=""
 LOG_FILE=""
 META_FILE=""
 SUMMARY_PATH=""
+PROGRESS_FILE=""
+PROGRESS_CHECKPOINT=""
+PROGRESS_PID=""
 START_EPOCH=""
 END_EPOCH=""
 ELAPSED=""
@@ -132,6 +145,10 @@ CODEX_CMD_QUOTED=""
 SCRIPT_CMD_QUOTED=""
 CODEX_EXIT=1
 ERROR_MSG=""
+RUNTIME_PID=""
+RUNTIME_REPLY=""
+RUNTIME_ERROR=""
+EVENT_JSON=""
 SUMMARY_WRITTEN=0
 FINALIZED=0
 IN_RUN_MODE=0
@@ -139,6 +156,8 @@ RUN_COMPLETED_EVENT_EMITTED=0
 
 DEFAULT_MODEL_TIER="low"
 CODEX_TIMEOUT_SECONDS="${CODEX_TIMEOUT_SECONDS:-1800}"
+CODEX_CACHE_WAIT_SECONDS="${CODEX_CACHE_WAIT_SECONDS:-1800}"
+CODEX_PROGRESS_INTERVAL="${CODEX_PROGRESS_INTERVAL:-5}"
 
 doctor_line() {
   local status="$1"
@@ -332,56 +351,86 @@ detect_model_arg() {
   return 1
 }
 
-map_tier_to_model() {
-  local tier="$1"
-  local provider="${2:-openai}"  # Default to openai if not specified
-  local script_dir models_file model_id
+start_runtime() {
+  # One interpreter per run: meta/summary/event JSON is built by codex_runtime.py, which
+  # answers NUL-delimited requests on a coprocess pipe (see runtime_request). Its stderr
+  # stays on the run's stderr so a traceback is not lost.
+  coproc CODEX_RUNTIME { exec python3 "$RUNTIME"; }
+  RUNTIME_PID="$CODEX_RUNTIME_PID"
+}
 
-  script_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-  models_file="$script_dir/../references/available_models.jsonl"
-
-  if [[ ! -f "$models_file" ]]; then
-    # Fallback to hardcoded defaults if models file missing
-    case "$tier" in
-      low) echo "gpt-5.1-codex-mini" ;;
-      medium) echo "gpt-5.4-mini" ;;
-      high) echo "gpt-5.4-mini" ;;
-      *) return 1 ;;
-    esac
-    return 0
+runtime_payload() {
+  local command="$1"
+  shift
+  printf '%s\0' "$command" \
+    "run_id=$RUN_ID" \
+    "session_id=$SESSION_ID" \
+    "repo=$REPO" \
+    "mode=$MODE" \
+    "task=$TASK" \
+    "task_file=$TASK_FILE" \
+    "resume_session=$RESUME_SESSION" \
+    "codex_bin=$CODEX_BIN" \
+    "log_file=$LOG_FILE" \
+    "meta_file=$META_FILE" \
+    "summary_file=$SUMMARY_PATH" \
+    "started_at=$START_ISO" \
+    "ended_at=$END_ISO" \
+    "elapsed_seconds=$ELAPSED" \
+    "exit_code=$CODEX_EXIT" \
+    "model=$MODEL_SELECTED" \
+    "model_tier=$MODEL_TIER" \
+    "model_source=$MODEL_SOURCE" \
+    "cache_status=$CACHE_STATUS" \
+    "cache_key=$CACHE_KEY" \
+    "cache_reason=$CACHE_REASON" \
+    "cache_entry_dir=$CACHE_ENTRY_DIR" \
+    "one_line_summary=$SUMMARY_LINE" \
+    "log_format=$LOG_FORMAT" \
+    "$@" ""
+}
+
+runtime_request() {
+  RUNTIME_REPLY=""
+  RUNTIME_ERROR=""
+  if [[ -z "$RUNTIME_PID" || -z "${CODEX_RUNTIME[1]:-}" ]]; then
+    RUNTIME_ERROR="codex runtime is not running (python3 is required)"
+    echo "Error: $RUNTIME_ERROR" >&2
+    return 1
   fi
 
-  # Query available_models.jsonl for matching tier and provider
-  model_id=$(grep -v '^[[:space:]]*#' "$models_file" 2>/dev/null | \
-    python3 -c "
-import sys, json
-tier = '$tier'
-provider = '$provider'
-for line in sys.stdin:
-    line = line.strip()
-    if not line:
-        continue
-    try:
-        model = json.loads(line)
-        if model.get('tier') == tier and model.get('provider') == provider:
-            print(model['model_id'])
-            sys.exit(0)
-    except:
-        continue
-" 2>/dev/null)
-
-  if [[ -n "$model_id" ]]; then
-    echo "$model_id"
-    return 0
+  local status=""
+  runtime_payload "$@" >&"${CODEX_RUNTIME[1]}" 2>/dev/null || {
+    RUNTIME_ERROR="codex runtime exited unexpectedly"
+    echo "Error: $RUNTIME_ERROR" >&2
+    return 1
+  }
+  IFS= read -r -d '' status <&"${CODEX_RUNTIME[0]}" || status="error"
+  IFS= read -r -d '' RUNTIME_REPLY <&"${CODEX_RUNTIME[0]}" || true
+  if [[ "$status" != "ok" ]]; then
+    RUNTIME_ERROR="${RUNTIME_REPLY:-codex runtime exited unexpectedly}"
+    RUNTIME_REPLY=""
+    return 1
   fi
+}
 
-  # Fallback if no match found
-  case "$tier" in
-    low) echo "gpt-5.1-codex-mini" ;;
-    medium) echo "gpt-5.4-mini" ;;
-    high) echo "gpt-5.4-mini" ;;
-    *) return 1 ;;
-  esac
+runtime_request_direct() {
+  # Same protocol against a one-shot interpreter, for when the coprocess itself is gone.
+  RUNTIME_ERROR=""
+  local status=""
+  {
+    IFS= read -r -d '' status || status="error"
+    IFS= read -r -d '' RUNTIME_REPLY || true
+  } < <(runtime_payload "$@" | python3 "$RUNTIME")
+  if [[ "$status" != "ok" ]]; then
+    RUNTIME_ERROR="${RUNTIME_REPLY:-codex runtime exited unexpectedly}"
+    RUNTIME_REPLY=""
+    return 1
+  fi
+}
+
+runtime_request_or_direct() {
+  runtime_request "$@" || runtime_request_direct "$@"
 }
 
 resolve_cache_dir() {
@@ -400,48 +449,6 @@ resolve_cache_dir() {
   printf '%s' "$LOG_DIR/.cache/codex-job"
 }
 
-hash_text_stdin() {
-  if command -v sha256sum >/dev/null 2>&1; then
-    sha256sum | awk '{print $1}'
-    return 0
-  fi
-  if command -v shasum >/dev/null 2>&1; then
-    shasum -a 256 | awk '{print $1}'
-    return 0
-  fi
-  python3 - <<'PY'
-import hashlib
-import sys
-print(hashlib.sha256(sys.stdin.buffer.read()).hexdigest())
-PY
-}
-
-repo_fingerprint() {
-  local repo_abs
-  repo_abs="$(cd "$REPO" && pwd)"
-
-  local git_head="nogit"
-  local git_dirty="unknown"
-  if git -C "$REPO" rev-parse --is-inside-work-tree >/dev/null 2>&1; then
-    git_head="$(git -C "$REPO" rev-parse HEAD 2>/dev/null || echo unknown)"
-    if [[ -n "$(git -C "$REPO" status --porcelain 2>/dev/null)" ]]; then
-      git_dirty="dirty"
-    else
-      git_dirty="clean"
-    fi
-  fi
-
-  cat <<EOF
-repo=$repo_abs
-head=$git_head
-dirty=$git_dirty
-mode=$MODE
-model=$MODEL_SELECTED
-tier=$MODEL_TIER
-task=$TASK
-EOF
-}
-
 prepare_cache_lookup() {
   if [[ "$CACHE_ENABLED" -ne 1 ]]; then
     CACHE_STATUS="disabled"
@@ -463,133 +470,125 @@ prepare_cache_lookup() {
     fi
   fi
 
-  CACHE_KEY="$(repo_fingerprint | hash_text_stdin)"
+  # Repo path, HEAD, dirty-content hash (repo_fingerprint.py), mode, model, tier, and the
+  # canonical task text (task_key.py: whitespace, guardrail preamble, ignore patterns).
+  local repo_abs
+  repo_abs="$(cd "$REPO" && pwd)"
+  if ! runtime_request cache_key "cache_dir=$CACHE_DIR" "repo_path=$repo_abs"; then
+    echo "Warning: cache disabled for this run: $RUNTIME_ERROR" >&2
+    CACHE_STATUS="disabled"
+    return 1
+  fi
+  CACHE_KEY="$RUNTIME_REPLY"
   CACHE_ENTRY_DIR="$CACHE_DIR/$CACHE_KEY"
   CACHE_ELIGIBLE=1
   CACHE_STATUS="miss"
 
-  if [[ -f "$CACHE_ENTRY_DIR/summary.json" && -f "$CACHE_ENTRY_DIR/meta.json" && -f "$CACHE_ENTRY_DIR/log.txt" ]]; then
+  # The index drops expired entries, records the hit for LRU eviction, and explains misses.
+  runtime_request cache_lookup "cache_dir=$CACHE_DIR" || return 1
+  local lookup_status
+  read -r lookup_status CACHE_REASON <<< "$RUNTIME_REPLY"
+  if [[ "$lookup_status" == "hit" ]]; then
     CACHE_HIT=1
     CACHE_STATUS="hit"
     return 0
   fi
+  claim_inflight_run
+}
+
+# Single flight: the first runner to miss a key holds its lock (inside the runtime process)
+# until persist_cache_entry; identical runs started meanwhile wait, then take the stored entry
+# as a hit. A crashed leader's lock is released by the kernel and the next waiter runs Codex.
+claim_inflight_run() {
+  if [[ "$CODEX_CACHE_WAIT_SECONDS" -eq 0 ]]; then
+    return 1
+  fi
+  runtime_request cache_claim "cache_dir=$CACHE_DIR" "wait_seconds=0" || return 1
+  if [[ "$RUNTIME_REPLY" == busy\ * ]]; then
+    echo "Waiting up to ${CODEX_CACHE_WAIT_SECONDS}s for an identical in-flight run (${RUNTIME_REPLY#busy })..." >&2
+    runtime_request cache_claim "cache_dir=$CACHE_DIR" "wait_seconds=$CODEX_CACHE_WAIT_SECONDS" || return 1
+  fi
+  case "$RUNTIME_REPLY" in
+    hit\ *)
+      CACHE_HIT=1
+      CACHE_STATUS="hit"
+      CACHE_REASON="${RUNTIME_REPLY#hit }"
+      return 0
+      ;;
+    timeout)
+      echo "Warning: in-flight run did not finish within ${CODEX_CACHE_WAIT_SECONDS}s; running Codex anyway." >&2
+      CACHE_REASON="wait_timeout"
+      ;;
+  esac
   return 1
 }
 
 write_cached_summary() {
-  local cached_summary="$1"
-  CACHED_SUMMARY_PATH="$cached_summary" \
-  RUN_ID_ENV="$RUN_ID" \
-  SESSION_ID_ENV="$SESSION_ID" \
-  START_ISO_ENV="$START_ISO" \
-  END_ISO_ENV="$END_ISO" \
-  ELAPSED_ENV="$ELAPSED" \
-  CODEX_EXIT_ENV="$CODEX_EXIT" \
-  LOG_FILE_ENV="$LOG_FILE" \
-  META_FILE_ENV="$META_FILE" \
-  CACHE_KEY_ENV="$CACHE_KEY" \
-  CACHE_DIR_ENV="$CACHE_ENTRY_DIR" \
-  python3 - <<'PY' > "$SUMMARY_PATH"
-import json
-import os
-from pathlib import Path
-
-cached_path = Path(os.environ["CACHED_SUMMARY_PATH"])
-run_id = os.environ["RUN_ID_ENV"]
-session_id = os.environ.get("SESSION_ID_ENV") or None
-start = os.environ["START_ISO_ENV"]
-end = os.environ["END_ISO_ENV"]
-elapsed = int(os.environ.get("ELAPSED_ENV", "0"))
-exit_code = int(os.environ.get("CODEX_EXIT_ENV", "0"))
-log_file = os.environ["LOG_FILE_ENV"]
-meta_file = os.environ["META_FILE_ENV"]
-cache_key = os.environ.get("CACHE_KEY_ENV")
-cache_dir = os.environ.get("CACHE_DIR_ENV")
-
-try:
-    base = json.loads(cached_path.read_text(encoding="utf-8"))
-except Exception:
-    base = {}
-if not isinstance(base, dict):
-    base = {}
-
-base["id"] = run_id
-base["sid"] = session_id
-base["start"] = start
-base["end"] = end
-base["time"] = elapsed
-base["exit"] = exit_code
-base["ok"] = exit_code == 0
-base["log"] = log_file
-base["meta"] = meta_file
-base["cache"] = {"status": "hit", "key": cache_key, "dir": cache_dir}
-
-legacy = base.get("legacy")
-if not isinstance(legacy, dict):
-    legacy = {}
-legacy["run_id"] = run_id
-legacy["session_id"] = session_id
-legacy["started_at"] = start
-legacy["ended_at"] = end
-legacy["elapsed_seconds"] = elapsed
-legacy["exit_code"] = exit_code
-legacy["success"] = exit_code == 0
-legacy["log_file"] = log_file
-legacy["meta_file"] = meta_file
-legacy["cache_status"] = "hit"
-legacy["cache_key"] = cache_key
-base["legacy"] = legacy
-
-print(json.dumps(base, ensure_ascii=True, separators=(",", ":")))
-PY
+  runtime_request_or_direct write_cached_summary "cached_summary=$1" && return 0
+  echo "Warning: could not rewrite the cached summary: $RUNTIME_ERROR" >&2
+  write_fallback_summary "cached summary could not be rewritten: $RUNTIME_ERROR"
 }
 
 load_cache_hit_metadata() {
-  local cached_summary="$1"
-  read -r CODEX_EXIT SESSION_ID < <(
-    python3 - "$cached_summary" <<'PY'
-import json
-import sys
-from pathlib import Path
-
-path = Path(sys.argv[1])
-exit_code = 0
-session = "unknown"
-try:
-    data = json.loads(path.read_text(encoding="utf-8"))
-    if isinstance(data, dict):
-        raw_exit = data.get("exit")
-        if raw_exit is None and isinstance(data.get("legacy"), dict):
-            raw_exit = data["legacy"].get("exit_code")
-        if isinstance(raw_exit, int):
-            exit_code = raw_exit
-        raw_session = data.get("sid")
-        if raw_session is None and isinstance(data.get("legacy"), dict):
-            raw_session = data["legacy"].get("session_id")
-        if isinstance(raw_session, str) and raw_session:
-            session = raw_session
-except Exception:
-    pass
-print(f"{exit_code} {session}")
-PY
-  )
+  if ! runtime_request_or_direct cache_hit_metadata "cached_summary=$1"; then
+    echo "Warning: could not read the cached run's exit code and session: $RUNTIME_ERROR" >&2
+    RUNTIME_REPLY="0 unknown"
+  fi
+  read -r CODEX_EXIT SESSION_ID <<< "$RUNTIME_REPLY"
 }
 
 persist_cache_entry() {
   if [[ "$CACHE_ELIGIBLE" -ne 1 || "$CACHE_ENABLED" -ne 1 || "$CACHE_HIT" -eq 1 ]]; then
     return
   fi
-  if [[ "$CODEX_EXIT" -ne 0 ]]; then
+  if [[ "$CODEX_EXIT" -eq 0 && -n "$CACHE_ENTRY_DIR" ]]; then
+    if ! runtime_request cache_store "cache_dir=$CACHE_DIR"; then
+      echo "Warning: could not store cache entry: $RUNTIME_ERROR" >&2
+    elif [[ "$RUNTIME_REPLY" == "stored" ]]; then
+      # "skipped" means the entry alone is larger than CODEX_CACHE_MAX_BYTES.
+      CACHE_STATUS="stored"
+    fi
+  fi
+  # Wake identical runs waiting on this key; they re-check the cache.
+  runtime_request cache_release "cache_dir=$CACHE_DIR" || true
+}
+
+start_progress_follower() {
+  if [[ "$CODEX_PROGRESS_INTERVAL" == "0" || ! -f "$PARSER" ]]; then
     return
   fi
-  if [[ -z "$CACHE_ENTRY_DIR" ]]; then
+  PROGRESS_FILE="$LOG_DIR/codex-run-$RUN_ID.progress.json"
+  PROGRESS_CHECKPOINT="$LOG_DIR/codex-run-$RUN_ID.progress.ckpt"
+  python3 "$PARSER" \
+    --log "$LOG_FILE" \
+    --follow \
+    --pid "$$" \
+    --interval "$CODEX_PROGRESS_INTERVAL" \
+    --checkpoint "$PROGRESS_CHECKPOINT" \
+    --progress "$PROGRESS_FILE" \
+    </dev/null >/dev/null 2>&1 &
+  PROGRESS_PID=$!
+}
+
+stop_progress_follower() {
+  if [[ -z "$PROGRESS_PID" ]]; then
     return
   fi
-  mkdir -p "$CACHE_ENTRY_DIR"
-  cp "$SUMMARY_PATH" "$CACHE_ENTRY_DIR/summary.json"
-  cp "$META_FILE" "$CACHE_ENTRY_DIR/meta.json"
-  cp "$LOG_FILE" "$CACHE_ENTRY_DIR/log.txt"
-  CACHE_STATUS="stored"
+  # The follower takes one last step over the finished log before exiting. If the signal
+  # beat its handler (very short runs), take that step here instead.
+  local follower_exit=0
+  kill -TERM "$PROGRESS_PID" 2>/dev/null || true
+  wait "$PROGRESS_PID" 2>/dev/null || follower_exit=$?
+  PROGRESS_PID=""
+  if [[ "$follower_exit" -ne 0 ]]; then
+    python3 "$PARSER" \
+      --log "$LOG_FILE" \
+      --final \
+      --checkpoint "$PROGRESS_CHECKPOINT" \
+      --progress "$PROGRESS_FILE" \
+      >/dev/null 2>&1 || true
+  fi
+  rm -f "$PROGRESS_CHECKPOINT"
 }
 
 summary_report_path() {
@@ -615,23 +614,12 @@ generate_one_line_summary() {
     return
   fi
 
-  local cmd=()
-  if [[ -x "$SUMMARIZER" ]]; then
-    cmd=("$SUMMARIZER" --summary "$report_path")
-  else
-    cmd=(python3 "$SUMMARIZER" --summary "$report_path")
-  fi
-
-  set +e
-  SUMMARY_LINE="$("${cmd[@]}" 2>/dev/null)"
-  local summarize_exit=$?
-  set -e
-  if [[ "$summarize_exit" -ne 0 ]]; then
+  if ! runtime_request one_line_summary "summary_path=$report_path" "summarizer=$SUMMARIZER"; then
     SUMMARY_LINE=""
-    echo "Warning: one-line summarizer failed with exit $summarize_exit" >&2
+    echo "Warning: one-line summarizer failed: $RUNTIME_ERROR" >&2
     return
   fi
-  SUMMARY_LINE="$(printf '%s' "$SUMMARY_LINE" | head -n1)"
+  SUMMARY_LINE="$RUNTIME_REPLY"
 }
 
 emit_event() {
@@ -654,193 +642,21 @@ emit_event() {
 }
 
 make_event_json() {
-  local event_name="$1"
-  local event_status="$2"
-  local event_exit="${3:-}"
-
-  EVENT_NAME="$event_name" \
-  EVENT_STATUS="$event_status" \
-  EVENT_EXIT="$event_exit" \
-  EVENT_RUN_ID="$RUN_ID" \
-  EVENT_SESSION_ID="$SESSION_ID" \
-  EVENT_REPO="$REPO" \
-  EVENT_MODE="$MODE" \
-  EVENT_LOG_FILE="$LOG_FILE" \
-  EVENT_META_FILE="$META_FILE" \
-  EVENT_SUMMARY_FILE="$SUMMARY_PATH" \
-  EVENT_STARTED_AT="$START_ISO" \
-  EVENT_ENDED_AT="$END_ISO" \
-  EVENT_ELAPSED="$ELAPSED" \
-  python3 - <<'PY'
-import json
-import os
-from datetime import datetime, timezone
-
-
-def nullable(name: str):
-    value = os.environ.get(name, "")
-    if value in ("", "unknown"):
-        return None
-    return value
-
-
-def nullable_int(name: str):
-    value = os.environ.get(name, "")
-    if value == "":
-        return None
-    try:
-        return int(value)
-    except ValueError:
-        return None
-
-obj = {
-    "event": os.environ["EVENT_NAME"],
-    "status": os.environ["EVENT_STATUS"],
-    "run_id": nullable("EVENT_RUN_ID"),
-    "session_id": nullable("EVENT_SESSION_ID"),
-    "repo": nullable("EVENT_REPO"),
-    "mode": nullable("EVENT_MODE"),
-    "exit_code": nullable_int("EVENT_EXIT"),
-    "log_file": nullable("EVENT_LOG_FILE"),
-    "meta_file": nullable("EVENT_META_FILE"),
-    "summary_file": nullable("EVENT_SUMMARY_FILE"),
-    "started_at": nullable("EVENT_STARTED_AT"),
-    "ended_at": nullable("EVENT_ENDED_AT"),
-    "elapsed_seconds": nullable_int("EVENT_ELAPSED"),
-    "source": "run_codex_task.sh",
-    "ts": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
-}
-print(json.dumps(obj, ensure_ascii=True))
-PY
+  EVENT_JSON=""
+  runtime_request event "event=$1" "event_status=$2" "event_exit=${3:-}" || return 1
+  EVENT_JSON="$RUNTIME_REPLY"
 }
 
 write_meta_file() {
-  RUN_ID_ENV="$RUN_ID" \
-  SESSION_ID_ENV="$SESSION_ID" \
-  REPO_ENV="$REPO" \
-  TASK_ENV="$TASK" \
-  TASK_FILE_ENV="$TASK_FILE" \
-  RESUME_SESSION_ENV="$RESUME_SESSION" \
-  CODEX_BIN_ENV="$CODEX_BIN" \
-  LOG_FILE_ENV="$LOG_FILE" \
-  META_FILE_ENV="$META_FILE" \
-  START_ISO_ENV="$START_ISO" \
-  END_ISO_ENV="$END_ISO" \
-  ELAPSED_ENV="$ELAPSED" \
-  CODEX_EXIT_ENV="$CODEX_EXIT" \
-  MODEL_SELECTED_ENV="$MODEL_SELECTED" \
-  MODEL_TIER_ENV="$MODEL_TIER" \
-  MODEL_SOURCE_ENV="$MODEL_SOURCE" \
-  CACHE_STATUS_ENV="$CACHE_STATUS" \
-  CACHE_KEY_ENV="$CACHE_KEY" \
-  SUMMARY_LINE_ENV="$SUMMARY_LINE" \
-  python3 - <<'PY' > "$META_FILE"
-import json
-import os
-
-session_id = os.environ.get("SESSION_ID_ENV") or "unknown"
-obj = {
-    "run_id": os.environ.get("RUN_ID_ENV"),
-    "session_id": None if session_id == "unknown" else session_id,
-    "repo": os.environ.get("REPO_ENV"),
-    "task": os.environ.get("TASK_ENV") or None,
-    "task_file": os.environ.get("TASK_FILE_ENV", "") or None,
-    "resume_session": os.environ.get("RESUME_SESSION_ENV") or None,
-    "codex_bin": os.environ.get("CODEX_BIN_ENV"),
-    "log_file": os.environ.get("LOG_FILE_ENV"),
-    "meta_file": os.environ.get("META_FILE_ENV"),
-    "started_at": os.environ.get("START_ISO_ENV"),
-    "ended_at": os.environ.get("END_ISO_ENV"),
-    "elapsed_seconds": int(os.environ.get("ELAPSED_ENV", "0")),
-    "exit_code": int(os.environ.get("CODEX_EXIT_ENV", "1")),
-    "model": os.environ.get("MODEL_SELECTED_ENV") or None,
-    "model_tier": os.environ.get("MODEL_TIER_ENV") or None,
-    "model_source": os.environ.get("MODEL_SOURCE_ENV") or None,
-    "cache_status": os.environ.get("CACHE_STATUS_ENV") or None,
-    "cache_key": os.environ.get("CACHE_KEY_ENV") or None,
-    "one_line_summary": os.environ.get("SUMMARY_LINE_ENV") or None,
-}
-print(json.dumps(obj, ensure_ascii=True, indent=2))
-PY
+  # meta.json is rewritten at every stage, so a failed write is reported and the run goes on.
+  runtime_request_or_direct write_meta && return 0
+  echo "Warning: could not write meta file: $RUNTIME_ERROR" >&2
 }
 
 write_fallback_summary() {
-  local err_msg="$1"
-  RUN_ID_ENV="$RUN_ID" \
-  SESSION_ID_ENV="$SESSION_ID" \
-  REPO_ENV="$REPO" \
-  TASK_ENV="$TASK" \
-  RESUME_SESSION_ENV="$RESUME_SESSION" \
-  START_ISO_ENV="$START_ISO" \
-  END_ISO_ENV="$END_ISO" \
-  ELAPSED_ENV="$ELAPSED" \
-  CODEX_EXIT_ENV="$CODEX_EXIT" \
-  MODEL_SELECTED_ENV="$MODEL_SELECTED" \
-  MODEL_TIER_ENV="$MODEL_TIER" \
-  MODEL_SOURCE_ENV="$MODEL_SOURCE" \
-  CACHE_STATUS_ENV="$CACHE_STATUS" \
-  CACHE_KEY_ENV="$CACHE_KEY" \
-  LOG_FILE_ENV="$LOG_FILE" \
-  META_FILE_ENV="$META_FILE" \
-  ERR_MSG_ENV="$err_msg" \
-  python3 - <<'PY' > "$SUMMARY_PATH"
-import json
-import os
-
-exit_code = int(os.environ.get("CODEX_EXIT_ENV", "1"))
-session_id = os.environ.get("SESSION_ID_ENV") or "unknown"
-err = os.environ.get("ERR_MSG_ENV") or None
-
-legacy = {
-    "run_id": os.environ.get("RUN_ID_ENV"),
-    "session_id": None if session_id == "unknown" else session_id,
-    "resume_session": os.environ.get("RESUME_SESSION_ENV") or None,
-    "repo": os.environ.get("REPO_ENV"),
-    "task": os.environ.get("TASK_ENV") or None,
-    "model": os.environ.get("MODEL_SELECTED_ENV") or None,
-    "model_tier": os.environ.get("MODEL_TIER_ENV") or None,
-    "model_source": os.environ.get("MODEL_SOURCE_ENV") or None,
-    "cache_status": os.environ.get("CACHE_STATUS_ENV") or None,
-    "cache_key": os.environ.get("CACHE_KEY_ENV") or None,
-    "started_at": os.environ.get("START_ISO_ENV"),
-    "ended_at": os.environ.get("END_ISO_ENV"),
-    "elapsed_seconds": int(os.environ.get("ELAPSED_ENV", "0")),
-    "exit_code": exit_code,
-    "success": exit_code == 0,
-    "log_file": os.environ.get("LOG_FILE_ENV"),
-    "meta_file": os.environ.get("META_FILE_ENV"),
-    "token_usage": {"input_tokens": None, "output_tokens": None, "total_tokens": None, "evidence": {}},
-    "cost": {"usd": None, "evidence": None},
-}
-
-obj = {
-    "id": os.environ.get("RUN_ID_ENV"),
-    "sid": None if session_id == "unknown" else session_id,
-    "repo": os.environ.get("REPO_ENV"),
-    "task": os.environ.get("TASK_ENV") or None,
-    "resume": os.environ.get("RESUME_SESSION_ENV") or None,
-    "start": os.environ.get("START_ISO_ENV"),
-    "end": os.environ.get("END_ISO_ENV"),
-    "time": int(os.environ.get("ELAPSED_ENV", "0")),
-    "exit": exit_code,
-    "ok": exit_code == 0,
-    "mdl": os.environ.get("MODEL_SELECTED_ENV") or None,
-    "tier": os.environ.get("MODEL_TIER_ENV") or None,
-    "msrc": os.environ.get("MODEL_SOURCE_ENV") or None,
-    "log": os.environ.get("LOG_FILE_ENV"),
-    "meta": os.environ.get("META_FILE_ENV"),
-    "tok": None,
-    "cost": None,
-    "err": err,
-    "cache": {
-        "status": os.environ.get("CACHE_STATUS_ENV") or None,
-        "key": os.environ.get("CACHE_KEY_ENV") or None,
-    },
-    "src": "run_codex_task.sh",
-    "legacy": legacy,
-}
-print(json.dumps(obj, ensure_ascii=True, separators=(",", ":")))
-PY
+  runtime_request_or_direct write_fallback_summary "err=$1" && return 0
+  echo "Warning: could not write fallback summary: $RUNTIME_ERROR" >&2
+  return 1
 }
 
 ensure_summary_json() {
@@ -852,19 +668,7 @@ ensure_summary_json() {
 
   write_meta_file
 
-  if [[ -f "$PARSER" ]]; then
-    set +e
-    if [[ -x "$PARSER" ]]; then
-      "$PARSER" --log "$LOG_FILE" --meta "$META_FILE" > "$SUMMARY_PATH"
-    else
-      python3 "$PARSER" --log "$LOG_FILE" --meta "$META_FILE" > "$SUMMARY_PATH"
-    fi
-    local parse_exit=$?
-    set -e
-    if [[ "$parse_exit" -ne 0 ]]; then
-      write_fallback_summary "$err_msg"
-    fi
-  else
+  if ! runtime_request_or_direct write_parsed_summary; then
     write_fallback_summary "$err_msg"
   fi
 
@@ -896,6 +700,12 @@ print_run_summary_lines() {
   if [[ -n "$CACHE_KEY" ]]; then
     lines+=("cache_key=$CACHE_KEY")
   fi
+  if [[ -n "$CACHE_REASON" ]]; then
+    lines+=("cache_reason=$CACHE_REASON")
+  fi
+  if [[ -n "$PROGRESS_FILE" ]]; then
+    lines+=("progress_file=$PROGRESS_FILE")
+  fi
   if [[ -n "$SUMMARY_LINE" ]]; then
     lines+=("summary_line=$SUMMARY_LINE")
   fi
@@ -933,7 +743,7 @@ finish_run() {
   ELAPSED=$((END_EPOCH - START_EPOCH))
 
   SESSION_ID="$({
-    grep -i "session.*id" "$LOG_FILE" 2>/dev/null || true
+    grep -iE 'session.*id|"thread_id"' "$LOG_FILE" 2>/dev/null || true
   } | grep -oE '[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}' | tail -1)"
 
   if [[ -z "$SESSION_ID" ]]; then
@@ -941,6 +751,7 @@ finish_run() {
     SESSION_ID="unknown"
   fi
 
+  stop_progress_follower
   ensure_summary_json "$err_msg"
   persist_cache_entry
   generate_one_line_summary
@@ -955,11 +766,11 @@ finish_run() {
   fi
 
   if [[ "$RUN_COMPLETED_EVENT_EMITTED" -eq 0 ]]; then
+    local completed_status="failure"
     if [[ "$CODEX_EXIT" -eq 0 ]]; then
-      emit_event "$(make_event_json "run_completed" "success" "$CODEX_EXIT")"
-    else
-      emit_event "$(make_event_json "run_completed" "failure" "$CODEX_EXIT")"
+      completed_status="success"
     fi
+    make_event_json "run_completed" "$completed_status" "$CODEX_EXIT" && emit_event "$EVENT_JSON"
     RUN_COMPLETED_EVENT_EMITTED=1
   fi
 
@@ -1036,6 +847,10 @@ while [[ $# -gt 0 ]]; do
       CACHE_ENABLED=0
       shift
       ;;
+    --json-events)
+      LOG_FORMAT="jsonl"
+      shift
+      ;;
     --cache-dir)
       CACHE_DIR="${2:-}"
       shift 2
@@ -1096,6 +911,7 @@ if [[ "$DOCTOR_MODE" -eq 1 ]]; then
 fi
 
 IN_RUN_MODE=1
+start_runtime
 
 if [[ -z "$REPO" ]]; then
   echo "Error: --repo is required." >&2
@@ -1142,6 +958,24 @@ if [[ ! "$CODEX_TIMEOUT_SECONDS" =~ ^[0-9]+$ ]]; then
   echo "Error: CODEX_TIMEOUT_SECONDS must be a non-negative integer." >&2
   exit 2
 fi
+if [[ ! "$CODEX_PROGRESS_INTERVAL" =~ ^[0-9]+$ ]]; then
+  echo "Error: CODEX_PROGRESS_INTERVAL must be a non-negative integer." >&2
+  exit 2
+fi
+if [[ -n "${CODEX_CACHE_MAX_BYTES:-}" && ! "$CODEX_CACHE_MAX_BYTES" =~ ^[0-9]+[KkMmGgTt]?[Bb]?$ ]]; then
+  echo "Error: CODEX_CACHE_MAX_BYTES must be a size such as 500M or 2G." >&2
+  exit 2
+fi
+for cache_limit_var in CODEX_CACHE_MAX_ENTRIES CODEX_CACHE_TTL_SECONDS CODEX_CACHE_WAIT_SECONDS; do
+  if [[ -n "${!cache_limit_var:-}" && ! "${!cache_limit_var}" =~ ^[0-9]+$ ]]; then
+    echo "Error: $cache_limit_var must be a non-negative integer." >&2
+    exit 2
+  fi
+done
+if [[ -n "${CODEX_CACHE_TASK_IGNORE_FILE:-}" && ! -f "$CODEX_CACHE_TASK_IGNORE_FILE" ]]; then
+  echo "Error: CODEX_CACHE_TASK_IGNORE_FILE does not exist: $CODEX_CACHE_TASK_IGNORE_FILE" >&2
+  exit 2
+fi
 if [[ "$CODEX_TIMEOUT_SECONDS" -gt 0 ]] && ! command -v timeout >/dev/null 2>&1; then
   echo "Error: timeout command is required for enforcing CODEX_TIMEOUT_SECONDS." >&2
   exit 127
@@ -1175,14 +1009,22 @@ EXPLICIT_MODEL="$(detect_model_arg || true)"
 if [[ -n "$EXPLICIT_MODEL" ]]; then
   MODEL_SELECTED="$EXPLICIT_MODEL"
   MODEL_SOURCE="explicit_model"
-else
-  MODEL_SELECTED="$(map_tier_to_model "$MODEL_TIER" "$MODEL_PROVIDER")"
+elif runtime_request_or_direct model_for_tier "tier=$MODEL_TIER" "provider=$MODEL_PROVIDER" && [[ -n "$RUNTIME_REPLY" ]]; then
+  MODEL_SELECTED="$RUNTIME_REPLY"
   if [[ "$MODEL_TIER" == "$DEFAULT_MODEL_TIER" ]]; then
     MODEL_SOURCE="tier_default"
   else
     MODEL_SOURCE="tier_flag"
   fi
   EXTRA_ARGS+=("--model" "$MODEL_SELECTED")
+else
+  # Without a mapped model, let Codex use its own default rather than pass an empty --model.
+  echo "Warning: could not map tier '$MODEL_TIER' to a model: ${RUNTIME_ERROR:-empty reply}" >&2
+  MODEL_SOURCE="codex_default"
+fi
+
+if [[ "$LOG_FORMAT" == "jsonl" ]]; then
+  EXTRA_ARGS+=("--json")
 fi
 
 if [[ -n "$RESUME_SESSION" ]]; then
@@ -1211,6 +1053,9 @@ SCRIPT_CMD_QUOTED="$(shell_join "$0" "${ORIGINAL_ARGS[@]}")"
 CODEX_CMD_QUOTED="$(shell_join "${CODEX_CMD[@]}")"
 
 prepare_cache_lookup || true
+if [[ "$CACHE_ELIGIBLE" -eq 1 ]]; then
+  runtime_request cache_record_lookup "cache_dir=$CACHE_DIR" "repo_path=$(cd "$REPO" && pwd)" || true
+fi
 
 : > "$LOG_FILE"
 {
@@ -1227,7 +1072,7 @@ if [[ "$LOG_VERBOSITY" == "high" || "$LOG_VERBOSITY" == "extreme" ]]; then
   } >> "$LOG_FILE"
 fi
 
-emit_event "$(make_event_json "run_started" "running")"
+make_event_json "run_started" "running" && emit_event "$EVENT_JSON"
 
 if [[ "$CACHE_HIT" -eq 1 ]]; then
   END_EPOCH="$START_EPOCH"
@@ -1254,11 +1099,11 @@ if [[ "$CACHE_HIT" -eq 1 ]]; then
   generate_one_line_summary
   write_meta_file
 
+  COMPLETED_STATUS="failure"
   if [[ "$CODEX_EXIT" -eq 0 ]]; then
-    emit_event "$(make_event_json "run_completed" "success" "$CODEX_EXIT")"
-  else
-    emit_event "$(make_event_json "run_completed" "failure" "$CODEX_EXIT")"
+    COMPLETED_STATUS="success"
   fi
+  make_event_json "run_completed" "$COMPLETED_STATUS" "$CODEX_EXIT" && emit_event "$EVENT_JSON"
   RUN_COMPLETED_EVENT_EMITTED=1
   print_run_summary_lines | tee -a "$LOG_FILE"
   if [[ "$LOG_VERBOSITY" == "low" ]]; then
@@ -1271,6 +1116,8 @@ if [[ "$CACHE_HIT" -eq 1 ]]; then
   exit "$CODEX_EXIT"
 fi
 
+start_progress_follower
+
 set +e
 if [[ "$CODEX_TIMEOUT_SECONDS" -gt 0 ]]; then
   timeout -s TERM "$CODEX_TIMEOUT_SECONDS" "${CODEX_CMD[@]}" 2>&1 | tee -a "$LOG_FILE"
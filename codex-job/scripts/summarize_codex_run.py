@@ -10,6 +10,8 @@ import sys
 from pathlib import Path
 from typing import Any, Mapping
 
+from summary_schema import cost, pick, token_usage
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Print a one-line summary for a Codex run summary JSON.")
@@ -29,21 +31,6 @@ def load_summary(path: Path) -> Mapping[str, Any]:
     return data
 
 
-def _legacy(summary: Mapping[str, Any]) -> Mapping[str, Any]:
-    legacy = summary.get("legacy")
-    return legacy if isinstance(legacy, Mapping) else {}
-
-
-def _pick(summary: Mapping[str, Any], key: str, legacy_key: str | None = None) -> Any:
-    value = summary.get(key)
-    if value is not None:
-        return value
-    legacy = _legacy(summary)
-    if legacy_key:
-        return legacy.get(legacy_key)
-    return None
-
-
 def _to_int(value: Any) -> int | None:
     if isinstance(value, bool):
         return None
@@ -63,7 +50,7 @@ def _to_float(value: Any) -> float | None:
 
 
 def _to_ok(summary: Mapping[str, Any], exit_code: int | None) -> bool | None:
-    ok = _pick(summary, "ok", "success")
+    ok = pick(summary, "ok")
     if isinstance(ok, bool):
         return ok
     if exit_code is not None:
@@ -89,25 +76,13 @@ def _fmt_cost(cost: float | None) -> str:
 
 
 def summarize(summary: Mapping[str, Any]) -> str:
-    tok = summary.get("tok") if isinstance(summary.get("tok"), Mapping) else {}
-    legacy_token = _legacy(summary).get("token_usage")
-    legacy_token = legacy_token if isinstance(legacy_token, Mapping) else {}
-
-    cost = summary.get("cost") if isinstance(summary.get("cost"), Mapping) else {}
-    legacy_cost = _legacy(summary).get("cost")
-    legacy_cost = legacy_cost if isinstance(legacy_cost, Mapping) else {}
-
-    run_id = _pick(summary, "id", "run_id") or "-"
-    session_id = _pick(summary, "sid", "session_id") or "-"
-    task = _sanitize_task(_pick(summary, "task", "task"))
-    exit_code = _to_int(_pick(summary, "exit", "exit_code"))
-    elapsed = _to_int(_pick(summary, "time", "elapsed_seconds"))
-    total_tokens = _to_int(tok.get("tot"))
-    if total_tokens is None:
-        total_tokens = _to_int(legacy_token.get("total_tokens"))
-    usd = _to_float(cost.get("usd"))
-    if usd is None:
-        usd = _to_float(legacy_cost.get("usd"))
+    run_id = pick(summary, "id") or "-"
+    session_id = pick(summary, "sid") or "-"
+    task = _sanitize_task(pick(summary, "task"))
+    exit_code = _to_int(pick(summary, "exit"))
+    elapsed = _to_int(pick(summary, "time"))
+    total_tokens = _to_int(token_usage(summary).get("tot"))
+    usd = _to_float(cost(summary).get("usd"))
 
     ok = _to_ok(summary, exit_code)
     status = "OK" if ok is True else "FAIL" if ok is False else "UNKNOWN"
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""Versioned Codex run summary schema shared by the parser, runner and summary readers.
+
+v1 summaries store every value twice: short top-level keys plus a verbose ``legacy`` block.
+v2 summaries (``"v": 2``) store each value once under the short keys, and ``legacy_view``
+rebuilds the verbose block on read. Readers go through ``pick``/``token_usage``/``cost``
+so they accept either version.
+
+Upgrade existing files in place:
+  summary_schema.py migrate runs/ ~/.cache/codex-job
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Iterator, Mapping
+
+SUMMARY_VERSION = 2
+
+# (short key, legacy key) for scalar fields.
+LEGACY_FIELDS = (
+    ("id", "run_id"),
+    ("sid", "session_id"),
+    ("resume", "resume_session"),
+    ("repo", "repo"),
+    ("task", "task"),
+    ("mdl", "model"),
+    ("tier", "model_tier"),
+    ("msrc", "model_source"),
+    ("start", "started_at"),
+    ("end", "ended_at"),
+    ("time", "elapsed_seconds"),
+    ("exit", "exit_code"),
+    ("ok", "success"),
+    ("log", "log_file"),
+    ("meta", "meta_file"),
+)
+LEGACY_KEYS = dict(LEGACY_FIELDS)
+
+TOKEN_FIELDS = (
+    ("in", "input_tokens"),
+    ("out", "output_tokens"),
+    ("tot", "total_tokens"),
+    ("cached", "cached_input_tokens"),
+    ("reason", "reasoning_output_tokens"),
+)
+EVIDENCE_FIELDS = (("pat", "pattern"), ("evt", "event"), ("raw", "raw"), ("derived", "derived"))
+
+SUMMARY_FILE_NAMES = ("summary.json",)
+SUMMARY_FILE_SUFFIX = ".summary.json"
+
+
+def coerce_int(value: Any) -> int | None:
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compact_token_usage(raw: Mapping[str, Any] | None) -> dict[str, Any] | None:
+    if not isinstance(raw, Mapping):
+        return None
+
+    def pick(*keys: str) -> Any:
+        for key in keys:
+            if key in raw and raw[key] is not None:
+                return raw[key]
+        return None
+
+    evidence_in = raw.get("evidence") or raw.get("ev") or {}
+    ev: dict[str, Any] = {}
+    for new_key, old_key in TOKEN_FIELDS:
+        src = evidence_in.get(new_key) or evidence_in.get(old_key)
+        if isinstance(src, Mapping):
+            ev_entry = {}
+            for short, verbose in EVIDENCE_FIELDS:
+                value = src.get(short) or src.get(verbose)
+                if value:
+                    ev_entry[short] = value
+            if ev_entry:
+                ev[new_key] = ev_entry
+
+    tok = {
+        "in": coerce_int(pick("in", "input_tokens")),
+        "out": coerce_int(pick("out", "output_tokens")),
+        "tot": coerce_int(pick("tot", "total_tokens")),
+    }
+    # Only structured event logs report these, so they are omitted rather than null otherwise.
+    for new_key, old_key in [("cached", "cached_input_tokens"), ("reason", "reasoning_output_tokens")]:
+        value = coerce_int(pick(new_key, old_key))
+        if value is not None:
+            tok[new_key] = value
+    if ev:
+        tok["ev"] = ev
+
+    if all(value is None for value in tok.values() if not isinstance(value, dict)) and "ev" not in tok:
+        return None
+    return tok
+
+
+def compact_cost(raw: Mapping[str, Any] | None) -> dict[str, Any] | None:
+    if not isinstance(raw, Mapping):
+        return None
+
+    usd = raw.get("usd")
+    if isinstance(usd, str):
+        try:
+            usd = float(usd)
+        except ValueError:
+            usd = None
+    elif not isinstance(usd, (int, float)):
+        usd = None
+
+    ev = raw.get("ev") or raw.get("evidence")
+    if ev is not None and not isinstance(ev, (str, int, float)):
+        ev = str(ev)
+
+    if usd is None and ev is None:
+        return None
+    return {"usd": usd, "ev": ev}
+
+
+def summary_version(summary: Mapping[str, Any]) -> int:
+    version = summary.get("v")
+    if isinstance(version, int) and not isinstance(version, bool):
+        return version
+    return 1
+
+
+def _stored_legacy(summary: Mapping[str, Any]) -> Mapping[str, Any]:
+    legacy = summary.get("legacy")
+    return legacy if isinstance(legacy, Mapping) else {}
+
+
+def pick(summary: Mapping[str, Any], key: str, default: Any = None) -> Any:
+    """Return short field ``key``, falling back to a v1 ``legacy`` block when it is unset."""
+    value = summary.get(key)
+    if value is None and key in LEGACY_KEYS:
+        value = _stored_legacy(summary).get(LEGACY_KEYS[key])
+    return default if value is None else value
+
+
+def token_usage(summary: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Return the short ``tok`` block (``in``/``out``/``tot``/...), or ``{}`` when unknown."""
+    tok = summary.get("tok")
+    if isinstance(tok, Mapping) and tok:
+        return tok
+    return compact_token_usage(_stored_legacy(summary).get("token_usage")) or {}
+
+
+def cost(summary: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Return the short ``cost`` block (``usd``/``ev``), or ``{}`` when unknown."""
+    block = summary.get("cost")
+    if isinstance(block, Mapping) and block:
+        return block
+    return compact_cost(_stored_legacy(summary).get("cost")) or {}
+
+
+def expand_token_usage(tok: Mapping[str, Any] | None) -> dict[str, Any]:
+    """Rebuild the verbose ``token_usage`` object the parser used to embed."""
+    tok = tok if isinstance(tok, Mapping) else {}
+    ev = tok.get("ev") if isinstance(tok.get("ev"), Mapping) else {}
+    usage: dict[str, Any] = {}
+    evidence: dict[str, Any] = {}
+    for short, verbose in TOKEN_FIELDS:
+        if short in ("in", "out", "tot") or short in tok:
+            usage[verbose] = tok.get(short)
+        entry = ev.get(short)
+        if isinstance(entry, Mapping):
+            evidence[verbose] = {long: entry[key] for key, long in EVIDENCE_FIELDS if key in entry}
+    usage["evidence"] = evidence
+    if usage["input_tokens"] is None or usage["output_tokens"] is None:
+        usage["extraction_incomplete"] = True
+    return usage
+
+
+def expand_cost(block: Mapping[str, Any] | None) -> dict[str, Any]:
+    block = block if isinstance(block, Mapping) else {}
+    return {"usd": block.get("usd"), "evidence": block.get("ev")}
+
+
+def legacy_view(summary: Mapping[str, Any]) -> dict[str, Any]:
+    """Return the verbose v1 field set for ``summary``, derived from short keys when needed."""
+    stored = _stored_legacy(summary)
+    if stored:
+        return dict(stored)
+    legacy = {legacy_key: summary.get(short) for short, legacy_key in LEGACY_FIELDS}
+    cache = summary.get("cache")
+    if isinstance(cache, Mapping):
+        legacy["cache_status"] = cache.get("status")
+        legacy["cache_key"] = cache.get("key")
+    legacy["token_usage"] = expand_token_usage(summary.get("tok"))
+    legacy["cost"] = expand_cost(summary.get("cost"))
+    return legacy
+
+
+def to_v2(summary: Mapping[str, Any]) -> dict[str, Any]:
+    """Return ``summary`` as v2: short keys filled from any ``legacy`` block, which is dropped."""
+    legacy = _stored_legacy(summary)
+    out: dict[str, Any] = {"v": SUMMARY_VERSION}
+    out.update((key, value) for key, value in summary.items() if key not in ("v", "legacy", "legacy_inline"))
+    for short, legacy_key in LEGACY_FIELDS:
+        if out.get(short) is None and legacy.get(legacy_key) is not None:
+            out[short] = legacy[legacy_key]
+    if not out.get("tok"):
+        out["tok"] = compact_token_usage(legacy.get("token_usage"))
+    if not out.get("cost"):
+        out["cost"] = compact_cost(legacy.get("cost"))
+    if not isinstance(out.get("cache"), Mapping) and (legacy.get("cache_status") or legacy.get("cache_key")):
+        out["cache"] = {"status": legacy.get("cache_status"), "key": legacy.get("cache_key")}
+    return out
+
+
+def iter_summary_files(paths: list[Path]) -> Iterator[Path]:
+    """Yield run summaries (``*.summary.json``) and cache entries (``summary.json``) under ``paths``."""
+    for path in paths:
+        if path.is_file():
+            yield path
+            continue
+        for candidate in sorted(path.rglob("*.json")):
+            if candidate.name in SUMMARY_FILE_NAMES or candidate.name.endswith(SUMMARY_FILE_SUFFIX):
+                yield candidate
+
+
+def migrate_file(path: Path, dry_run: bool = False) -> tuple[str, int, int]:
+    """Rewrite one summary file as v2; return (status, bytes before, bytes after)."""
+    raw = path.read_bytes()
+    try:
+        summary = json.loads(raw)
+    except ValueError:
+        return "invalid", len(raw), len(raw)
+    if not isinstance(summary, Mapping):
+        return "invalid", len(raw), len(raw)
+    if summary_version(summary) >= SUMMARY_VERSION and "legacy" not in summary:
+        return "current", len(raw), len(raw)
+
+    payload = (json.dumps(to_v2(summary), ensure_ascii=True, separators=(",", ":")) + "\n").encode("utf-8")
+    if not dry_run:
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(payload)
+        os.replace(tmp, path)
+    return "migrated", len(raw), len(payload)
+
+
+def run_migrate(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="summary_schema.py migrate",
+        description="Rewrite v1 Codex run summaries (with a nested legacy block) as v2.",
+    )
+    parser.add_argument("paths", nargs="+", type=Path, help="Summary files, runs directories or cache directories")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args(argv)
+
+    counts = {"migrated": 0, "current": 0, "invalid": 0}
+    before = after = 0
+    for path in iter_summary_files(args.paths):
+        status, old_size, new_size = migrate_file(path, args.dry_run)
+        counts[status] += 1
+        before += old_size
+        after += new_size
+        if status == "invalid":
+            print(f"Warning: skipped invalid summary JSON: {path}", file=sys.stderr)
+
+    print(
+        f"summaries_migrated={counts['migrated']} current={counts['current']} invalid={counts['invalid']} "
+        f"bytes_before={before} bytes_after={after}" + (" dry_run=1" if args.dry_run else ""),
+        file=sys.stderr,
+    )
+    return 1 if counts["invalid"] else 0
+
+
+def main() -> int:
+    if sys.argv[1:2] != ["migrate"]:
+        print("Usage: summary_schema.py migrate [--dry-run] <path>...", file=sys.stderr)
+        return 2
+    return run_migrate(sys.argv[2:])
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Canonical task text for run_codex_task.sh cache keys.
+
+Tasks that differ only in whitespace, line endings, or the standing guardrail preamble that
+invoke_codex_with_review.sh prepends should share a cache entry. ``canonicalize`` splits a
+recognised preamble off and reduces it to a short version hash, strips text matching
+user-declared ignore patterns, and normalizes whitespace in what is left:
+
+- CRLF/CR line endings become LF;
+- trailing whitespace is dropped, and runs of spaces/tabs after the indentation collapse to
+  one space (indentation is kept, since it is meaningful in code snippets);
+- leading/trailing blank lines are dropped and runs of blank lines collapse to one.
+
+Ignore patterns (``CODEX_CACHE_TASK_IGNORE_FILE``) are Python regular expressions, one per
+line; blank lines and lines starting with ``#`` are skipped. Every match is removed from
+the task before normalization, e.g. ``^Ticket: .*$`` or ``\\(run \\d+\\)``. Patterns are
+compiled with MULTILINE.
+
+Usage:
+  task_key.py [--ignore-file <path>] < task.txt     # prints preamble= and the canonical text
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Mapping, Sequence
+
+IGNORE_FILE_ENV = "CODEX_CACHE_TASK_IGNORE_FILE"
+PREAMBLE_RE = re.compile(r"\A(## Standing Guardrails[^\n]*\n.*?\n---[ \t]*\n)\s*", re.DOTALL)
+INNER_SPACE_RE = re.compile(r"(?<=\S)[ \t]{2,}|\t")
+BLANK_RUN_RE = re.compile(r"\n{3,}")
+
+
+@dataclass(frozen=True)
+class CanonicalTask:
+    text: str
+    preamble: str | None  # version hash of a recognised preamble, None when absent
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.text.encode("utf-8", errors="surrogateescape")).hexdigest()
+
+
+def load_ignore_patterns(path: Path | None) -> list[re.Pattern[str]]:
+    if path is None:
+        return []
+    patterns = []
+    for number, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        try:
+            patterns.append(re.compile(line, re.MULTILINE))
+        except re.error as exc:
+            raise ValueError(f"{path}:{number}: invalid ignore pattern: {exc}") from exc
+    return patterns
+
+
+def ignore_patterns_from_env(env: Mapping[str, str] = os.environ) -> list[re.Pattern[str]]:
+    raw = env.get(IGNORE_FILE_ENV, "")
+    return load_ignore_patterns(Path(raw)) if raw else []
+
+
+def normalize_whitespace(text: str) -> str:
+    lines = []
+    for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        body = line.rstrip()
+        indent = body[: len(body) - len(body.lstrip())]
+        lines.append(indent + INNER_SPACE_RE.sub(" ", body[len(indent) :]))
+    return BLANK_RUN_RE.sub("\n\n", "\n".join(lines)).strip("\n")
+
+
+def canonicalize(task: str, patterns: Sequence[re.Pattern[str]] = ()) -> CanonicalTask:
+    preamble = None
+    match = PREAMBLE_RE.match(task.replace("\r\n", "\n"))
+    if match:
+        block = normalize_whitespace(match.group(1))
+        preamble = hashlib.sha256(block.encode("utf-8", errors="surrogateescape")).hexdigest()[:12]
+        task = task.replace("\r\n", "\n")[match.end() :]
+    for pattern in patterns:
+        task = pattern.sub("", task)
+    return CanonicalTask(text=normalize_whitespace(task), preamble=preamble)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Print the canonical form of a task read from stdin.")
+    parser.add_argument("--ignore-file", type=Path, help=f"Ignore pattern file (default: ${IGNORE_FILE_ENV})")
+    args = parser.parse_args()
+    try:
+        patterns = load_ignore_patterns(args.ignore_file) if args.ignore_file else ignore_patterns_from_env()
+    except (OSError, ValueError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    canonical = canonicalize(sys.stdin.read(), patterns)
+    print(f"preamble={canonical.preamble or 'none'}")
+    print(canonical.text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
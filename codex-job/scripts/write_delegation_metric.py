@@ -2,6 +2,7 @@
 """Append a normalized delegation metrics record from a codex run summary.
 
 Token and cost data sources (in priority order):
+  0. codex run summary tok fields from a --json-events run — exact counts; ccusage is skipped
   1. ccusage-codex session --json  matched by session_id — gives real input/output/cached/cost
   2. codex run summary tok fields  — gives total tokens only (input/output are null in practice)
   3. Explicit CLI overrides         — --total-cost-usd etc.
@@ -19,6 +20,8 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Mapping
 
+from summary_schema import cost, pick, token_usage
+
 
 # ---------------------------------------------------------------------------
 # CLI
@@ -75,13 +78,14 @@ def _as_int(value: object, default: int = 0) -> int:
         return default
 
 
-def _pick(summary: Mapping[str, Any], primary: str, legacy: str | None = None, default=None):
-    if primary in summary and summary[primary] is not None:
-        return summary[primary]
-    legacy_block = summary.get("legacy") if isinstance(summary.get("legacy"), Mapping) else {}
-    if legacy and legacy_block.get(legacy) is not None:
-        return legacy_block[legacy]
-    return default
+def _event_token_usage(summary: Mapping[str, Any]) -> Mapping[str, Any] | None:
+    """Return the summary tok block when its counts came from Codex JSON events (exact)."""
+    tok = token_usage(summary)
+    if tok.get("in") is None or tok.get("out") is None:
+        return None
+    ev = tok.get("ev") if isinstance(tok.get("ev"), Mapping) else {}
+    evidence = ev.get("in") if isinstance(ev.get("in"), Mapping) else {}
+    return tok if evidence.get("evt") else None
 
 
 # ---------------------------------------------------------------------------
@@ -141,12 +145,12 @@ def main() -> int:
     summary: dict = json.loads(summary_path.read_text(encoding="utf-8"))
 
     # --- Basic run fields ---
-    success = bool(_pick(summary, "ok", "success", False))
+    success = bool(pick(summary, "ok", False))
     status = args.status or ("success" if success else "failure")
-    elapsed_seconds = _as_number(_pick(summary, "time", "elapsed_seconds", 0.0))
-    repo = str(_pick(summary, "repo", "repo", ""))
-    end_time = str(_pick(summary, "end", "ended_at") or datetime.now(timezone.utc).isoformat())
-    session_id = str(_pick(summary, "sid") or "")
+    elapsed_seconds = _as_number(pick(summary, "time", 0.0))
+    repo = str(pick(summary, "repo", ""))
+    end_time = str(pick(summary, "end") or datetime.now(timezone.utc).isoformat())
+    session_id = str(pick(summary, "sid") or "")
     delegated_model = args.delegated_model
 
     # --- Token extraction ---
@@ -154,7 +158,15 @@ def main() -> int:
     tok_input = tok_output = tok_cached = tok_total = tok_reasoning = 0
     cost_usd: float | None = None
 
-    if not args.no_ccusage:
+    # Priority 0: exact counts parsed from the run's JSON event stream; no need to shell out.
+    event_tok = _event_token_usage(summary)
+    if event_tok:
+        tok_input     = _as_int(event_tok.get("in"))
+        tok_output    = _as_int(event_tok.get("out"))
+        tok_cached    = _as_int(event_tok.get("cached"))
+        tok_reasoning = _as_int(event_tok.get("reason"))
+        tok_total     = _as_int(event_tok.get("tot"))
+    elif not args.no_ccusage:
         session_stats = _lookup_session_stats(session_id or None)
         if session_stats:
             # Prefer model-specific breakdown; fall back to session totals
@@ -170,19 +182,16 @@ def main() -> int:
 
     # Priority 2: fall back to summary tok block (total only; input/output are null in practice)
     if tok_total == 0:
-        tok_block = summary.get("tok") if isinstance(summary.get("tok"), Mapping) else {}
-        legacy_tok = (summary.get("legacy") or {}).get("token_usage") or {}
-        usage = tok_block if tok_block else legacy_tok
-        tok_input  = tok_input  or _as_int(_pick(usage, "in",  "input_tokens"))
-        tok_output = tok_output or _as_int(_pick(usage, "out", "output_tokens"))
-        tok_total  = tok_total  or _as_int(_pick(usage, "tot", "total_tokens"))
+        usage = token_usage(summary)
+        tok_input  = tok_input  or _as_int(usage.get("in"))
+        tok_output = tok_output or _as_int(usage.get("out"))
+        tok_total  = tok_total  or _as_int(usage.get("tot"))
 
     # --- Cost ---
     if args.total_cost_usd is not None:
         cost_usd = args.total_cost_usd
     if cost_usd is None:
-        cost_block = summary.get("cost") or {}
-        cost_usd = _as_number(cost_block.get("usd") if isinstance(cost_block, Mapping) else None, 0.0)
+        cost_usd = _as_number(cost(summary).get("usd"), 0.0)
 
     # --- Files changed ---
     if args.files_changed:
@@ -4,37 +4,149 @@ Lightweight SQLite-backed job queue for Codex runs.
 
 Columns: id, task, status, repo, run_id, session_id, mode, tier, cache_status,
 created_at, started_at, completed_at, result_path, log_path, meta_path,
-summary_path, error.
+summary_path, error, exit_code, attempts, max_attempts, available_at, lease_owner,
+lease_expires_at, priority, model, tokens_in, tokens_out, cost_usd, created_epoch,
+started_epoch, completed_epoch, elapsed_seconds, queue_wait_seconds, change_seq.
+
+Timestamps are stored twice: ISO text for people and integer epoch seconds for SQL, with
+``elapsed_seconds`` (started -> completed) and ``queue_wait_seconds`` (created -> started)
+computed by the statement that sets them, so reads and aggregates never parse dates.
+available_at and lease_expires_at are epoch seconds.
+
+Workers pull jobs with ``claim``: one ``UPDATE ... RETURNING`` moves the best eligible
+``pending`` job to ``running`` under a lease (owner + expiry). The owner extends the lease
+with ``heartbeat`` and finishes with ``update_job(..., owner=...)`` or hands the job back
+with ``release``. ``reap`` (also run inside every claim) requeues jobs whose lease expired;
+a job that has used ``max_attempts`` claims is marked ``failed`` instead. Requeued jobs
+back off exponentially through ``available_at``. ``claim`` can also skip jobs whose repo
+already has a leased run, or whose tier is at its cap, so job_worker.py daemons sharing a
+database never run two jobs in one working tree.
+
+"Best" follows a ``SchedulePolicy``:
+- higher ``priority`` first; with ``aging_seconds`` a job gains one priority point per
+  that many seconds waited, so low-priority batches still drain;
+- among equal priorities, weighted fair share: the job whose repo and tier have started
+  the fewest runs (running now, or started within ``fair_window_seconds``), divided by
+  their ``repo_weights``/``tier_weights`` (default 1), goes first; then the oldest;
+- with ``budget_usd`` and/or ``budget_tokens``, once the runs completed within
+  ``budget_window_seconds`` have spent the budget, ``budget_tiers`` are held back until
+  spend rolls out of the window. Spend is each run's ``cost_usd`` and token counts,
+  recorded by job_worker.py from the run summary and the model registry prices.
+
+Listing (``fetch_page``) is newest first by ``COALESCE(started_at, created_at)``, the
+"sort key", which expression indexes serve directly, alone or after a status or repo
+filter. Pages continue from an opaque cursor (the last row's sort key and id) instead of
+an offset, so deep pages cost the same as the first.
+
+``enqueue-batch`` and ``update-batch`` read JSONL (one ``enqueue``/``update_job`` keyword
+object per line) and apply it in transactions of ``--chunk-size`` lines with
+``executemany``; malformed lines are reported by line number and skipped, the rest apply.
+
+Retention: ``archive`` moves finished jobs completed more than N days ago out of ``jobs``
+into ``jobs_archive`` (in this database, or in a separate ``--archive-db`` file), a chunk per
+transaction, optionally appending them to a gzip-compressed JSONL export first. New
+databases use ``auto_vacuum=INCREMENTAL`` so the pages freed are returned to the filesystem
+by ``PRAGMA incremental_vacuum``; ``compact`` converts an older database (one full
+``VACUUM``). ``stats`` reports hot/archived row counts and page usage.
+
+``job_stats`` (CLI ``stats``, server ``/api/stats``) counts jobs by status, repo and tier
+and takes nearest-rank p50/p95/p99 of ``queue_wait_seconds`` and ``elapsed_seconds`` over
+the whole hot table in one SQL statement, walking partial indexes on the two durations.
+
+Triggers stamp every inserted or updated row with the next ``change_seq`` (a counter kept
+in ``job_seq``), whoever wrote it, so ``changes_since(seq)`` returns just the rows that
+changed; job_queue_server.py uses it to push deltas to dashboards.
+
+``JobQueue`` keeps one long-lived connection per thread in WAL mode (readers never block
+the writer, and commits skip the per-transaction fsync with ``synchronous=NORMAL``), waits
+on a busy database instead of failing, and applies schema migrations once per process. The
+module-level ``enqueue``/``update_job``/``fetch_jobs`` helpers share one ``JobQueue`` per
+database path.
 """
 
 from __future__ import annotations
 
 import argparse
+import base64
+import gzip
 import json
+import os
+import socket
 import sqlite3
 import sys
+import threading
 import time
+import weakref
+from contextlib import contextmanager
 from dataclasses import asdict, dataclass, field
 from datetime import datetime, timezone
+from itertools import groupby, islice
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Callable, IO, Iterable, Iterator, Optional
 
 DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE = 256
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 30
+RETRY_BACKOFF_CAP_SECONDS = 900
+DEFAULT_TIER = "low"
+BATCH_CHUNK_SIZE = 500
+DEFAULT_RETENTION_DAYS = 30
+ARCHIVE_CHUNK_SIZE = 1000
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+TERMINAL_STATUSES = frozenset({"completed", "failed", "cached"})
 
 
 def utc_now() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
-def connect(db_path: Path) -> sqlite3.Connection:
+def epoch_now() -> int:
+    return int(time.time())
+
+
+def epoch_to_iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def iso_to_epoch(text: Optional[str]) -> Optional[int]:
+    """Parse a caller-supplied ISO timestamp (naive means UTC); None when unparseable."""
+    if not text:
+        return None
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def connect(db_path: Path, busy_timeout_ms: int = BUSY_TIMEOUT_MS) -> sqlite3.Connection:
+    """Open a tuned connection; transactions are explicit (``isolation_level=None``)."""
     db_path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(
+        db_path,
+        timeout=busy_timeout_ms / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE,
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
 
-def ensure_schema(conn: sqlite3.Connection) -> None:
-    conn.executescript(
+def _migrate_v1(conn: sqlite3.Connection) -> None:
+    conn.execute(
         """
         CREATE TABLE IF NOT EXISTS jobs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -54,12 +166,179 @@ def ensure_schema(conn: sqlite3.Connection) -> None:
             meta_path TEXT,
             summary_path TEXT,
             error TEXT
-        );
-        CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at DESC, id DESC);
-        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at DESC, id DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+
+
+def _migrate_v2(conn: sqlite3.Connection) -> None:
+    for column in (
+        "attempts INTEGER NOT NULL DEFAULT 0",
+        f"max_attempts INTEGER NOT NULL DEFAULT {DEFAULT_MAX_ATTEMPTS}",
+        "available_at INTEGER",
+        "lease_owner TEXT",
+        "lease_expires_at INTEGER",
+    ):
+        conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs(id) WHERE status = 'pending'")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(lease_expires_at) WHERE lease_owner IS NOT NULL")
+
+
+def _migrate_v3(conn: sqlite3.Connection) -> None:
+    conn.execute("ALTER TABLE jobs ADD COLUMN exit_code INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_running_repo ON jobs(repo) WHERE status = 'running'")
+
+
+def _migrate_v4(conn: sqlite3.Connection) -> None:
+    for column in ("priority INTEGER NOT NULL DEFAULT 0", "model TEXT", "tokens_in INTEGER", "tokens_out INTEGER", "cost_usd REAL"):
+        conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_started_at ON jobs(started_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_completed_at ON jobs(completed_at)")
+
+
+SORT_KEY = "COALESCE(started_at, created_at)"
+
+
+def _migrate_v5(conn: sqlite3.Connection) -> None:
+    # Expression indexes must repeat SORT_KEY exactly as the list query writes it.
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_jobs_sort ON jobs({SORT_KEY} DESC, id DESC)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_jobs_status_sort ON jobs(status, {SORT_KEY} DESC, id DESC)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_jobs_repo_sort ON jobs(repo, {SORT_KEY} DESC, id DESC)")
+
+
+def _epoch_sql(column: str) -> str:
+    return f"CAST(strftime('%s', {column}) AS INTEGER)"
+
+
+def _migrate_v6(conn: sqlite3.Connection) -> None:
+    for column in ("created_epoch", "started_epoch", "completed_epoch", "elapsed_seconds", "queue_wait_seconds"):
+        conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER")
+    conn.execute(
+        f"""
+        UPDATE jobs SET created_epoch = {_epoch_sql('created_at')}, started_epoch = {_epoch_sql('started_at')},
+            completed_epoch = {_epoch_sql('completed_at')}
         """
     )
-    conn.commit()
+    conn.execute("UPDATE jobs SET elapsed_seconds = completed_epoch - started_epoch, queue_wait_seconds = started_epoch - created_epoch")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_epoch ON jobs(created_epoch)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_completed_epoch ON jobs(completed_epoch)")
+
+
+def ensure_archive_table(conn: sqlite3.Connection, schema: str = "main") -> list[str]:
+    """Create or widen ``<schema>.jobs_archive`` to hold every ``jobs`` column; returns them."""
+    columns = [(row["name"], row["type"]) for row in conn.execute("PRAGMA main.table_info(jobs)")]
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {schema}.jobs_archive (id INTEGER PRIMARY KEY, archived_epoch INTEGER NOT NULL)"
+    )
+    existing = {row["name"] for row in conn.execute(f"PRAGMA {schema}.table_info(jobs_archive)")}
+    for name, decl in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {schema}.jobs_archive ADD COLUMN {name} {decl}")
+    return [name for name, _ in columns]
+
+
+def _migrate_v7(conn: sqlite3.Connection) -> None:
+    ensure_archive_table(conn)
+
+
+def _migrate_v8(conn: sqlite3.Connection) -> None:
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue_wait ON jobs(queue_wait_seconds) WHERE queue_wait_seconds IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_elapsed ON jobs(elapsed_seconds) WHERE elapsed_seconds IS NOT NULL")
+
+
+def _migrate_v9(conn: sqlite3.Connection) -> None:
+    conn.execute("ALTER TABLE jobs ADD COLUMN change_seq INTEGER")
+    conn.execute("UPDATE jobs SET change_seq = id")
+    conn.execute("CREATE TABLE IF NOT EXISTS job_seq (value INTEGER NOT NULL)")
+    conn.execute("INSERT INTO job_seq (value) SELECT COALESCE(MAX(change_seq), 0) FROM jobs")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_change_seq ON jobs(change_seq)")
+    # The triggers' own UPDATE sets change_seq, which the WHEN clause skips.
+    for event, when in (("INSERT", ""), ("UPDATE", "WHEN NEW.change_seq IS OLD.change_seq")):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS jobs_change_seq_{event.lower()} AFTER {event} ON jobs {when}
+            BEGIN
+                UPDATE job_seq SET value = value + 1;
+                UPDATE jobs SET change_seq = (SELECT value FROM job_seq) WHERE id = NEW.id;
+            END
+            """
+        )
+
+
+def _migrate_v10(conn: sqlite3.Connection) -> None:
+    # Fair-share and spend windows filter on the epoch columns; the ISO indexes went unused.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_started_epoch ON jobs(started_epoch)")
+    conn.execute("DROP INDEX IF EXISTS idx_jobs_started_at")
+    conn.execute("DROP INDEX IF EXISTS idx_jobs_completed_at")
+
+
+# MIGRATIONS[n] upgrades a database from user_version n to n + 1. Databases created before
+# versioning report user_version 0 and already match v1, which is idempotent.
+MIGRATIONS: tuple[Callable[[sqlite3.Connection], None], ...] = (_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4, _migrate_v5, _migrate_v6, _migrate_v7, _migrate_v8, _migrate_v9, _migrate_v10)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Switch the database to WAL and apply pending migrations under a write lock."""
+    if schema_version(conn) == 0:
+        # Only takes effect before the first table exists; see compact() for older files.
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != "wal":
+        conn.execute("PRAGMA journal_mode=WAL")
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another process may have migrated while we waited for the lock.
+        for migrate in MIGRATIONS[schema_version(conn) :]:
+            migrate(conn)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+@dataclass(frozen=True)
+class SchedulePolicy:
+    repo_weights: dict[str, float] = field(default_factory=dict)
+    tier_weights: dict[str, float] = field(default_factory=dict)
+    aging_seconds: int = 0
+    fair_window_seconds: int = 3600
+    budget_usd: Optional[float] = None
+    budget_tokens: Optional[int] = None
+    budget_window_seconds: int = 86400
+    budget_tiers: tuple[str, ...] = ("high",)
+
+    @classmethod
+    def from_mapping(cls, data: dict) -> "SchedulePolicy":
+        unknown = sorted(set(data) - set(cls.__dataclass_fields__))
+        if unknown:
+            raise ValueError(f"unknown schedule policy keys: {', '.join(unknown)}")
+        values = dict(data)
+        if "budget_tiers" in values:
+            values["budget_tiers"] = tuple(values["budget_tiers"])
+        for key in ("repo_weights", "tier_weights"):
+            weights = values.get(key, {})
+            if not isinstance(weights, dict) or any(not isinstance(w, (int, float)) or w <= 0 for w in weights.values()):
+                raise ValueError(f"{key} must map names to positive numbers")
+        return cls(**values)
+
+    @classmethod
+    def load(cls, path: Path) -> "SchedulePolicy":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if not isinstance(data, dict):
+            raise ValueError(f"{path}: schedule policy must be a JSON object")
+        return cls.from_mapping(data)
+
+
+DEFAULT_POLICY = SchedulePolicy()
 
 
 @dataclass
@@ -81,21 +360,26 @@ class Job:
     meta_path: Optional[str] = None
     summary_path: Optional[str] = None
     error: Optional[str] = None
+    exit_code: Optional[int] = None
+    attempts: int = 0
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    available_at: Optional[int] = None
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[int] = None
+    priority: int = 0
+    model: Optional[str] = None
+    tokens_in: Optional[int] = None
+    tokens_out: Optional[int] = None
+    cost_usd: Optional[float] = None
+    created_epoch: Optional[int] = None
+    started_epoch: Optional[int] = None
+    completed_epoch: Optional[int] = None
     elapsed_seconds: Optional[int] = field(default=None)
+    queue_wait_seconds: Optional[int] = None
+    change_seq: Optional[int] = None
 
     @classmethod
     def from_row(cls, row: sqlite3.Row) -> "Job":
-        started = row["started_at"]
-        completed = row["completed_at"]
-        elapsed = None
-        try:
-            if started and completed:
-                start_epoch = datetime.fromisoformat(started.replace("Z", "+00:00")).timestamp()
-                end_epoch = datetime.fromisoformat(completed.replace("Z", "+00:00")).timestamp()
-                elapsed = int(end_epoch - start_epoch)
-        except Exception:
-            elapsed = None
-
         return cls(
             id=row["id"],
             task=row["task"],
@@ -107,20 +391,917 @@ class Job:
             tier=row["tier"],
             cache_status=row["cache_status"],
             created_at=row["created_at"],
-            started_at=started,
-            completed_at=completed,
+            started_at=row["started_at"],
+            completed_at=row["completed_at"],
             result_path=row["result_path"],
             log_path=row["log_path"],
             meta_path=row["meta_path"],
             summary_path=row["summary_path"],
             error=row["error"],
-            elapsed_seconds=elapsed,
+            exit_code=row["exit_code"],
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            available_at=row["available_at"],
+            lease_owner=row["lease_owner"],
+            lease_expires_at=row["lease_expires_at"],
+            priority=row["priority"],
+            model=row["model"],
+            tokens_in=row["tokens_in"],
+            tokens_out=row["tokens_out"],
+            cost_usd=row["cost_usd"],
+            created_epoch=row["created_epoch"],
+            started_epoch=row["started_epoch"],
+            completed_epoch=row["completed_epoch"],
+            elapsed_seconds=row["elapsed_seconds"],
+            queue_wait_seconds=row["queue_wait_seconds"],
+            change_seq=row["change_seq"],
         )
 
     def to_dict(self) -> dict:
         return asdict(self)
 
 
+INSERT_JOB_SQL = """
+    INSERT INTO jobs (
+        task, status, repo, run_id, session_id, mode, tier, cache_status,
+        created_at, started_at, result_path, log_path, meta_path, summary_path, max_attempts,
+        priority, created_epoch, started_epoch, queue_wait_seconds
+    ) VALUES (
+        :task, :status, :repo, :run_id, :session_id, :mode, :tier, :cache_status,
+        :created_at, :started_at, :result_path, :log_path, :meta_path, :summary_path, :max_attempts,
+        :priority, :created_epoch, :started_epoch, :started_epoch - :created_epoch
+    )
+"""
+
+
+def job_params(
+    task: str,
+    status: str = "pending",
+    repo: Optional[str] = None,
+    run_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    mode: Optional[str] = None,
+    tier: Optional[str] = None,
+    cache_status: Optional[str] = None,
+    result_path: Optional[str] = None,
+    log_path: Optional[str] = None,
+    meta_path: Optional[str] = None,
+    summary_path: Optional[str] = None,
+    started_at: Optional[str] = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    priority: int = 0,
+    now: Optional[int] = None,
+) -> dict[str, object]:
+    """Named parameters for ``INSERT_JOB_SQL``."""
+    now = epoch_now() if now is None else now
+    now_iso = epoch_to_iso(now)
+    started_iso = started_at or now_iso if status != "pending" else None
+    return {
+        "task": task,
+        "status": status,
+        "repo": repo,
+        "run_id": run_id,
+        "session_id": session_id,
+        "mode": mode,
+        "tier": tier,
+        "cache_status": cache_status,
+        "created_at": now_iso,
+        "started_at": started_iso,
+        "result_path": result_path,
+        "log_path": log_path,
+        "meta_path": meta_path,
+        "summary_path": summary_path,
+        "max_attempts": max_attempts,
+        "priority": priority,
+        "created_epoch": now,
+        "started_epoch": now if started_iso == now_iso else iso_to_epoch(started_iso),
+    }
+
+
+def update_statement(
+    job_id: int,
+    status: Optional[str] = None,
+    exit_code: Optional[int] = None,
+    session_id: Optional[str] = None,
+    completed_at: Optional[str] = None,
+    result_path: Optional[str] = None,
+    log_path: Optional[str] = None,
+    meta_path: Optional[str] = None,
+    summary_path: Optional[str] = None,
+    cache_status: Optional[str] = None,
+    error: Optional[str] = None,
+    owner: Optional[str] = None,
+    run_id: Optional[str] = None,
+    model: Optional[str] = None,
+    tokens_in: Optional[int] = None,
+    tokens_out: Optional[int] = None,
+    cost_usd: Optional[float] = None,
+) -> Optional[tuple[str, list[object]]]:
+    """Build the ``UPDATE`` for ``JobQueue.update_job``; None when there is nothing to set."""
+    fields: list[str] = []
+    values: list[object] = []
+
+    mapping = {
+        "status": status,
+        "run_id": run_id,
+        "session_id": session_id,
+        "completed_at": completed_at or utc_now() if status in {"completed", "failed", "cached"} else completed_at,
+        "result_path": result_path,
+        "log_path": log_path,
+        "meta_path": meta_path,
+        "summary_path": summary_path,
+        "cache_status": cache_status,
+        "error": error,
+        "model": model,
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "cost_usd": cost_usd,
+    }
+    if exit_code is not None:
+        mapping["exit_code"] = exit_code
+        mapping["error"] = error or ("" if exit_code == 0 else f"codex exited with {exit_code}")
+
+    for key, val in mapping.items():
+        if val is not None:
+            fields.append(f"{key}=?")
+            values.append(val)
+
+    if mapping["completed_at"] is not None:
+        completed_epoch = iso_to_epoch(mapping["completed_at"])
+        fields.append("completed_epoch=?, elapsed_seconds=? - started_epoch")
+        values.extend((completed_epoch, completed_epoch))
+
+    if status in TERMINAL_STATUSES:
+        fields.append("lease_owner=NULL, lease_expires_at=NULL")
+
+    if not fields:
+        return None
+
+    where = "id=?"
+    values.append(job_id)
+    if owner is not None:
+        where += " AND lease_owner=?"
+        values.append(owner)
+    return f"UPDATE jobs SET {', '.join(fields)} WHERE {where}", values
+
+
+# Keys accepted on each JSONL line, with the JSON types each may hold (None is always allowed).
+_TEXT = (str,)
+ENQUEUE_FIELDS: dict[str, tuple[type, ...]] = {
+    "task": _TEXT, "status": _TEXT, "repo": _TEXT, "run_id": _TEXT, "session_id": _TEXT,
+    "mode": _TEXT, "tier": _TEXT, "cache_status": _TEXT, "result_path": _TEXT, "log_path": _TEXT,
+    "meta_path": _TEXT, "summary_path": _TEXT, "started_at": _TEXT, "max_attempts": (int,), "priority": (int,),
+}
+UPDATE_FIELDS: dict[str, tuple[type, ...]] = {
+    "id": (int,), "status": _TEXT, "exit_code": (int,), "session_id": _TEXT, "completed_at": _TEXT,
+    "result_path": _TEXT, "log_path": _TEXT, "meta_path": _TEXT, "summary_path": _TEXT,
+    "cache_status": _TEXT, "error": _TEXT, "owner": _TEXT, "run_id": _TEXT, "model": _TEXT,
+    "tokens_in": (int,), "tokens_out": (int,), "cost_usd": (int, float),
+}
+
+UPDATE_TARGETS_SQL = "SELECT id, lease_owner FROM jobs WHERE id IN (SELECT value FROM json_each(?))"
+
+
+@dataclass
+class BatchResult:
+    applied: list[tuple[int, int]] = field(default_factory=list)  # (line, job id)
+    errors: list[tuple[int, str]] = field(default_factory=list)  # (line, message)
+
+    def to_dict(self) -> dict:
+        return {
+            "applied": len(self.applied),
+            "jobs": [{"line": line, "id": job_id} for line, job_id in self.applied],
+            "errors": [{"line": line, "error": message} for line, message in self.errors],
+        }
+
+
+def read_jsonl(stream: IO[str]) -> Iterator[tuple[int, object]]:
+    """Yield ``(line number, value)`` for each non-blank line; unparseable lines yield the ValueError."""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, ValueError(f"invalid JSON: {exc}")
+
+
+def check_record(record: object, spec: dict[str, tuple[type, ...]], required: str) -> dict:
+    """Validate one JSONL value against ``spec``; raises ValueError describing the first problem."""
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("expected a JSON object")
+    unknown = sorted(set(record) - set(spec))
+    if unknown:
+        raise ValueError(f"unknown field(s): {', '.join(unknown)}")
+    if record.get(required) is None:
+        raise ValueError(f"missing {required!r}")
+    for key, value in record.items():
+        if value is not None and (isinstance(value, bool) or not isinstance(value, spec[key])):
+            raise ValueError(f"{key!r} must be {' or '.join(t.__name__ for t in spec[key])}")
+    return record
+
+
+def _chunks(records: Iterable[tuple[int, object]], size: int) -> Iterator[list[tuple[int, object]]]:
+    it = iter(records)
+    while chunk := list(islice(it, max(1, size))):
+        yield chunk
+
+
+JOB_COLUMNS = """
+    id, task, status, repo, run_id, session_id, mode, tier, cache_status,
+    created_at, started_at, completed_at, result_path, log_path, meta_path,
+    summary_path, error, exit_code, attempts, max_attempts, available_at, lease_owner,
+    lease_expires_at, priority, model, tokens_in, tokens_out, cost_usd, created_epoch,
+    started_epoch, completed_epoch, elapsed_seconds, queue_wait_seconds, change_seq
+"""
+
+@dataclass(frozen=True)
+class JobFilter:
+    statuses: tuple[str, ...] = ()
+    repo: Optional[str] = None
+    tier: Optional[str] = None
+    since: Optional[str] = None  # inclusive lower bound on the sort key (ISO UTC)
+    until: Optional[str] = None  # exclusive upper bound on the sort key (ISO UTC)
+
+
+@dataclass
+class JobPage:
+    jobs: list[Job]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(sort_key: str, job_id: int) -> str:
+    raw = json.dumps([sort_key, job_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_key, job_id = json.loads(raw)
+        if not isinstance(sort_key, str) or not isinstance(job_id, int):
+            raise TypeError
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"invalid cursor: {cursor!r}") from exc
+    return sort_key, job_id
+
+
+def list_jobs_query(filters: JobFilter, cursor: Optional[str], limit: int) -> tuple[str, list[object]]:
+    """Build the list query; every shape is ordered to match one of the sort indexes."""
+    where: list[str] = []
+    params: list[object] = []
+    if len(filters.statuses) == 1:
+        where.append("status = ?")
+        params.append(filters.statuses[0])
+    elif filters.statuses:
+        where.append(f"status IN ({', '.join('?' * len(filters.statuses))})")
+        params.extend(filters.statuses)
+    if filters.repo is not None:
+        where.append("repo = ?")
+        params.append(filters.repo)
+    if filters.tier is not None:
+        where.append(f"COALESCE(tier, '{DEFAULT_TIER}') = ?")
+        params.append(filters.tier)
+    if filters.since is not None:
+        where.append(f"{SORT_KEY} >= ?")
+        params.append(filters.since)
+    if filters.until is not None:
+        where.append(f"{SORT_KEY} < ?")
+        params.append(filters.until)
+    if cursor is not None:
+        # Spelled out (not a row value) so the leading "<=" seeks into the sort index.
+        sort_key, job_id = decode_cursor(cursor)
+        where.append(f"{SORT_KEY} <= ? AND ({SORT_KEY} < ? OR id < ?)")
+        params.extend((sort_key, sort_key, job_id))
+    sql = f"SELECT {JOB_COLUMNS}, {SORT_KEY} AS sort_key FROM jobs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {SORT_KEY} DESC, id DESC LIMIT ?"
+    params.append(limit)
+    return sql, params
+
+
+# Runs per repo/tier that count against fair share: running now or started in the window.
+_RECENT_USAGE = f"""
+    WITH recent AS (
+        SELECT repo, COALESCE(tier, '{DEFAULT_TIER}') AS tier FROM jobs
+        WHERE status = 'running' OR started_epoch >= :fair_since
+    ),
+    repo_usage AS (SELECT repo, COUNT(*) AS n FROM recent GROUP BY repo),
+    tier_usage AS (SELECT tier, COUNT(*) AS n FROM recent GROUP BY tier)
+"""
+
+CLAIM_JOB_SQL = f"""
+    {_RECENT_USAGE}
+    UPDATE jobs
+    SET status = 'running', lease_owner = :owner, lease_expires_at = :lease_expires_at,
+        attempts = attempts + 1, started_at = :now_iso, started_epoch = :now,
+        queue_wait_seconds = :now - created_epoch, completed_at = NULL, completed_epoch = NULL,
+        elapsed_seconds = NULL, available_at = NULL
+    WHERE id = (
+        SELECT j.id FROM jobs j
+        WHERE j.status = 'pending' AND (j.available_at IS NULL OR j.available_at <= :now)
+          AND (j.repo IS NULL OR j.repo NOT IN (SELECT value FROM json_each(:busy_repos)))
+          AND COALESCE(j.tier, '{DEFAULT_TIER}') NOT IN (SELECT value FROM json_each(:full_tiers))
+        ORDER BY
+          j.priority + CASE WHEN :aging_seconds > 0
+              THEN (:now - COALESCE(j.created_epoch, :now)) / :aging_seconds ELSE 0 END DESC,
+          COALESCE((SELECT n FROM repo_usage u WHERE u.repo IS j.repo), 0) * 1.0
+              / COALESCE((SELECT value FROM json_each(:repo_weights) WHERE key = j.repo), 1.0)
+            + COALESCE((SELECT n FROM tier_usage u WHERE u.tier = COALESCE(j.tier, '{DEFAULT_TIER}')), 0) * 1.0
+              / COALESCE((SELECT value FROM json_each(:tier_weights) WHERE key = COALESCE(j.tier, '{DEFAULT_TIER}')), 1.0) ASC,
+          j.id
+        LIMIT 1
+    )
+    RETURNING {JOB_COLUMNS}
+"""
+
+SPEND_SQL = """
+    SELECT COALESCE(SUM(cost_usd), 0) AS usd, COALESCE(SUM(COALESCE(tokens_in, 0) + COALESCE(tokens_out, 0)), 0) AS tokens
+    FROM jobs WHERE completed_epoch >= ?
+"""
+
+ARCHIVE_CANDIDATES_SQL = f"""
+    SELECT id FROM jobs
+    WHERE completed_epoch < ? AND status IN ({', '.join(f"'{s}'" for s in sorted(TERMINAL_STATUSES))})
+    ORDER BY completed_epoch LIMIT ?
+"""
+
+PERCENTILES = (50, 95, 99)
+
+
+def _percentile_sql(column: str) -> str:
+    """Nearest-rank percentiles of ``column`` as a JSON object ``{"count", "p50", ...}``."""
+    picks = ", ".join(f"'p{p}', MIN(CASE WHEN rn >= {p / 100} * n THEN v END)" for p in PERCENTILES)
+    return f"""(
+        SELECT json_object('count', COALESCE(MAX(n), 0), {picks})
+        FROM (
+            SELECT {column} AS v, ROW_NUMBER() OVER (ORDER BY {column}) AS rn, COUNT(*) OVER () AS n
+            FROM jobs WHERE {column} IS NOT NULL
+        )
+    )"""
+
+
+def _group_count_sql(key: str) -> str:
+    return f"(SELECT json_group_object(k, n) FROM (SELECT {key} AS k, COUNT(*) AS n FROM jobs GROUP BY k))"
+
+
+# One statement, so every figure comes from the same snapshot.
+JOB_STATS_SQL = f"""
+    SELECT
+        (SELECT COUNT(*) FROM jobs) AS total,
+        {_group_count_sql("status")} AS by_status,
+        {_group_count_sql("COALESCE(repo, '')")} AS by_repo,
+        {_group_count_sql(f"COALESCE(tier, '{DEFAULT_TIER}')")} AS by_tier,
+        {_percentile_sql("queue_wait_seconds")} AS queue_wait_seconds,
+        {_percentile_sql("elapsed_seconds")} AS run_seconds
+"""
+
+CHANGE_SEQ_SQL = "SELECT value FROM job_seq"
+
+CHANGES_SQL = f"SELECT {JOB_COLUMNS} FROM jobs WHERE change_seq > ? ORDER BY change_seq LIMIT ?"
+
+LEASED_SQL = "SELECT repo, COALESCE(tier, ?) AS tier FROM jobs WHERE status = 'running' AND lease_owner IS NOT NULL"
+
+PENDING_COUNT_SQL = "SELECT COUNT(*) FROM jobs WHERE status = 'pending'"
+
+HEARTBEAT_SQL = "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND lease_owner = ? AND status = 'running'"
+
+# Exponential backoff after the Nth attempt: base * 2^(N-1), capped.
+_REQUEUE = f"""
+    status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+    available_at = CASE WHEN attempts >= max_attempts THEN NULL
+        ELSE :now + MIN({RETRY_BACKOFF_CAP_SECONDS}, {RETRY_BACKOFF_SECONDS} * (1 << MAX(attempts - 1, 0))) END,
+    completed_at = CASE WHEN attempts >= max_attempts THEN :now_iso ELSE NULL END,
+    completed_epoch = CASE WHEN attempts >= max_attempts THEN :now ELSE NULL END,
+    elapsed_seconds = CASE WHEN attempts >= max_attempts THEN :now - started_epoch ELSE NULL END,
+    started_at = CASE WHEN attempts >= max_attempts THEN started_at ELSE NULL END,
+    started_epoch = CASE WHEN attempts >= max_attempts THEN started_epoch ELSE NULL END,
+    queue_wait_seconds = CASE WHEN attempts >= max_attempts THEN queue_wait_seconds ELSE NULL END,
+    lease_owner = NULL,
+    lease_expires_at = NULL
+"""
+
+REAP_SQL = f"""
+    UPDATE jobs SET {_REQUEUE},
+        error = 'lease expired (owner ' || lease_owner || ', attempt ' || attempts || ')'
+    WHERE lease_owner IS NOT NULL AND lease_expires_at < :now
+    RETURNING id, status
+"""
+
+RELEASE_SQL = f"""
+    UPDATE jobs SET {_REQUEUE}, error = :error
+    WHERE id = :id AND lease_owner = :owner AND status = 'running'
+    RETURNING status
+"""
+
+
+class _Lease:
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+class JobQueue:
+    """Job queue bound to one database, with a long-lived connection per thread.
+
+    A thread keeps its connection until it exits; the connection then goes back to an idle
+    pool for the next new thread, so thread-per-request servers do not reconnect on every
+    request. Statements use fixed SQL text, so each connection's statement cache reuses
+    them instead of re-preparing. Connections are dropped after ``fork``.
+    """
+
+    def __init__(self, db_path: Path, busy_timeout_ms: int = BUSY_TIMEOUT_MS):
+        self.db_path = Path(db_path)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: list[sqlite3.Connection] = []
+        self._idle: list[sqlite3.Connection] = []
+        self._schema_ready = False
+        self._pid = os.getpid()
+
+    def __enter__(self) -> "JobQueue":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # Forked child: never reuse the parent's handles.
+            self._local = threading.local()
+            self._conns = []
+            self._idle = []
+            self._pid = os.getpid()
+        lease = getattr(self._local, "lease", None)
+        if lease is not None:
+            return lease.conn
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = connect(self.db_path, self.busy_timeout_ms)
+            with self._lock:
+                if not self._schema_ready:
+                    ensure_schema(conn)
+                    self._schema_ready = True
+                self._conns.append(conn)
+        # The thread-local lease is freed when the thread exits, returning the connection.
+        self._local.lease = lease = _Lease(conn)
+        weakref.finalize(lease, self._checkin, conn)
+        return conn
+
+    def _checkin(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if any(c is conn for c in self._conns) and not conn.in_transaction:
+                self._idle.append(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a write transaction, taking the write lock up front (``BEGIN IMMEDIATE``).
+
+        Taking it at BEGIN means the busy timeout applies; a deferred transaction that
+        upgrades from read to write fails immediately with ``database is locked``.
+        """
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def migrate(self) -> int:
+        """Apply pending schema migrations now rather than on first use; returns the version."""
+        return schema_version(self.conn)
+
+    def close(self) -> None:
+        with self._lock:
+            conns, self._conns, self._idle = self._conns, [], []
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def enqueue(
+        self,
+        task: str,
+        status: str = "pending",
+        repo: Optional[str] = None,
+        run_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        mode: Optional[str] = None,
+        tier: Optional[str] = None,
+        cache_status: Optional[str] = None,
+        result_path: Optional[str] = None,
+        log_path: Optional[str] = None,
+        meta_path: Optional[str] = None,
+        summary_path: Optional[str] = None,
+        started_at: Optional[str] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        priority: int = 0,
+    ) -> int:
+        params = job_params(
+            task,
+            status=status,
+            repo=repo,
+            run_id=run_id,
+            session_id=session_id,
+            mode=mode,
+            tier=tier,
+            cache_status=cache_status,
+            result_path=result_path,
+            log_path=log_path,
+            meta_path=meta_path,
+            summary_path=summary_path,
+            started_at=started_at,
+            max_attempts=max_attempts,
+            priority=priority,
+        )
+        cur = self.conn.execute(INSERT_JOB_SQL, params)
+        return int(cur.lastrowid)
+
+    def update_job(
+        self,
+        job_id: int,
+        status: Optional[str] = None,
+        exit_code: Optional[int] = None,
+        session_id: Optional[str] = None,
+        completed_at: Optional[str] = None,
+        result_path: Optional[str] = None,
+        log_path: Optional[str] = None,
+        meta_path: Optional[str] = None,
+        summary_path: Optional[str] = None,
+        cache_status: Optional[str] = None,
+        error: Optional[str] = None,
+        owner: Optional[str] = None,
+        run_id: Optional[str] = None,
+        model: Optional[str] = None,
+        tokens_in: Optional[int] = None,
+        tokens_out: Optional[int] = None,
+        cost_usd: Optional[float] = None,
+    ) -> bool:
+        """Update a job; with ``owner``, only while that owner holds its lease.
+
+        Moving a job to a terminal status clears its lease. Returns whether a row changed.
+        """
+        statement = update_statement(
+            job_id,
+            status=status,
+            exit_code=exit_code,
+            session_id=session_id,
+            completed_at=completed_at,
+            result_path=result_path,
+            log_path=log_path,
+            meta_path=meta_path,
+            summary_path=summary_path,
+            cache_status=cache_status,
+            error=error,
+            owner=owner,
+            run_id=run_id,
+            model=model,
+            tokens_in=tokens_in,
+            tokens_out=tokens_out,
+            cost_usd=cost_usd,
+        )
+        if statement is None:
+            return False
+        cur = self.conn.execute(*statement)
+        return cur.rowcount > 0
+
+    def enqueue_many(self, records: Iterable[tuple[int, object]], chunk_size: int = BATCH_CHUNK_SIZE) -> BatchResult:
+        """Insert ``(line, record)`` pairs, ``chunk_size`` per transaction, via one ``executemany`` each.
+
+        A record is an ``enqueue`` keyword mapping; invalid ones are reported, not inserted.
+        """
+        result = BatchResult()
+        for chunk in _chunks(records, chunk_size):
+            now = epoch_now()
+            rows: list[tuple[int, dict[str, object]]] = []
+            for line, record in chunk:
+                try:
+                    rows.append((line, job_params(**check_record(record, ENQUEUE_FIELDS, "task"), now=now)))
+                except ValueError as exc:
+                    result.errors.append((line, str(exc)))
+            if not rows:
+                continue
+            with self.transaction() as conn:
+                conn.executemany(INSERT_JOB_SQL, [params for _, params in rows])
+                # The write lock is held, so the chunk's rowids are consecutive.
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            first_id = last_id - len(rows) + 1
+            result.applied.extend((line, first_id + offset) for offset, (line, _) in enumerate(rows))
+        return result
+
+    def update_many(self, records: Iterable[tuple[int, object]], chunk_size: int = BATCH_CHUNK_SIZE) -> BatchResult:
+        """Apply ``(line, record)`` pairs of ``update_job`` keywords (``id`` required), a chunk per transaction.
+
+        Each chunk first looks up its target jobs, so unknown ids and lost leases are reported
+        per line; consecutive records that set the same columns share one ``executemany``.
+        """
+        result = BatchResult()
+        for chunk in _chunks(records, chunk_size):
+            checked: list[tuple[int, dict]] = []
+            for line, record in chunk:
+                try:
+                    checked.append((line, check_record(record, UPDATE_FIELDS, "id")))
+                except ValueError as exc:
+                    result.errors.append((line, str(exc)))
+            if not checked:
+                continue
+            with self.transaction() as conn:
+                ids = json.dumps(sorted({record["id"] for _, record in checked}))
+                owners = {row["id"]: row["lease_owner"] for row in conn.execute(UPDATE_TARGETS_SQL, (ids,))}
+                statements: list[tuple[int, int, str, list[object]]] = []
+                for line, record in checked:
+                    job_id = record["id"]
+                    fields = {key: value for key, value in record.items() if key != "id"}
+                    statement = update_statement(job_id, **fields)
+                    if job_id not in owners:
+                        result.errors.append((line, f"no job with id {job_id}"))
+                    elif statement is None:
+                        result.errors.append((line, "nothing to update"))
+                    elif fields.get("owner") is not None and owners[job_id] != fields["owner"]:
+                        result.errors.append((line, f"lease not held by {fields['owner']}"))
+                    else:
+                        statements.append((line, job_id, *statement))
+                        if fields.get("status") in TERMINAL_STATUSES:
+                            owners[job_id] = None
+                for sql, group in groupby(statements, key=lambda item: item[2]):
+                    group = list(group)
+                    conn.executemany(sql, [values for *_, values in group])
+                    result.applied.extend((line, job_id) for line, job_id, *_ in group)
+        return result
+
+    def fetch_jobs(self, limit: int = DEFAULT_LIMIT) -> list[Job]:
+        return self.fetch_page(limit=limit).jobs
+
+    def fetch_page(
+        self,
+        filters: JobFilter = JobFilter(),
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_LIMIT,
+    ) -> JobPage:
+        """Return up to ``limit`` matching jobs, newest first, and the cursor for the next page."""
+        sql, params = list_jobs_query(filters, cursor, limit + 1)
+        rows = self.conn.execute(sql, params).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["sort_key"], rows[-1]["id"]) if more else None
+        return JobPage([Job.from_row(r) for r in rows], next_cursor)
+
+    def claim(
+        self,
+        owner: str,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        now: Optional[int] = None,
+        exclusive_repos: bool = False,
+        tier_limits: Optional[dict[str, int]] = None,
+        policy: SchedulePolicy = DEFAULT_POLICY,
+    ) -> Optional[Job]:
+        """Atomically lease the best eligible pending job (see ``policy``) to ``owner``.
+
+        With ``exclusive_repos``, jobs whose repo already has a leased run are skipped.
+        ``tier_limits`` caps leased runs per tier (jobs without a tier count as low).
+        Both, and the policy budget, are checked against every worker inside the claim
+        transaction. Returns None when nothing is eligible.
+        """
+        now = epoch_now() if now is None else now
+        with self.transaction() as conn:
+            self._reap(conn, now)
+            busy_repos: set[str] = set()
+            full_tiers: list[str] = []
+            if exclusive_repos or tier_limits:
+                leased: dict[str, int] = {}
+                for row in conn.execute(LEASED_SQL, (DEFAULT_TIER,)):
+                    if exclusive_repos and row["repo"] is not None:
+                        busy_repos.add(row["repo"])
+                    leased[row["tier"]] = leased.get(row["tier"], 0) + 1
+                full_tiers = [t for t, cap in (tier_limits or {}).items() if leased.get(t, 0) >= cap]
+            if self._over_budget(conn, policy, now):
+                full_tiers.extend(policy.budget_tiers)
+            row = conn.execute(
+                CLAIM_JOB_SQL,
+                {
+                    "owner": owner,
+                    "lease_expires_at": now + lease_seconds,
+                    "now": now,
+                    "now_iso": epoch_to_iso(now),
+                    "fair_since": now - policy.fair_window_seconds,
+                    "aging_seconds": policy.aging_seconds,
+                    "busy_repos": json.dumps(sorted(busy_repos)),
+                    "full_tiers": json.dumps(full_tiers),
+                    "repo_weights": json.dumps(policy.repo_weights),
+                    "tier_weights": json.dumps(policy.tier_weights),
+                },
+            ).fetchone()
+        return Job.from_row(row) if row else None
+
+    @staticmethod
+    def _over_budget(conn: sqlite3.Connection, policy: SchedulePolicy, now: int) -> bool:
+        if policy.budget_usd is None and policy.budget_tokens is None:
+            return False
+        spent = conn.execute(SPEND_SQL, (now - policy.budget_window_seconds,)).fetchone()
+        if policy.budget_usd is not None and spent["usd"] >= policy.budget_usd:
+            return True
+        return policy.budget_tokens is not None and spent["tokens"] >= policy.budget_tokens
+
+    def spend(self, window_seconds: int, now: Optional[int] = None) -> dict[str, float]:
+        """Return USD and tokens spent by runs completed in the last ``window_seconds``."""
+        now = epoch_now() if now is None else now
+        row = self.conn.execute(SPEND_SQL, (now - window_seconds,)).fetchone()
+        return {"usd": round(row["usd"], 6), "tokens": int(row["tokens"])}
+
+    def change_seq(self) -> int:
+        """The latest change sequence number (0 for an untouched database)."""
+        return int(self.conn.execute(CHANGE_SEQ_SQL).fetchone()[0])
+
+    def changes_since(self, seq: int, limit: int = MAX_LIMIT) -> list[Job]:
+        """Jobs inserted or updated after ``seq``, oldest change first (at most ``limit``)."""
+        return [Job.from_row(row) for row in self.conn.execute(CHANGES_SQL, (seq, limit))]
+
+    def pending_count(self) -> int:
+        return int(self.conn.execute(PENDING_COUNT_SQL).fetchone()[0])
+
+    def heartbeat(
+        self,
+        job_id: int,
+        owner: str,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        now: Optional[int] = None,
+    ) -> bool:
+        """Extend ``owner``'s lease; False means the lease was lost and the run should stop."""
+        now = epoch_now() if now is None else now
+        cur = self.conn.execute(HEARTBEAT_SQL, (now + lease_seconds, job_id, owner))
+        return cur.rowcount > 0
+
+    def release(
+        self,
+        job_id: int,
+        owner: str,
+        error: Optional[str] = None,
+        now: Optional[int] = None,
+    ) -> Optional[str]:
+        """Give a leased job back: requeue it with backoff, or fail it once out of attempts.
+
+        Returns the job's new status, or None when ``owner`` no longer holds the lease.
+        """
+        now = epoch_now() if now is None else now
+        row = self.conn.execute(
+            RELEASE_SQL, {"now": now, "now_iso": utc_now(), "error": error, "id": job_id, "owner": owner}
+        ).fetchone()
+        return row["status"] if row else None
+
+    def reap(self, now: Optional[int] = None) -> dict[str, int]:
+        """Requeue (or fail) every job whose lease expired; returns counts per new status."""
+        now = epoch_now() if now is None else now
+        with self.transaction() as conn:
+            return self._reap(conn, now)
+
+    @staticmethod
+    def _reap(conn: sqlite3.Connection, now: int) -> dict[str, int]:
+        counts = {"pending": 0, "failed": 0}
+        for row in conn.execute(REAP_SQL, {"now": now, "now_iso": utc_now()}).fetchall():
+            counts[row["status"]] += 1
+        return counts
+
+    def archive(
+        self,
+        older_than_days: float = DEFAULT_RETENTION_DAYS,
+        archive_db: Optional[Path] = None,
+        export_path: Optional[Path] = None,
+        chunk_size: int = ARCHIVE_CHUNK_SIZE,
+        now: Optional[int] = None,
+    ) -> ArchiveResult:
+        """Move finished jobs completed before the cutoff into ``jobs_archive``, then vacuum.
+
+        Each chunk is exported (if asked), copied and deleted in one transaction. Rows are
+        copied with ``INSERT OR REPLACE`` so a run interrupted between the two databases of
+        ``archive_db`` can simply be repeated.
+        """
+        now = epoch_now() if now is None else now
+        cutoff = int(now - older_than_days * 86400)
+        result = ArchiveResult(cutoff=epoch_to_iso(cutoff))
+        conn = self.conn
+        schema = "main"
+        if archive_db is not None:
+            archive_db.parent.mkdir(parents=True, exist_ok=True)
+            conn.execute("ATTACH DATABASE ? AS archive", (str(archive_db),))
+            schema = "archive"
+        export = None
+        try:
+            if export_path is not None:
+                export = gzip.open(export_path, "at", encoding="utf-8")
+            with self.transaction():
+                columns = ", ".join(ensure_archive_table(conn, schema))
+            while True:
+                with self.transaction():
+                    ids = [row["id"] for row in conn.execute(ARCHIVE_CANDIDATES_SQL, (cutoff, max(1, chunk_size)))]
+                    if not ids:
+                        break
+                    id_list = json.dumps(ids)
+                    if export is not None:
+                        rows = conn.execute(
+                            f"SELECT {JOB_COLUMNS} FROM jobs WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id",
+                            (id_list,),
+                        )
+                        for row in rows:
+                            export.write(json.dumps(dict(row), ensure_ascii=True) + "\n")
+                            result.exported += 1
+                        export.flush()
+                    conn.execute(
+                        f"""
+                        INSERT OR REPLACE INTO {schema}.jobs_archive ({columns}, archived_epoch)
+                        SELECT {columns}, ? FROM jobs WHERE id IN (SELECT value FROM json_each(?))
+                        """,
+                        (now, id_list),
+                    )
+                    result.archived += conn.execute(
+                        "DELETE FROM jobs WHERE id IN (SELECT value FROM json_each(?))", (id_list,)
+                    ).rowcount
+        finally:
+            if export is not None:
+                export.close()
+            if archive_db is not None:
+                conn.execute("DETACH DATABASE archive")
+        result.pages_freed = self.vacuum()
+        return result
+
+    def job_stats(self) -> dict[str, object]:
+        """Counts by status/repo/tier and queue-wait/run-time percentiles (seconds) over ``jobs``."""
+        row = self.conn.execute(JOB_STATS_SQL).fetchone()
+        return {key: json.loads(row[key]) if isinstance(row[key], str) else row[key] for key in row.keys()}
+
+    def vacuum(self) -> int:
+        """Return free pages to the filesystem (incremental auto-vacuum only); returns pages freed."""
+        conn = self.conn
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def compact(self) -> dict[str, object]:
+        """Switch an older database to incremental auto-vacuum (one full VACUUM) or vacuum it."""
+        conn = self.conn
+        before = conn.execute("PRAGMA page_count").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            self.vacuum()
+        return {"pages_before": before, **self.storage_stats()["pages"]}
+
+    def storage_stats(self, archive_db: Optional[Path] = None) -> dict[str, object]:
+        """Hot and archived row counts plus page usage of the live database file."""
+        conn = self.conn
+        pages = {name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in ("page_size", "page_count", "freelist_count")}
+        pages["bytes"] = pages["page_size"] * pages["page_count"]
+        pages["auto_vacuum"] = AUTO_VACUUM_MODES[conn.execute("PRAGMA auto_vacuum").fetchone()[0]]
+        rows = {
+            "hot": conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0],
+            "archived": conn.execute("SELECT COUNT(*) FROM jobs_archive").fetchone()[0],
+        }
+        if archive_db is not None and archive_db.exists():
+            archive = sqlite3.connect(f"file:{archive_db}?mode=ro", uri=True)
+            try:
+                has_table = archive.execute("SELECT 1 FROM sqlite_master WHERE name = 'jobs_archive'").fetchone()
+                rows["archived_file"] = archive.execute("SELECT COUNT(*) FROM jobs_archive").fetchone()[0] if has_table else 0
+            finally:
+                archive.close()
+        return {"rows": rows, "pages": pages}
+
+
+@dataclass
+class ArchiveResult:
+    archived: int = 0
+    exported: int = 0
+    pages_freed: int = 0
+    cutoff: str = ""
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+_QUEUES: dict[Path, JobQueue] = {}
+_QUEUES_LOCK = threading.Lock()
+
+
+def open_queue(db_path: Path) -> JobQueue:
+    """Return the process-wide ``JobQueue`` for ``db_path``, creating it on first use."""
+    key = Path(db_path).resolve()
+    with _QUEUES_LOCK:
+        queue = _QUEUES.get(key)
+        if queue is None:
+            queue = _QUEUES[key] = JobQueue(Path(db_path))
+        return queue
+
+
 def enqueue(
     db_path: Path,
     task: str,
@@ -136,37 +1317,26 @@ def enqueue(
     meta_path: Optional[str],
     summary_path: Optional[str],
     started_at: Optional[str],
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    priority: int = 0,
 ) -> int:
-    conn = connect(db_path)
-    ensure_schema(conn)
-    now_iso = utc_now()
-    started_iso = started_at or now_iso if status != "pending" else None
-    cur = conn.execute(
-        """
-        INSERT INTO jobs (
-            task, status, repo, run_id, session_id, mode, tier, cache_status,
-            created_at, started_at, result_path, log_path, meta_path, summary_path
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            task,
-            status,
-            repo,
-            run_id,
-            session_id,
-            mode,
-            tier,
-            cache_status,
-            now_iso,
-            started_iso,
-            result_path,
-            log_path,
-            meta_path,
-            summary_path,
-        ),
+    return open_queue(db_path).enqueue(
+        task=task,
+        status=status,
+        repo=repo,
+        run_id=run_id,
+        session_id=session_id,
+        mode=mode,
+        tier=tier,
+        cache_status=cache_status,
+        result_path=result_path,
+        log_path=log_path,
+        meta_path=meta_path,
+        summary_path=summary_path,
+        started_at=started_at,
+        max_attempts=max_attempts,
+        priority=priority,
     )
-    conn.commit()
-    return int(cur.lastrowid)
 
 
 def update_job(
@@ -182,54 +1352,26 @@ def update_job(
     summary_path: Optional[str],
     cache_status: Optional[str],
     error: Optional[str],
-) -> None:
-    conn = connect(db_path)
-    ensure_schema(conn)
-    fields: list[str] = []
-    values: list[object] = []
-
-    mapping = {
-        "status": status,
-        "session_id": session_id,
-        "completed_at": completed_at or utc_now() if status in {"completed", "failed", "cached"} else completed_at,
-        "result_path": result_path,
-        "log_path": log_path,
-        "meta_path": meta_path,
-        "summary_path": summary_path,
-        "cache_status": cache_status,
-        "error": error,
-    }
-    if exit_code is not None:
-        mapping["error"] = error or ("" if exit_code == 0 else f"codex exited with {exit_code}")
-
-    for key, val in mapping.items():
-        if val is not None:
-            fields.append(f"{key}=?")
-            values.append(val)
-
-    if not fields:
-        return
-
-    values.append(job_id)
-    conn.execute(f"UPDATE jobs SET {', '.join(fields)} WHERE id=?", values)
-    conn.commit()
+    owner: Optional[str] = None,
+) -> bool:
+    return open_queue(db_path).update_job(
+        job_id=job_id,
+        status=status,
+        exit_code=exit_code,
+        session_id=session_id,
+        completed_at=completed_at,
+        result_path=result_path,
+        log_path=log_path,
+        meta_path=meta_path,
+        summary_path=summary_path,
+        cache_status=cache_status,
+        error=error,
+        owner=owner,
+    )
 
 
 def fetch_jobs(db_path: Path, limit: int = DEFAULT_LIMIT) -> list[Job]:
-    conn = connect(db_path)
-    ensure_schema(conn)
-    rows = conn.execute(
-        """
-        SELECT id, task, status, repo, run_id, session_id, mode, tier, cache_status,
-               created_at, started_at, completed_at, result_path, log_path, meta_path,
-               summary_path, error
-        FROM jobs
-        ORDER BY COALESCE(started_at, created_at) DESC, id DESC
-        LIMIT ?
-        """,
-        (limit,),
-    ).fetchall()
-    return [Job.from_row(r) for r in rows]
+    return open_queue(db_path).fetch_jobs(limit)
 
 
 def emit_json(data: object) -> None:
@@ -256,6 +1398,8 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     enqueue_parser.add_argument("--meta-path")
     enqueue_parser.add_argument("--summary-path")
     enqueue_parser.add_argument("--started-at")
+    enqueue_parser.add_argument("--priority", type=int, default=0, help="Higher runs first (default: 0)")
+    enqueue_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="Claims allowed before the job fails")
 
     update_parser = sub.add_parser("update", help="Update an existing job")
     update_parser.add_argument("--id", type=int, required=True, help="Job id")
@@ -269,9 +1413,52 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     update_parser.add_argument("--summary-path")
     update_parser.add_argument("--cache")
     update_parser.add_argument("--error")
+    update_parser.add_argument("--owner", help="Only update while this lease owner holds the job")
+
+    for name, help_text in (
+        ("enqueue-batch", "Insert jobs from JSONL (one enqueue field object per line)"),
+        ("update-batch", "Update jobs from JSONL (one update field object per line, with id)"),
+    ):
+        batch_parser = sub.add_parser(name, help=help_text)
+        batch_parser.add_argument("--file", default="-", help="JSONL input (default: stdin)")
+        batch_parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_SIZE, help="Lines per transaction")
+
+    claim_parser = sub.add_parser("claim", help="Lease the oldest eligible pending job")
+    claim_parser.add_argument("--owner", default=default_owner(), help="Lease owner id (default: host:pid)")
+    claim_parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS)
+    claim_parser.add_argument("--policy", type=Path, help="Schedule policy JSON (weights, aging, budget)")
+
+    heartbeat_parser = sub.add_parser("heartbeat", help="Extend a job lease")
+    heartbeat_parser.add_argument("--id", type=int, required=True, help="Job id")
+    heartbeat_parser.add_argument("--owner", required=True)
+    heartbeat_parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS)
+
+    release_parser = sub.add_parser("release", help="Requeue a leased job (fails it once out of attempts)")
+    release_parser.add_argument("--id", type=int, required=True, help="Job id")
+    release_parser.add_argument("--owner", required=True)
+    release_parser.add_argument("--error")
+
+    sub.add_parser("reap", help="Requeue jobs whose lease expired")
 
     list_parser = sub.add_parser("list", help="List recent jobs")
     list_parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    list_parser.add_argument("--status", help="Comma-separated statuses to include")
+    list_parser.add_argument("--repo")
+    list_parser.add_argument("--tier")
+    list_parser.add_argument("--since", help="Only jobs started (or created) at or after this ISO UTC time")
+    list_parser.add_argument("--until", help="Only jobs started (or created) before this ISO UTC time")
+    list_parser.add_argument("--cursor", help="next_cursor from the previous page")
+
+    archive_parser = sub.add_parser("archive", help="Move finished jobs older than the retention window to the archive")
+    archive_parser.add_argument("--older-than-days", type=float, default=DEFAULT_RETENTION_DAYS, help=f"Retention window (default: {DEFAULT_RETENTION_DAYS})")
+    archive_parser.add_argument("--archive-db", type=Path, help="Archive into this database file instead of jobs_archive here")
+    archive_parser.add_argument("--export", type=Path, help="Also append the archived rows to this gzip JSONL file")
+    archive_parser.add_argument("--chunk-size", type=int, default=ARCHIVE_CHUNK_SIZE, help="Rows moved per transaction")
+
+    sub.add_parser("compact", help="Enable incremental auto-vacuum (full VACUUM once) and release free pages")
+
+    stats_parser = sub.add_parser("stats", help="Show job counts, wait/run percentiles, archived rows and page usage")
+    stats_parser.add_argument("--archive-db", type=Path, help="Also count rows in this archive database file")
 
     sub.add_parser("init", help="Create the database if needed")
 
@@ -298,12 +1485,14 @@ def main(argv: Iterable[str] | None = None) -> int:
             meta_path=args.meta_path,
             summary_path=args.summary_path,
             started_at=args.started_at,
+            max_attempts=args.max_attempts,
+            priority=args.priority,
         )
         print(job_id)
         return 0
 
     if args.command == "update":
-        update_job(
+        updated = update_job(
             db_path=db_path,
             job_id=args.id,
             status=args.status,
@@ -316,17 +1505,79 @@ def main(argv: Iterable[str] | None = None) -> int:
             summary_path=args.summary_path,
             cache_status=args.cache,
             error=args.error,
+            owner=args.owner,
         )
+        return 0 if updated or args.owner is None else 3
+
+    if args.command in {"enqueue-batch", "update-batch"}:
+        queue = open_queue(db_path)
+        apply = queue.enqueue_many if args.command == "enqueue-batch" else queue.update_many
+        try:
+            if args.file == "-":
+                result = apply(read_jsonl(sys.stdin), args.chunk_size)
+            else:
+                with open(args.file, encoding="utf-8") as handle:
+                    result = apply(read_jsonl(handle), args.chunk_size)
+        except OSError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 2
+        emit_json(result.to_dict())
+        return 1 if result.errors else 0
+
+    if args.command == "claim":
+        try:
+            policy = SchedulePolicy.load(args.policy) if args.policy else DEFAULT_POLICY
+        except (OSError, ValueError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 2
+        job = open_queue(db_path).claim(args.owner, args.lease_seconds, policy=policy)
+        emit_json({"job": job.to_dict() if job else None})
+        return 0
+
+    if args.command == "heartbeat":
+        return 0 if open_queue(db_path).heartbeat(args.id, args.owner, args.lease_seconds) else 3
+
+    if args.command == "release":
+        status = open_queue(db_path).release(args.id, args.owner, args.error)
+        emit_json({"id": args.id, "status": status})
+        return 0 if status else 3
+
+    if args.command == "reap":
+        emit_json(open_queue(db_path).reap())
         return 0
 
     if args.command == "list":
-        emit_json({"jobs": [job.to_dict() for job in fetch_jobs(db_path, args.limit)]})
+        filters = JobFilter(
+            statuses=tuple(s for s in (args.status or "").split(",") if s),
+            repo=args.repo,
+            tier=args.tier,
+            since=args.since,
+            until=args.until,
+        )
+        try:
+            page = open_queue(db_path).fetch_page(filters, args.cursor, max(1, args.limit))
+        except ValueError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 2
+        emit_json({"jobs": [job.to_dict() for job in page.jobs], "next_cursor": page.next_cursor})
+        return 0
+
+    if args.command == "archive":
+        result = open_queue(db_path).archive(args.older_than_days, args.archive_db, args.export, args.chunk_size)
+        emit_json(result.to_dict())
+        return 0
+
+    if args.command == "compact":
+        emit_json(open_queue(db_path).compact())
+        return 0
+
+    if args.command == "stats":
+        queue = open_queue(db_path)
+        emit_json({**queue.job_stats(), **queue.storage_stats(args.archive_db)})
         return 0
 
     if args.command == "init":
-        conn = connect(db_path)
-        ensure_schema(conn)
-        emit_json({"status": "ok", "db": str(db_path)})
+        emit_json({"status": "ok", "db": str(db_path), "schema_version": open_queue(db_path).migrate()})
         return 0
 
     return 0
@@ -1,12 +1,30 @@
 #!/usr/bin/env python3
 """
 Serve the Codex job queue as a tiny JSON API plus a static dashboard.
+
+GET /api/jobs takes ``limit`` (capped at job_queue.MAX_LIMIT), ``status`` (comma-separated),
+``repo``, ``tier``, ``since``/``until`` (ISO UTC) and ``cursor``; the response carries
+``next_cursor`` for the following page, or null on the last one.
+
+GET /api/stats returns ``job_queue.JobQueue.job_stats()`` for the whole table (counts by
+status/repo/tier, p50/p95/p99 queue wait and run seconds), computed at most once per
+``--stats-ttl`` seconds however many dashboards are polling.
+
+GET /api/events is a Server-Sent Events stream of ``jobs`` events, each carrying only the
+rows inserted or updated since the client's last event (``since`` query parameter, or the
+``Last-Event-ID`` header on reconnect; event ids are ``change_seq`` values), and of
+``stats`` events whenever the stats are refreshed after changes (at most once per
+``--stats-ttl``). One ``ChangeFeed`` thread per server polls ``PRAGMA data_version``, which
+moves only when another connection commits, so idle streams cost a pragma per poll and a
+keep-alive comment every ``KEEPALIVE_SECONDS``. /api/jobs reports the ``change_seq`` its page is
+current to, for the stream to continue from.
 """
 
 from __future__ import annotations
 
 import argparse
 import json
+import sqlite3
 import sys
 import threading
 import time
@@ -15,10 +33,14 @@ import webbrowser
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 import job_queue
 
+DEFAULT_STATS_TTL = 2.0
+DEFAULT_WATCH_SECONDS = 0.2
+KEEPALIVE_SECONDS = 15.0
+
 
 def discover_dashboard_path(explicit: Optional[str]) -> Optional[Path]:
     if explicit:
@@ -94,9 +116,12 @@ def load_dashboard_html(path: Optional[Path]) -> str:
     const dbPath = document.getElementById('db-path');
 
     const format = (iso) => iso ? new Date(iso).toLocaleString() : '—';
+    const jobs = new Map();
+    const newestFirst = (a, b) =>
+      (b.started_at || b.created_at || '').localeCompare(a.started_at || a.created_at || '') || b.id - a.id;
 
-    function renderTotals(jobs) {
-      const counts = jobs.reduce((acc, j) => { acc[j.status] = (acc[j.status] || 0) + 1; return acc; }, {});
+    function renderTotals(stats) {
+      const counts = stats.by_status || {};
       totals.innerHTML = Object.entries(counts).map(([status, count]) => `
         <div class="card">
           <h2>${status}</h2>
@@ -105,8 +130,15 @@ def load_dashboard_html(path: Optional[Path]) -> str:
       `).join('') || '<div class="card"><h2>No Jobs</h2><div class="muted">Queue is empty.</div></div>';
     }
 
-    function renderRows(jobs) {
-      body.innerHTML = jobs.map(j => `
+    function applyJobs(changed) {
+      changed.forEach(j => jobs.set(j.id, j));
+      const sorted = [...jobs.values()].sort(newestFirst);
+      sorted.slice(200).forEach(j => jobs.delete(j.id));
+      renderRows(sorted.slice(0, 200));
+    }
+
+    function renderRows(rows) {
+      body.innerHTML = rows.map(j => `
         <tr>
           <td>${j.id}</td>
           <td><span class="status ${j.status}">${j.status}</span></td>
@@ -124,26 +156,132 @@ def load_dashboard_html(path: Optional[Path]) -> str:
     async function load() {
       try {
         refreshLabel.textContent = 'refreshing…';
-        const res = await fetch('/api/jobs');
-        if (!res.ok) throw new Error('bad response');
+        const [res, statsRes] = await Promise.all([fetch('/api/jobs'), fetch('/api/stats')]);
+        if (!res.ok || !statsRes.ok) throw new Error('bad response');
         const data = await res.json();
-        renderRows(data.jobs || []);
-        renderTotals(data.jobs || []);
+        jobs.clear();
+        applyJobs(data.jobs || []);
+        renderTotals(await statsRes.json());
         refreshLabel.textContent = `updated ${new Date(data.generated_at).toLocaleTimeString()}`;
         dbPath.textContent = data.db_path || '';
+        return data.change_seq;
       } catch (err) {
         refreshLabel.textContent = 'error loading';
         console.error(err);
+        return null;
       }
     }
 
-    load();
-    setInterval(load, 5000);
+    load().then(seq => {
+      if (!window.EventSource || seq == null) { setInterval(load, 5000); return; }
+      const events = new EventSource(`/api/events?since=${seq}`);
+      events.addEventListener('jobs', e => {
+        const data = JSON.parse(e.data);
+        applyJobs(data.jobs || []);
+        refreshLabel.textContent = `updated ${new Date().toLocaleTimeString()}`;
+      });
+      events.addEventListener('stats', e => renderTotals(JSON.parse(e.data)));
+      events.onerror = () => { refreshLabel.textContent = 'reconnecting…'; };
+    });
   </script>
 </body>
 """
 
 
+def _query_value(query: dict[str, list[str]], key: str) -> Optional[str]:
+    values = query.get(key)
+    return values[0] if values else None
+
+
+class ChangeFeed:
+    """Track the queue's latest ``change_seq`` and wake waiting streams when it moves.
+
+    With ``stats``, a second thread refreshes the aggregate stats after changes, at most once
+    per ``stats_seconds``, and wakes the streams to push them. Neither the streams nor the
+    watcher compute stats, so a slow aggregate never holds up row deltas.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        poll_seconds: float = DEFAULT_WATCH_SECONDS,
+        stats: Optional[Callable[[], dict]] = None,
+        stats_seconds: float = DEFAULT_STATS_TTL,
+    ):
+        self.db_path = db_path
+        self.poll_seconds = poll_seconds
+        self.refresh_stats = stats
+        self.stats_seconds = stats_seconds
+        self.seq = 0
+        self.stats: Optional[dict] = None
+        self.stats_version = 0
+        self._stats_seq = 0
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    def start(self) -> None:
+        conn = job_queue.connect(self.db_path)
+        self.seq = self._stats_seq = int(conn.execute(job_queue.CHANGE_SEQ_SQL).fetchone()[0])
+        self._threads = [threading.Thread(target=self._watch, args=(conn,), name="change-feed", daemon=True)]
+        if self.refresh_stats is not None:
+            self._threads.append(threading.Thread(target=self._refresh, name="change-feed-stats", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _watch(self, conn: sqlite3.Connection) -> None:
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        try:
+            while not self._closed.wait(self.poll_seconds):
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current == version:
+                    continue
+                version = current
+                seq = int(conn.execute(job_queue.CHANGE_SEQ_SQL).fetchone()[0])
+                if seq == self.seq:
+                    continue
+                with self._cond:
+                    self.seq = seq
+                    self._cond.notify_all()
+        finally:
+            conn.close()
+
+    def _refresh(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.seq > self._stats_seq or self.closed)
+                if self.closed:
+                    return
+                seq = self.seq
+            payload = self.refresh_stats()
+            with self._cond:
+                self._stats_seq = seq
+                self.stats = payload
+                self.stats_version += 1
+                self._cond.notify_all()
+            self._closed.wait(self.stats_seconds)
+
+    def wait(self, seq: int, stats_version: int, timeout: float) -> tuple[int, int]:
+        """Block until the sequence passes ``seq`` or new stats arrive (or ``timeout``/close).
+
+        Returns the latest ``(seq, stats_version)``.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > seq or self.stats_version > stats_version or self.closed, timeout)
+            return self.seq, self.stats_version
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+
 class QueueHandler(BaseHTTPRequestHandler):
     server: "QueueHTTPServer"
 
@@ -166,6 +304,39 @@ class QueueHandler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(body)
 
+    def _stream_events(self, query: dict[str, list[str]]) -> None:
+        last_id = self.headers.get("Last-Event-ID") or _query_value(query, "since")
+        try:
+            seq = int(last_id) if last_id else self.server.queue.change_seq()
+        except ValueError:
+            self._send_json({"error": f"invalid event id: {last_id!r}"}, HTTPStatus.BAD_REQUEST)
+            return
+        feed = self.server.feed
+        stats_version = feed.stats_version
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            self.wfile.write(b"retry: 1000\n\n")
+            while not feed.closed:
+                latest, latest_stats = feed.wait(seq, stats_version, KEEPALIVE_SECONDS)
+                if latest <= seq and latest_stats <= stats_version:
+                    self.wfile.write(b": keep-alive\n\n")
+                    continue
+                while latest > seq and (jobs := self.server.queue.changes_since(seq, job_queue.MAX_LIMIT)):
+                    seq = jobs[-1].change_seq
+                    data = json.dumps({"jobs": [job.to_dict() for job in jobs]}, ensure_ascii=True)
+                    self.wfile.write(f"id: {seq}\nevent: jobs\ndata: {data}\n\n".encode("utf-8"))
+                # Sequence numbers of rows archived since are simply skipped.
+                seq = max(seq, latest)
+                if latest_stats > stats_version and feed.stats is not None:
+                    stats_version = latest_stats
+                    data = json.dumps(feed.stats, ensure_ascii=True)
+                    self.wfile.write(f"event: stats\ndata: {data}\n\n".encode("utf-8"))
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
     def do_GET(self) -> None:  # noqa: N802 - required signature
         parsed = urllib.parse.urlparse(self.path)
         if parsed.path in ("/", "/dashboard", "/index.html"):
@@ -180,24 +351,81 @@ class QueueHandler(BaseHTTPRequestHandler):
                     limit = max(1, int(query["limit"][0]))
                 except Exception:
                     pass
-            jobs = [job.to_dict() for job in job_queue.fetch_jobs(self.server.db_path, limit)]
+            filters = job_queue.JobFilter(
+                statuses=tuple(s for s in (_query_value(query, "status") or "").split(",") if s),
+                repo=_query_value(query, "repo"),
+                tier=_query_value(query, "tier"),
+                since=_query_value(query, "since"),
+                until=_query_value(query, "until"),
+            )
+            # Read before the page so no change can fall between the page and the stream.
+            change_seq = self.server.queue.change_seq()
+            try:
+                page = self.server.queue.fetch_page(filters, _query_value(query, "cursor"), min(limit, job_queue.MAX_LIMIT))
+            except ValueError as exc:
+                self._send_json({"error": str(exc)}, HTTPStatus.BAD_REQUEST)
+                return
             payload = {
-                "jobs": jobs,
+                "jobs": [job.to_dict() for job in page.jobs],
+                "next_cursor": page.next_cursor,
+                "change_seq": change_seq,
                 "generated_at": job_queue.utc_now(),
                 "db_path": str(self.server.db_path),
             }
             self._send_json(payload)
             return
 
+        if parsed.path == "/api/stats":
+            self._send_json(self.server.stats())
+            return
+
+        if parsed.path == "/api/events":
+            self._stream_events(urllib.parse.parse_qs(parsed.query))
+            return
+
         self.send_error(HTTPStatus.NOT_FOUND, "Not Found")
 
 
 class QueueHTTPServer(ThreadingHTTPServer):
-    def __init__(self, host: str, port: int, db_path: Path, dashboard_html: str, default_limit: int):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        db_path: Path,
+        dashboard_html: str,
+        default_limit: int,
+        stats_ttl: float = DEFAULT_STATS_TTL,
+        watch_seconds: float = DEFAULT_WATCH_SECONDS,
+    ):
         super().__init__((host, port), QueueHandler)
         self.db_path = db_path
+        self.queue = job_queue.open_queue(db_path)
         self.dashboard_html = dashboard_html
         self.default_limit = default_limit
+        self.stats_ttl = stats_ttl
+        self._stats_lock = threading.Lock()
+        self._stats_cache: tuple[float, dict] = (float("-inf"), {})
+        # The feed's own connection needs the schema in place.
+        self.queue.migrate()
+        self.feed = ChangeFeed(db_path, watch_seconds, stats=self.stats, stats_seconds=stats_ttl)
+        self.feed.start()
+
+    def server_close(self) -> None:
+        self.feed.close()
+        super().server_close()
+
+    def stats(self) -> dict:
+        """Aggregate stats, recomputed once the cached copy is older than ``stats_ttl``."""
+        with self._stats_lock:
+            expires, payload = self._stats_cache
+            if time.monotonic() >= expires:
+                payload = {
+                    **self.queue.job_stats(),
+                    "generated_at": job_queue.utc_now(),
+                    "db_path": str(self.db_path),
+                }
+                self._stats_cache = (time.monotonic() + self.stats_ttl, payload)
+            return payload
 
 
 def main(argv: list[str] | None = None) -> int:
@@ -206,6 +434,8 @@ def main(argv: list[str] | None = None) -> int:
     parser.add_argument("--host", default="127.0.0.1")
     parser.add_argument("--port", type=int, default=7801)
     parser.add_argument("--limit", type=int, default=job_queue.DEFAULT_LIMIT, help="Default API limit")
+    parser.add_argument("--stats-ttl", type=float, default=DEFAULT_STATS_TTL, help="Seconds to cache /api/stats")
+    parser.add_argument("--watch-seconds", type=float, default=DEFAULT_WATCH_SECONDS, help="How often /api/events checks for commits")
     parser.add_argument("--dashboard", help="Path to dashboard HTML")
     parser.add_argument("--open", action="store_true", help="Open the dashboard in the browser")
     args = parser.parse_args(argv)
@@ -214,11 +444,7 @@ def main(argv: list[str] | None = None) -> int:
     dashboard_path = discover_dashboard_path(args.dashboard)
     dashboard_html = load_dashboard_html(dashboard_path)
 
-    # Ensure schema exists up-front so the API works on first request.
-    conn = job_queue.connect(db_path)
-    job_queue.ensure_schema(conn)
-
-    server = QueueHTTPServer(args.host, args.port, db_path, dashboard_html, args.limit)
+    server = QueueHTTPServer(args.host, args.port, db_path, dashboard_html, args.limit, args.stats_ttl, args.watch_seconds)
 
     if args.open:
         url = f"http://{args.host}:{args.port}/"
@@ -230,6 +456,7 @@ def main(argv: list[str] | None = None) -> int:
     except KeyboardInterrupt:
         print("\nShutting down.")
         server.server_close()
+        server.queue.close()
     return 0
 
 
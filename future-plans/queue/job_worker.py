@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Worker daemon that drains the Codex job queue with bounded parallelism.
+
+The worker claims ``pending`` jobs (see job_queue.JobQueue.claim) and runs each one as a
+child process:
+
+  mode review   invoke_codex_with_review.sh --repo <repo> --task-file <file> --log-dir <dir>
+  mode resume   run_codex_task.sh --repo <repo> --resume <session_id> --tier <tier> --log-dir <dir>
+  otherwise     run_codex_task.sh --repo <repo> --task-file <file> --tier <tier> --log-dir <dir>
+
+Limits:
+- ``--concurrency`` caps the children this worker runs at once;
+- a job is never claimed while another leased job (from any worker on the database) has
+  the same repo, so two runs never write to one working tree;
+- ``--tier-limit high=1`` caps leased runs per model tier across workers;
+- ``--policy <json>`` sets priority aging, fair-share weights and a rolling spend budget
+  (job_queue.SchedulePolicy), e.g.
+  ``{"repo_weights": {"/src/app": 2}, "aging_seconds": 600, "budget_usd": 20}``.
+
+Leases are renewed while children run. A child whose lease is lost (for example after the
+worker was paused past the lease) is killed, since another worker may already own the job.
+When a child exits, its ``key=value`` output lines (``codex_run_id``, ``codex_session_id``,
+``log_file``, ``meta_file``, ``summary_file``, ``cache_status``, ``model_selected``) and exit
+code go back into the row, with token counts from the summary and its cost (the summary's
+own, else priced from the model registry) for budget accounting; the child's combined
+output is kept as the row's ``result_path``. A job whose runner cannot be started is marked
+failed. SIGTERM/SIGINT stop claiming, stop the children and hand their jobs back to the
+queue.
+
+Usage:
+  job_worker.py --db runs/job_queue.sqlite3 --concurrency 4 --tier-limit high=1
+  job_worker.py --db runs/job_queue.sqlite3 --drain      # exit once the queue is empty
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+import job_queue
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent.parent / "codex-job" / "scripts"
+sys.path.insert(1, str(SCRIPTS_DIR))
+try:
+    import summary_schema
+    from codex_cache import DEFAULT_MODELS_FILE, load_prices
+except ImportError:  # installed without the codex-job scripts: no token/cost accounting
+    summary_schema = None
+    DEFAULT_MODELS_FILE = SCRIPTS_DIR.parent / "references" / "available_models.jsonl"
+
+    def load_prices(models_file: Path) -> dict[str, tuple[float, float]]:
+        return {}
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_POLL_SECONDS = 2.0
+STOP_GRACE_SECONDS = 10
+RESULT_KEYS = ("codex_run_id", "codex_session_id", "log_file", "meta_file", "summary_file", "cache_status", "model_selected")
+
+
+def discover_script(explicit: Optional[str], name: str) -> Path:
+    if explicit:
+        return Path(explicit)
+    script_dir = Path(__file__).resolve().parent
+    candidates = [
+        script_dir.parent.parent / "codex-job" / "scripts" / name,
+        script_dir.parent.parent / ".claude" / "skills" / "codex-job" / "scripts" / name,
+        script_dir / name,
+    ]
+    for cand in candidates:
+        if cand.exists():
+            return cand
+    return candidates[0]
+
+
+def parse_result_lines(path: Path) -> dict[str, str]:
+    """Return the last value of each known ``key=value`` line in a child's output."""
+    values: dict[str, str] = {}
+    try:
+        with path.open(encoding="utf-8", errors="replace") as handle:
+            for line in handle:
+                key, sep, value = line.rstrip("\n").partition("=")
+                if sep and key in RESULT_KEYS:
+                    values[key] = value
+    except OSError:
+        pass
+    return values
+
+
+def run_usage(
+    summary_path: Optional[str],
+    model: Optional[str],
+    prices: dict[str, tuple[float, float]],
+) -> tuple[Optional[int], Optional[int], Optional[float]]:
+    """Return (input tokens, output tokens, USD) for a finished run, None where unknown."""
+    if summary_schema is None or not summary_path:
+        return None, None, None
+    try:
+        summary = json.loads(Path(summary_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None, None, None
+    if not isinstance(summary, dict):
+        return None, None, None
+    tok = summary_schema.token_usage(summary)
+    tokens_in = summary_schema.coerce_int(tok.get("in"))
+    tokens_out = summary_schema.coerce_int(tok.get("out"))
+    usd = summary_schema.cost(summary).get("usd")
+    if not isinstance(usd, (int, float)) and model in prices and (tokens_in is not None or tokens_out is not None):
+        price_in, price_out = prices[model]
+        usd = ((tokens_in or 0) * price_in + (tokens_out or 0) * price_out) / 1000
+    return tokens_in, tokens_out, round(float(usd), 6) if isinstance(usd, (int, float)) else None
+
+
+def parse_tier_limits(items: Iterable[str]) -> dict[str, int]:
+    limits: dict[str, int] = {}
+    for item in items:
+        tier, sep, raw = item.partition("=")
+        if not sep or not tier or not raw.isdigit() or int(raw) < 1:
+            raise ValueError(f"invalid --tier-limit {item!r} (expected <tier>=<positive int>)")
+        limits[tier] = int(raw)
+    return limits
+
+
+@dataclass
+class RunningJob:
+    job: job_queue.Job
+    proc: subprocess.Popen
+    output_path: Path
+    next_heartbeat: float
+
+
+class Worker:
+    def __init__(
+        self,
+        queue: job_queue.JobQueue,
+        runner: Path,
+        reviewer: Path,
+        log_dir: Path,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        tier_limits: Optional[dict[str, int]] = None,
+        lease_seconds: int = job_queue.DEFAULT_LEASE_SECONDS,
+        poll_seconds: float = DEFAULT_POLL_SECONDS,
+        owner: Optional[str] = None,
+        runner_args: Optional[list[str]] = None,
+        policy: job_queue.SchedulePolicy = job_queue.DEFAULT_POLICY,
+        prices: Optional[dict[str, tuple[float, float]]] = None,
+    ):
+        self.queue = queue
+        self.runner = runner
+        self.reviewer = reviewer
+        self.log_dir = log_dir
+        self.concurrency = concurrency
+        self.tier_limits = tier_limits or {}
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.owner = owner or job_queue.default_owner()
+        self.runner_args = runner_args or []
+        self.policy = policy
+        self.prices = prices or {}
+        self.running: dict[int, RunningJob] = {}
+        self.stopping = False
+
+    def command_for(self, job: job_queue.Job, task_file: Path) -> list[str]:
+        if job.mode == "review":
+            return [str(self.reviewer), "--repo", str(job.repo), "--task-file", str(task_file), "--log-dir", str(self.log_dir), *self.runner_args]
+        cmd = [str(self.runner), "--repo", str(job.repo), "--tier", job.tier or job_queue.DEFAULT_TIER, "--log-dir", str(self.log_dir)]
+        if job.mode == "resume" and job.session_id:
+            cmd += ["--resume", job.session_id]
+        else:
+            cmd += ["--task-file", str(task_file)]
+        return cmd + self.runner_args
+
+    def start(self, job: job_queue.Job) -> None:
+        if not job.repo or not Path(job.repo).is_dir():
+            self.queue.update_job(job.id, status="failed", error=f"repo not found: {job.repo!r}", owner=self.owner)
+            return
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        task_file = self.log_dir / f"job-{job.id}.task.txt"
+        task_file.write_text(job.task, encoding="utf-8")
+        output_path = self.log_dir / f"job-{job.id}.out"
+        command = self.command_for(job, task_file)
+        try:
+            with output_path.open("wb") as out:
+                proc = subprocess.Popen(
+                    command,
+                    stdin=subprocess.DEVNULL,
+                    stdout=out,
+                    stderr=subprocess.STDOUT,
+                    start_new_session=True,
+                )
+        except OSError as exc:
+            error = f"could not start {command[0]}: {exc.strerror or exc}"
+            self.queue.update_job(job.id, status="failed", error=error, owner=self.owner)
+            print(f"job {job.id} failed: {error}", file=sys.stderr)
+            return
+        self.queue.update_job(job.id, result_path=str(output_path), owner=self.owner)
+        self.running[job.id] = RunningJob(job, proc, output_path, time.monotonic() + self.lease_seconds / 3)
+        print(f"job {job.id} started pid={proc.pid} repo={job.repo} tier={job.tier or job_queue.DEFAULT_TIER}", file=sys.stderr)
+
+    def finish(self, run: RunningJob, code: int) -> None:
+        values = parse_result_lines(run.output_path)
+        model = values.get("model_selected") or None
+        tokens_in, tokens_out, cost_usd = run_usage(values.get("summary_file"), model, self.prices)
+        if code == 0:
+            status = "cached" if values.get("cache_status") == "hit" else "completed"
+        else:
+            status = "failed"
+        self.queue.update_job(
+            run.job.id,
+            status=status,
+            exit_code=code,
+            run_id=values.get("codex_run_id") or None,
+            session_id=values.get("codex_session_id") or None,
+            log_path=values.get("log_file") or None,
+            meta_path=values.get("meta_file") or None,
+            summary_path=values.get("summary_file") or None,
+            cache_status=values.get("cache_status") or None,
+            owner=self.owner,
+            model=model,
+            tokens_in=tokens_in,
+            tokens_out=tokens_out,
+            cost_usd=cost_usd,
+        )
+        print(f"job {run.job.id} {status} exit={code}", file=sys.stderr)
+
+    def poll_children(self) -> None:
+        now = time.monotonic()
+        for job_id, run in list(self.running.items()):
+            code = run.proc.poll()
+            if code is not None:
+                del self.running[job_id]
+                self.finish(run, code)
+            elif now >= run.next_heartbeat:
+                if self.queue.heartbeat(job_id, self.owner, self.lease_seconds):
+                    run.next_heartbeat = now + self.lease_seconds / 3
+                else:
+                    print(f"job {job_id} lease lost; stopping pid={run.proc.pid}", file=sys.stderr)
+                    self.kill(run)
+                    del self.running[job_id]
+
+    def fill(self, budget: Optional[int] = None) -> int:
+        """Claim and start jobs until the concurrency limit, the budget or the queue runs out."""
+        started = 0
+        while not self.stopping and len(self.running) < self.concurrency and (budget is None or started < budget):
+            job = self.queue.claim(
+                self.owner, self.lease_seconds, exclusive_repos=True, tier_limits=self.tier_limits, policy=self.policy
+            )
+            if job is None:
+                break
+            self.start(job)
+            started += 1
+        return started
+
+    @staticmethod
+    def kill(run: RunningJob) -> None:
+        try:
+            os.killpg(run.proc.pid, signal.SIGTERM)
+            run.proc.wait(timeout=STOP_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            os.killpg(run.proc.pid, signal.SIGKILL)
+            run.proc.wait()
+        except ProcessLookupError:
+            run.proc.wait()
+
+    def shutdown(self) -> None:
+        for job_id, run in list(self.running.items()):
+            self.kill(run)
+            self.queue.release(job_id, self.owner, error="worker stopped")
+            del self.running[job_id]
+
+    def run(self, drain: bool = False, max_jobs: Optional[int] = None) -> int:
+        claimed = 0
+        try:
+            while not self.stopping:
+                self.poll_children()
+                claimed += self.fill(None if max_jobs is None else max_jobs - claimed)
+                if not self.running:
+                    if max_jobs is not None and claimed >= max_jobs:
+                        break
+                    if drain and self.queue.pending_count() == 0:
+                        break
+                time.sleep(self.poll_seconds)
+        finally:
+            # Also on an unexpected error, so running children are not orphaned under live leases.
+            self.shutdown()
+        return 0
+
+
+def parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Claim and execute queued Codex jobs.")
+    parser.add_argument("--db", default="runs/job_queue.sqlite3", help="Path to job queue database")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"Max runs at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--tier-limit", action="append", default=[], metavar="TIER=N", help="Max leased runs for a tier, across workers (repeatable)")
+    parser.add_argument("--policy", type=Path, help="Schedule policy JSON (weights, aging, spend budget)")
+    parser.add_argument("--models-file", type=Path, default=DEFAULT_MODELS_FILE, help="Model registry with cost_per_1k_* prices")
+    parser.add_argument("--lease-seconds", type=int, default=job_queue.DEFAULT_LEASE_SECONDS)
+    parser.add_argument("--poll-seconds", type=float, default=DEFAULT_POLL_SECONDS)
+    parser.add_argument("--log-dir", default="runs", help="Run logs and per-job output (default: runs)")
+    parser.add_argument("--runner", help="Path to run_codex_task.sh")
+    parser.add_argument("--reviewer", help="Path to invoke_codex_with_review.sh")
+    parser.add_argument("--runner-arg", action="append", default=[], help="Extra argument passed to every run (repeatable)")
+    parser.add_argument("--owner", help="Lease owner id (default: host:pid)")
+    parser.add_argument("--drain", action="store_true", help="Exit once nothing is pending or running")
+    parser.add_argument("--max-jobs", type=int, help="Exit after this many jobs have run")
+    return parser.parse_args(list(argv))
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    if args.concurrency < 1:
+        print("Error: --concurrency must be at least 1", file=sys.stderr)
+        return 2
+    try:
+        tier_limits = parse_tier_limits(args.tier_limit)
+        policy = job_queue.SchedulePolicy.load(args.policy) if args.policy else job_queue.DEFAULT_POLICY
+    except (OSError, ValueError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+
+    queue = job_queue.open_queue(Path(args.db))
+    worker = Worker(
+        queue,
+        runner=discover_script(args.runner, "run_codex_task.sh"),
+        reviewer=discover_script(args.reviewer, "invoke_codex_with_review.sh"),
+        log_dir=Path(args.log_dir),
+        concurrency=args.concurrency,
+        tier_limits=tier_limits,
+        lease_seconds=args.lease_seconds,
+        poll_seconds=args.poll_seconds,
+        owner=args.owner,
+        runner_args=args.runner_arg,
+        policy=policy,
+        prices=load_prices(args.models_file),
+    )
+
+    def stop(signum: int, _frame: object) -> None:
+        worker.stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        return worker.run(drain=args.drain, max_jobs=args.max_jobs)
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,6 +15,9 @@ import sys
 from pathlib import Path
 from typing import Any, Mapping
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "codex-job" / "scripts"))
+from summary_schema import coerce_int, cost, pick, token_usage  # noqa: E402
+
 
 def load_json(path: Path | None) -> Mapping[str, Any]:
     if path is None:
@@ -30,48 +33,17 @@ def load_json(path: Path | None) -> Mapping[str, Any]:
         return {}
 
 
-def coerce_int(value: Any) -> int | None:
-    if isinstance(value, bool):
-        return None
-    try:
-        return int(value)
-    except (TypeError, ValueError):
-        return None
-
-
-def _legacy(summary: Mapping[str, Any]) -> Mapping[str, Any]:
-    legacy = summary.get("legacy")
-    return legacy if isinstance(legacy, Mapping) else {}
-
-
-def _pick(summary: Mapping[str, Any], key: str, legacy_key: str | None = None) -> Any:
-    value = summary.get(key)
-    if value is not None:
-        return value
-    legacy = _legacy(summary)
-    if legacy_key:
-        return legacy.get(legacy_key)
-    return None
-
-
 def minify(summary: Mapping[str, Any]) -> dict[str, Any]:
-    legacy = _legacy(summary)
-    tok = summary.get("tok") if isinstance(summary.get("tok"), Mapping) else {}
-    token_usage = legacy.get("token_usage") if isinstance(legacy.get("token_usage"), Mapping) else {}
-    cost_short = summary.get("cost") if isinstance(summary.get("cost"), Mapping) else {}
-    cost_legacy = legacy.get("cost") if isinstance(legacy.get("cost"), Mapping) else {}
-
-    exit_code = coerce_int(_pick(summary, "exit", "exit_code"))
+    tok = token_usage(summary)
+    exit_code = coerce_int(pick(summary, "exit"))
 
     tokens_out = {
-        "in": coerce_int(tok.get("in")) if tok else coerce_int(token_usage.get("input_tokens")),
-        "out": coerce_int(tok.get("out")) if tok else coerce_int(token_usage.get("output_tokens")),
-        "total": coerce_int(tok.get("tot")) if tok else coerce_int(token_usage.get("total_tokens")),
+        "in": coerce_int(tok.get("in")),
+        "out": coerce_int(tok.get("out")),
+        "total": coerce_int(tok.get("tot")),
     }
 
-    ok = summary.get("ok")
-    if ok is None:
-        ok = legacy.get("success")
+    ok = pick(summary, "ok")
     if ok is None and exit_code is not None:
         ok = exit_code == 0
 
@@ -84,23 +56,23 @@ def minify(summary: Mapping[str, Any]) -> dict[str, Any]:
         msg = None
 
     return {
-        "id": _pick(summary, "id", "run_id"),
-        "sess": _pick(summary, "sid", "session_id"),
-        "repo": _pick(summary, "repo", "repo"),
-        "task": _pick(summary, "task", "task"),
-        "resume": _pick(summary, "resume", "resume_session"),
-        "start": _pick(summary, "start", "started_at"),
-        "end": _pick(summary, "end", "ended_at"),
-        "time": coerce_int(_pick(summary, "time", "elapsed_seconds")),
+        "id": pick(summary, "id"),
+        "sess": pick(summary, "sid"),
+        "repo": pick(summary, "repo"),
+        "task": pick(summary, "task"),
+        "resume": pick(summary, "resume"),
+        "start": pick(summary, "start"),
+        "end": pick(summary, "end"),
+        "time": coerce_int(pick(summary, "time")),
         "exit": exit_code,
         "ok": ok,
         "msg": msg,
-        "log": _pick(summary, "log", "log_file"),
-        "meta": _pick(summary, "meta", "meta_file"),
+        "log": pick(summary, "log"),
+        "meta": pick(summary, "meta"),
         "tokens": tokens_out,
-        "cost": cost_short.get("usd") if cost_short else cost_legacy.get("usd"),
+        "cost": cost(summary).get("usd"),
         # Carry over the original file location for traceability.
-        "source": _pick(summary, "meta", "meta_file") or _pick(summary, "log", "log_file"),
+        "source": pick(summary, "meta") or pick(summary, "log"),
     }
 
 
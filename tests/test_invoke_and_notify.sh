@@ -142,6 +142,7 @@ run_test_quote_safe_metadata_and_notify_events() {
       --repo "$repo" \
       --task 'Fix "quoted" task safely' \
       --codex-bin "$fake_codex" \
+      --log-dir "$tmp/runs" \
       --json-out "$summary" \
       --notify-cmd "cat >> $events" \
       > "$out"
@@ -171,7 +172,7 @@ run_test_invoke_environmental_failure_treated_success() {
 
   set +e
   FAKE_MODE=env_fail FAKE_COUNTER_FILE="$fake_counter" \
-    "$INVOKER" --repo "$repo" --task "do work" --codex-bin "$fake_codex" > "$out" 2>&1
+    "$INVOKER" --repo "$repo" --task "do work" --codex-bin "$fake_codex" --log-dir "$tmp/runs" > "$out" 2>&1
   local code=$?
   set -e
 
@@ -201,6 +202,7 @@ run_test_invoke_real_failure_triggers_review_and_events() {
       --repo "$repo" \
       --task "do work" \
       --codex-bin "$fake_codex" \
+      --log-dir "$tmp/runs" \
       --event-stream "$events" \
       > "$out" 2>&1
   local code=$?
@@ -232,13 +234,13 @@ run_test_invoke_summary_defaults() {
   make_fake_codex_sequence "$fake_codex" "$fake_counter"
 
   FAKE_MODE=success FAKE_COUNTER_FILE="$fake_counter" \
-    "$INVOKER" --repo "$repo" --task "default summary" --codex-bin "$fake_codex" > "$out_default" 2>&1
+    "$INVOKER" --repo "$repo" --task "default summary" --codex-bin "$fake_codex" --log-dir "$tmp/runs" > "$out_default" 2>&1
 
   rg -n '^summary_line=' "$out_default" >/dev/null || fail "expected summary_line in default invoke output"
 
   : > "$fake_counter"
   FAKE_MODE=success FAKE_COUNTER_FILE="$fake_counter" \
-    "$INVOKER" --repo "$repo" --task "no summary" --codex-bin "$fake_codex" --no-summarize > "$out_no" 2>&1
+    "$INVOKER" --repo "$repo" --task "no summary" --codex-bin "$fake_codex" --log-dir "$tmp/runs" --no-summarize > "$out_no" 2>&1
 
   if rg -n '^summary_line=' "$out_no" >/dev/null; then
     fail "did not expect summary_line when --no-summarize is set"
@@ -3,8 +3,8 @@ set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 ROOT_DIR="$(cd "$SCRIPT_DIR/.." && pwd)"
-QUEUE="$ROOT_DIR/codex-job/scripts/job_queue.py"
-SERVER="$ROOT_DIR/codex-job/scripts/job_queue_server.py"
+QUEUE="$ROOT_DIR/future-plans/queue/job_queue.py"
+SERVER="$ROOT_DIR/future-plans/queue/job_queue_server.py"
 
 fail() {
   echo "[FAIL] $*" >&2
@@ -105,6 +105,795 @@ PY
   pass "job_queue enqueue/update/list lifecycle"
 }
 
+run_test_queue_pooled_connections() {
+  local tmp db
+  tmp="$(mktemp -d)"
+  db="$tmp/job_queue.sqlite3"
+
+  # A database from before schema versioning (user_version 0, rollback journal).
+  python3 - "$db" <<'PY' || fail "could not create legacy database"
+import sqlite3, sys
+conn = sqlite3.connect(sys.argv[1])
+conn.execute("CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, task TEXT NOT NULL, status TEXT NOT NULL, repo TEXT, run_id TEXT, session_id TEXT, mode TEXT, tier TEXT, cache_status TEXT, created_at TEXT NOT NULL, started_at TEXT, completed_at TEXT, result_path TEXT, log_path TEXT, meta_path TEXT, summary_path TEXT, error TEXT)")
+conn.execute("INSERT INTO jobs (task, status, created_at) VALUES ('legacy', 'completed', '2026-01-01T00:00:00Z')")
+conn.commit()
+PY
+
+  python3 - "$QUEUE" "$db" <<'PY' || fail "pooled JobQueue checks failed"
+import pathlib, sys, threading
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue
+
+db = pathlib.Path(sys.argv[2])
+queue = job_queue.JobQueue(db)
+conn = queue.conn
+if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+    raise SystemExit("expected WAL journal mode")
+if conn.execute("PRAGMA synchronous").fetchone()[0] != 1:
+    raise SystemExit("expected synchronous=NORMAL")
+if conn.execute("PRAGMA busy_timeout").fetchone()[0] != job_queue.BUSY_TIMEOUT_MS:
+    raise SystemExit("expected busy_timeout to be set")
+if job_queue.schema_version(conn) != job_queue.SCHEMA_VERSION:
+    raise SystemExit("legacy database was not migrated")
+if queue.conn is not conn:
+    raise SystemExit("expected the same connection on repeated use in one thread")
+
+seen = set()
+errors = []
+gate = threading.Barrier(8)
+
+def writer(n):
+    try:
+        seen.add(id(queue.conn))
+        gate.wait()
+        for i in range(50):
+            job_id = queue.enqueue(f"t{n}-{i}", status="running")
+            queue.update_job(job_id, status="completed", exit_code=0)
+    except Exception as exc:
+        errors.append(repr(exc))
+
+threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+if errors:
+    raise SystemExit(f"writer errors: {errors[:3]}")
+if len(seen) != 8:
+    raise SystemExit(f"expected one connection per live thread, saw {len(seen)}")
+jobs = queue.fetch_jobs(1000)
+if len(jobs) != 401 or sum(j.status == "completed" for j in jobs) != 401:
+    raise SystemExit(f"unexpected job rows: {len(jobs)}")
+
+# Finished threads hand their connections back instead of opening new ones.
+opened = len(queue._conns)
+for _ in range(20):
+    t = threading.Thread(target=lambda: queue.fetch_jobs(1))
+    t.start()
+    t.join()
+if len(queue._conns) != opened:
+    raise SystemExit(f"connections not reused across threads: {opened} -> {len(queue._conns)}")
+queue.close()
+PY
+
+  # Concurrent CLI writers on one database must not hit "database is locked".
+  local pids=() pid n i
+  for n in 1 2 3 4 5 6; do
+    (for i in 1 2 3 4 5; do python3 "$QUEUE" --db "$db" enqueue --task "cli $n-$i" --status running >/dev/null || exit 1; done) &
+    pids+=("$!")
+  done
+  for pid in "${pids[@]}"; do
+    wait "$pid" || fail "concurrent CLI enqueue failed"
+  done
+  assert_eq "431" "$(python3 "$QUEUE" --db "$db" list --limit 1000 | python3 -c 'import json,sys; print(len(json.load(sys.stdin)["jobs"]))')" "job count after concurrent CLI writers"
+
+  rm -rf "$tmp"
+  pass "job_queue pooled WAL connections and schema migration"
+}
+
+run_test_queue_claim_lease() {
+  local tmp db n i pids=() pid
+  tmp="$(mktemp -d)"
+  db="$tmp/job_queue.sqlite3"
+
+  for i in $(seq 1 16); do
+    python3 "$QUEUE" --db "$db" enqueue --task "drain $i" >/dev/null || fail "enqueue $i failed"
+  done
+
+  # Several workers drain the queue concurrently; every job must run exactly once.
+  for n in 1 2 3 4; do
+    (
+      while :; do
+        out="$(python3 "$QUEUE" --db "$db" claim --owner "w$n" --lease-seconds 60)" || exit 1
+        id="$(printf '%s' "$out" | python3 -c 'import json,sys; j=json.load(sys.stdin)["job"]; print(j["id"] if j else "")')"
+        [[ -n "$id" ]] || break
+        echo "$id" >>"$tmp/claimed-$n.txt"
+        python3 "$QUEUE" --db "$db" update --id "$id" --status completed --exit-code 0 --owner "w$n" || exit 1
+      done
+    ) &
+    pids+=("$!")
+  done
+  for pid in "${pids[@]}"; do
+    wait "$pid" || fail "claim worker failed"
+  done
+  assert_eq "16" "$(cat "$tmp"/claimed-*.txt | wc -l | tr -d ' ')" "claimed job count"
+  assert_eq "16" "$(cat "$tmp"/claimed-*.txt | sort -u | wc -l | tr -d ' ')" "distinct claimed jobs"
+
+  set +e
+  python3 "$QUEUE" --db "$db" update --id 1 --status failed --owner someone-else
+  local rc=$?
+  python3 "$QUEUE" --db "$db" heartbeat --id 1 --owner w1
+  local hb_rc=$?
+  set -e
+  assert_eq "3" "$rc" "update by a non-owner exit code"
+  assert_eq "3" "$hb_rc" "heartbeat on a finished job exit code"
+
+  python3 - "$QUEUE" "$tmp/lease.sqlite3" <<'PY' || fail "lease expiry/backoff checks failed"
+import pathlib, sys
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue as jq
+
+q = jq.JobQueue(pathlib.Path(sys.argv[2]))
+job_id = q.enqueue("flaky", max_attempts=2)
+
+job = q.claim("a", lease_seconds=10, now=1000)
+assert job and job.id == job_id and job.status == "running" and job.attempts == 1, job
+assert job.lease_owner == "a" and job.lease_expires_at == 1010, job
+assert q.claim("b", now=1001) is None, "a leased job must not be claimed twice"
+assert not q.heartbeat(job_id, "b", 10, now=1005), "non-owner heartbeat must fail"
+assert q.heartbeat(job_id, "a", 10, now=1005)
+assert q.reap(now=1012) == {"pending": 0, "failed": 0}, "heartbeat should have extended the lease"
+
+# Owner a dies: the lease expires and the job is requeued with backoff.
+assert q.reap(now=1016) == {"pending": 1, "failed": 0}
+job = q.fetch_jobs()[0]
+assert job.status == "pending" and job.lease_owner is None and job.available_at == 1016 + jq.RETRY_BACKOFF_SECONDS, job
+assert "lease expired" in (job.error or ""), job.error
+assert q.claim("b", now=1020) is None, "job should wait out its backoff"
+assert not q.update_job(job_id, status="completed", owner="a"), "stale owner must not complete a requeued job"
+
+job = q.claim("b", lease_seconds=10, now=1016 + jq.RETRY_BACKOFF_SECONDS)
+assert job and job.attempts == 2 and job.lease_owner == "b", job
+# Out of attempts: an explicit release (or another expiry) fails the job for good.
+assert q.release(job_id, "b", error="boom") == "failed"
+job = q.fetch_jobs()[0]
+assert job.status == "failed" and job.error == "boom" and job.completed_at and job.lease_owner is None, job
+assert q.claim("c", now=10**10) is None
+
+retry_id = q.enqueue("retry me")
+assert q.claim("c", now=2000).id == retry_id
+assert q.release(retry_id, "c", now=2000) == "pending"
+assert q.release(retry_id, "c", now=2000) is None, "a released job has no owner"
+q.close()
+PY
+
+  rm -rf "$tmp"
+  pass "job_queue claim/heartbeat/release/reap leases"
+}
+
+run_test_queue_worker_daemon() {
+  local tmp db worker i
+  tmp="$(mktemp -d)"
+  db="$tmp/job_queue.sqlite3"
+  worker="$(dirname "$QUEUE")/job_worker.py"
+  mkdir -p "$tmp/repo-a" "$tmp/repo-b" "$tmp/repo-c" "$tmp/repo-d" "$tmp/state/running" "$tmp/state/repos"
+
+  # Fake runner: checks the per-repo mutex and records how many runs overlap.
+  cat >"$tmp/fake_runner.sh" <<'SH'
+#!/usr/bin/env bash
+set -euo pipefail
+state="$FAKE_STATE"
+repo="" tier="" task_file=""
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --repo) repo="$2"; shift 2 ;;
+    --tier) tier="$2"; shift 2 ;;
+    --task-file) task_file="$2"; shift 2 ;;
+    *) shift ;;
+  esac
+done
+name="$(basename "$repo")"
+mkdir "$state/repos/$name" 2>/dev/null || echo "repo $name" >>"$state/violations"
+touch "$state/running/$$-$tier"
+ls "$state/running" | wc -l >>"$state/overlap"
+ls "$state/running" | grep -c -- '-high$' >>"$state/overlap-high" || true
+sleep 0.3
+rm -f "$state/running/$$-$tier"
+rmdir "$state/repos/$name"
+task="$(cat "$task_file")"
+echo "codex_run_id=run-$$"
+echo "codex_session_id=sess-$$"
+echo "log_file=$state/run-$$.log"
+echo "summary_file=$state/run-$$.summary.json"
+echo "cache_status=miss"
+[[ "$task" != *fail* ]] || exit 7
+SH
+  chmod +x "$tmp/fake_runner.sh"
+
+  for i in 1 2 3; do
+    python3 "$QUEUE" --db "$db" enqueue --task "a$i" --repo "$tmp/repo-a" --tier low >/dev/null
+    python3 "$QUEUE" --db "$db" enqueue --task "b$i" --repo "$tmp/repo-b" --tier high >/dev/null
+    python3 "$QUEUE" --db "$db" enqueue --task "c$i" --repo "$tmp/repo-c" >/dev/null
+    python3 "$QUEUE" --db "$db" enqueue --task "d$i" --repo "$tmp/repo-d" --tier high >/dev/null
+  done
+  python3 "$QUEUE" --db "$db" enqueue --task "please fail" --repo "$tmp/repo-a" >/dev/null
+  python3 "$QUEUE" --db "$db" enqueue --task "no repo" --repo "$tmp/missing" >/dev/null
+
+  FAKE_STATE="$tmp/state" python3 "$worker" --db "$db" --runner "$tmp/fake_runner.sh" --log-dir "$tmp/runs" \
+    --concurrency 3 --tier-limit high=1 --poll-seconds 0.05 --drain 2>"$tmp/worker.err" \
+    || { cat "$tmp/worker.err" >&2; fail "worker exited non-zero"; }
+
+  [[ ! -s "$tmp/state/violations" ]] || fail "two runs shared a repo: $(cat "$tmp/state/violations")"
+  assert_eq "3" "$(sort -n "$tmp/state/overlap" | tail -n1)" "max concurrent runs"
+  assert_eq "1" "$(sort -n "$tmp/state/overlap-high" | tail -n1)" "max concurrent high-tier runs"
+
+  python3 - "$db" "$tmp" <<'PY' || fail "worker did not record results"
+import json, sqlite3, sys
+conn = sqlite3.connect(sys.argv[1])
+conn.row_factory = sqlite3.Row
+rows = {r["task"]: r for r in conn.execute("SELECT * FROM jobs")}
+for task, row in rows.items():
+    if task in ("please fail", "no repo"):
+        continue
+    assert row["status"] == "completed" and row["exit_code"] == 0 and row["error"] == "", dict(row)
+    assert row["run_id"].startswith("run-") and row["session_id"].startswith("sess-"), dict(row)
+    assert row["summary_path"].endswith(".summary.json") and row["log_path"].endswith(".log"), dict(row)
+    assert row["started_at"] and row["completed_at"] and row["lease_owner"] is None, dict(row)
+    assert row["result_path"] == f"{sys.argv[2]}/runs/job-{row['id']}.out", dict(row)
+failed = rows["please fail"]
+assert failed["status"] == "failed" and failed["exit_code"] == 7 and failed["error"] == "codex exited with 7", dict(failed)
+missing = rows["no repo"]
+assert missing["status"] == "failed" and "repo not found" in missing["error"], dict(missing)
+PY
+
+  rm -rf "$tmp"
+  pass "job_worker drains the queue within concurrency, repo and tier limits"
+}
+
+run_test_queue_worker_start_failure() {
+  local tmp db worker
+  tmp="$(mktemp -d)"
+  db="$tmp/job_queue.sqlite3"
+  worker="$(dirname "$QUEUE")/job_worker.py"
+  mkdir -p "$tmp/repo"
+
+  python3 "$QUEUE" --db "$db" enqueue --task "one" --repo "$tmp/repo" >/dev/null
+  python3 "$QUEUE" --db "$db" enqueue --task "two" --repo "$tmp/repo" >/dev/null
+  python3 "$worker" --db "$db" --runner /nonexistent/run.sh --log-dir "$tmp/runs" --poll-seconds 0.05 --drain 2>"$tmp/worker.err" \
+    || { cat "$tmp/worker.err" >&2; fail "worker died on a missing runner"; }
+  assert_eq "failed failed" "$(python3 "$QUEUE" --db "$db" list | python3 -c 'import json,sys; print(" ".join(j["status"] for j in json.load(sys.stdin)["jobs"]))')" "jobs with a missing runner"
+  [[ "$(python3 "$QUEUE" --db "$db" list)" == *'could not start /nonexistent/run.sh'* ]] || fail "missing runner error not recorded"
+
+  # An unexpected error in the loop still stops the children and releases their jobs.
+  python3 - "$QUEUE" "$tmp" <<'PY' || fail "worker did not release jobs after an error"
+import pathlib, sys, time
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue as jq
+import job_worker
+
+tmp = pathlib.Path(sys.argv[2])
+runner = tmp / "sleepy.sh"
+runner.write_text("#!/usr/bin/env bash\nsleep 30\n", encoding="utf-8")
+runner.chmod(0o755)
+q = jq.JobQueue(tmp / "crash.sqlite3")
+job_id = q.enqueue("sleep", repo=str(tmp / "repo"))
+worker = job_worker.Worker(q, runner, runner, tmp / "runs", poll_seconds=0.01)
+
+def broken_poll():
+    if worker.running:
+        raise RuntimeError("boom")
+
+worker.poll_children = broken_poll
+started = time.monotonic()
+try:
+    worker.run()
+    raise SystemExit("expected the error to propagate")
+except RuntimeError:
+    pass
+assert not worker.running and time.monotonic() - started < 10
+job = q.fetch_jobs()[0]
+assert job.id == job_id and job.status == "pending" and job.lease_owner is None and job.error == "worker stopped", job
+q.close()
+PY
+
+  rm -rf "$tmp"
+  pass "job_worker fails jobs whose runner cannot start and releases jobs on errors"
+}
+
+run_test_queue_priority_fair_share() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  python3 - "$QUEUE" "$tmp" <<'PY' || fail "priority/fair-share scheduling checks failed"
+import json, pathlib, sys
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue as jq
+import job_worker
+
+tmp = pathlib.Path(sys.argv[2])
+q = jq.JobQueue(tmp / "sched.sqlite3")
+now = jq.epoch_now()
+
+def drain(policy=jq.DEFAULT_POLICY, at=now):
+    job = q.claim("w", now=at, policy=policy)
+    return job.task if job else None
+
+# A batch in one repo must not starve a later job from another repo.
+batch = [q.enqueue(f"batch {i}", repo="/r/batch") for i in range(5)]
+q.enqueue("other repo", repo="/r/other", tier="high")
+assert drain() == "batch 0"
+assert drain() == "other repo", "fair share should pick the idle repo next"
+assert drain() == "batch 1"
+
+# Priority beats fair share and age.
+q.enqueue("urgent", repo="/r/batch", priority=5)
+assert drain() == "urgent"
+
+# Aging: a job waiting long enough overtakes a fresher higher-priority one.
+old = q.enqueue("old low", repo="/r/aging")
+q.enqueue("new p2", repo="/r/aging2", priority=2)
+q.conn.execute("UPDATE jobs SET created_at = ?, created_epoch = ? WHERE id = ?", (jq.epoch_to_iso(now - 600), now - 600, old))
+assert drain(jq.SchedulePolicy(aging_seconds=60)) == "old low"
+assert drain() == "new p2"
+
+# Weights: /r/batch has started 3 runs and /r/other 1, so unweighted the other repo is next;
+# with weight 4 the batch repo's share (3/4) is below the other's (1/1).
+q.enqueue("other again", repo="/r/other")
+assert drain(jq.SchedulePolicy.from_mapping({"repo_weights": {"/r/batch": 4}})) == "batch 2"
+assert drain() == "other again"
+
+# Budget: once spend in the window reaches the budget, high-tier jobs wait.
+q.conn.execute("UPDATE jobs SET status = 'completed', lease_owner = NULL WHERE status = 'running'")
+spender = q.enqueue("spender", repo="/r/cost", tier="high")
+q.conn.execute("UPDATE jobs SET status = 'cancelled' WHERE status = 'pending' AND id != ?", (spender,))
+assert drain() == "spender"
+q.update_job(spender, status="completed", exit_code=0, tokens_in=1000, tokens_out=500, cost_usd=5.0)
+assert q.spend(3600) == {"usd": 5.0, "tokens": 1500}
+plan = " ".join(row[3] for row in q.conn.execute("EXPLAIN QUERY PLAN " + jq.SPEND_SQL, (now - 3600,)))
+assert "idx_jobs_completed_epoch" in plan, f"spend window should use the epoch index: {plan}"
+budget = jq.SchedulePolicy(budget_usd=4.0, budget_window_seconds=3600)
+q.enqueue("expensive", repo="/r/cost", tier="high")
+assert drain(budget) is None, "high tier should be held back once the budget is spent"
+q.enqueue("cheap", repo="/r/cost2", tier="low")
+assert drain(budget) == "cheap"
+assert drain(jq.SchedulePolicy(budget_tokens=1000, budget_window_seconds=3600)) is None
+assert drain(budget, at=now + 7200) == "expensive", "spend should roll out of the window"
+
+try:
+    jq.SchedulePolicy.from_mapping({"repo_weight": {}})
+    raise SystemExit("unknown policy keys must be rejected")
+except ValueError:
+    pass
+q.close()
+
+# The worker prices runs from the model registry when the summary has no cost.
+summary = tmp / "run.summary.json"
+summary.write_text(json.dumps({"v": 2, "tok": {"in": 1234, "out": 56}}), encoding="utf-8")
+prices = job_worker.load_prices(job_worker.DEFAULT_MODELS_FILE)
+assert job_worker.run_usage(str(summary), "gpt-5.1-codex-mini", prices) == (1234, 56, 0.1458)
+summary.write_text(json.dumps({"v": 2, "tok": {"in": 10, "out": 1}, "cost": {"usd": 0.5}}), encoding="utf-8")
+assert job_worker.run_usage(str(summary), "gpt-5.1-codex-mini", prices) == (10, 1, 0.5)
+PY
+
+  rm -rf "$tmp"
+  pass "job_queue priority, aging, fair-share weights and spend budget"
+}
+
+run_test_queue_keyset_pagination() {
+  local tmp db page cursor ids
+  tmp="$(mktemp -d)"
+  db="$tmp/job_queue.sqlite3"
+
+  python3 - "$QUEUE" "$db" <<'PY' || fail "could not seed jobs"
+import pathlib, sys
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue as jq
+q = jq.JobQueue(pathlib.Path(sys.argv[2]))
+unset = dict.fromkeys(("run_id", "session_id", "mode", "cache_status", "started_at", "result_path",
+                       "log_path", "meta_path", "summary_path", "started_epoch"))
+with q.transaction() as conn:
+    for i in range(25):
+        # Pairs of jobs share a timestamp so the cursor has to break ties on id.
+        created = 1_700_000_000 + i // 2
+        conn.execute(jq.INSERT_JOB_SQL, {
+            **unset, "task": f"t{i}", "status": "failed" if i % 5 == 0 else "completed",
+            "repo": f"/r/{i % 2}", "tier": "high" if i % 3 == 0 else None,
+            "created_at": jq.epoch_to_iso(created), "created_epoch": created, "max_attempts": 3, "priority": 0,
+        })
+q.close()
+PY
+
+  # Walk every page through the CLI; pages must not overlap or skip rows.
+  ids=""
+  cursor=""
+  while :; do
+    page="$(python3 "$QUEUE" --db "$db" list --limit 4 ${cursor:+--cursor "$cursor"})"
+    ids+="$(printf '%s' "$page" | python3 -c 'import json,sys; print(" ".join(str(j["id"]) for j in json.load(sys.stdin)["jobs"]))') "
+    cursor="$(printf '%s' "$page" | python3 -c 'import json,sys; print(json.load(sys.stdin)["next_cursor"] or "")')"
+    [[ -n "$cursor" ]] || break
+  done
+  assert_eq "25 24 23 22 21 20 19 18 17 16 15 14 13 12 11 10 9 8 7 6 5 4 3 2 1" "$(echo $ids)" "paged job ids"
+
+  assert_eq "21 16 11 6 1" "$(python3 "$QUEUE" --db "$db" list --status failed | python3 -c 'import json,sys; print(" ".join(str(j["id"]) for j in json.load(sys.stdin)["jobs"]))')" "status filter"
+  assert_eq "25 19 13 7 1" "$(python3 "$QUEUE" --db "$db" list --repo /r/0 --tier high | python3 -c 'import json,sys; print(" ".join(str(j["id"]) for j in json.load(sys.stdin)["jobs"]))')" "repo+tier filter"
+  assert_eq "6 5 4 3" "$(python3 "$QUEUE" --db "$db" list --since 2023-11-14T22:13:21Z --until 2023-11-14T22:13:23Z | python3 -c 'import json,sys; print(" ".join(str(j["id"]) for j in json.load(sys.stdin)["jobs"]))')" "time range filter"
+  set +e
+  python3 "$QUEUE" --db "$db" list --cursor not-a-cursor >/dev/null 2>&1
+  local rc=$?
+  set -e
+  assert_eq "2" "$rc" "invalid cursor exit code"
+
+  python3 - "$QUEUE" "$SERVER" "$db" <<'PY' || fail "query plan or /api/jobs pagination check failed"
+import json, pathlib, sys, threading, urllib.error, urllib.request
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue as jq
+import job_queue_server
+
+q = jq.JobQueue(pathlib.Path(sys.argv[3]))
+cursor = jq.encode_cursor("2023-11-14T22:13:25Z", 12)
+for filters in (jq.JobFilter(), jq.JobFilter(statuses=("failed",)), jq.JobFilter(repo="/r/1")):
+    for cur in (None, cursor):
+        sql, params = jq.list_jobs_query(filters, cur, 10)
+        plan = " ".join(row[3] for row in q.conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        if "TEMP B-TREE" in plan or "idx_jobs_" not in plan:
+            raise SystemExit(f"list query is not served by a sort index: {filters} cursor={cur}: {plan}")
+q.close()
+
+job_queue_server.QueueHandler.log_message = lambda *args: None
+server = job_queue_server.QueueHTTPServer("127.0.0.1", 0, pathlib.Path(sys.argv[3]), "", 200)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base = f"http://127.0.0.1:{server.server_address[1]}/api/jobs"
+seen, url = [], base + "?limit=10&status=completed"
+while url:
+    data = json.load(urllib.request.urlopen(url))
+    seen += [j["id"] for j in data["jobs"]]
+    url = base + f"?limit=10&status=completed&cursor={data['next_cursor']}" if data["next_cursor"] else None
+if seen != [j for j in range(25, 0, -1) if (j - 1) % 5]:
+    raise SystemExit(f"unexpected /api/jobs pages: {seen}")
+try:
+    urllib.request.urlopen(base + "?cursor=bogus")
+    raise SystemExit("expected 400 for a bad cursor")
+except urllib.error.HTTPError as exc:
+    if exc.code != 400:
+        raise
+server.shutdown()
+server.server_close()
+PY
+
+  rm -rf "$tmp"
+  pass "job_queue keyset pagination, filters and indexed list queries"
+}
+
+run_test_queue_epoch_columns() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  python3 - "$QUEUE" "$tmp" <<'PY' || fail "epoch column migration or write-time durations failed"
+import pathlib, sqlite3, sys
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue as jq
+
+# A schema v5 database with ISO-only timestamps is backfilled by the migration.
+db = pathlib.Path(sys.argv[2]) / "old.sqlite3"
+conn = sqlite3.connect(db, isolation_level=None)
+for migrate in jq.MIGRATIONS[:5]:
+    migrate(conn)
+conn.execute("PRAGMA user_version = 5")
+conn.execute(
+    "INSERT INTO jobs (task, status, created_at, started_at, completed_at) VALUES (?, ?, ?, ?, ?)",
+    ("old", "completed", "2024-01-01T00:00:00Z", "2024-01-01T00:00:30Z", "2024-01-01T00:02:00Z"),
+)
+conn.execute("INSERT INTO jobs (task, status, created_at) VALUES ('queued', 'pending', '2024-01-01T00:05:00Z')")
+conn.close()
+
+q = jq.JobQueue(db)
+old, queued = sorted(q.fetch_jobs(), key=lambda j: j.id)
+assert (old.created_epoch, old.started_epoch, old.completed_epoch) == (1704067200, 1704067230, 1704067320), old
+assert (old.queue_wait_seconds, old.elapsed_seconds) == (30, 90), old
+assert queued.started_epoch is None and queued.elapsed_seconds is None and queued.queue_wait_seconds is None, queued
+
+# Writes fill the epochs and durations in the same statement as the ISO text.
+now = jq.epoch_now()
+job_id = q.enqueue("new", repo="/r/new")
+claimed = q.claim("w", now=now + 40)
+assert claimed.id == queued.id
+q.update_job(claimed.id, status="completed", exit_code=0)
+claimed = q.claim("w", now=now + 40)
+assert claimed.id == job_id and claimed.queue_wait_seconds == 40 and claimed.started_epoch == now + 40, claimed
+q.update_job(job_id, status="completed", exit_code=0, completed_at=jq.epoch_to_iso(now + 100))
+done = next(j for j in q.fetch_jobs() if j.id == job_id)
+assert (done.completed_epoch, done.elapsed_seconds, done.queue_wait_seconds) == (now + 100, 60, 40), done
+direct = q.enqueue("direct", status="running", started_at=jq.epoch_to_iso(now - 5))
+direct = next(j for j in q.fetch_jobs() if j.id == direct)
+assert direct.started_epoch == now - 5 and direct.queue_wait_seconds == direct.started_epoch - direct.created_epoch, direct
+
+# Listing reads stored values; it must not parse timestamps.
+jq.datetime = None
+assert len(q.fetch_jobs()) == 4
+q.close()
+PY
+
+  rm -rf "$tmp"
+  pass "job_queue epoch columns are backfilled and written with durations"
+}
+
+run_test_queue_batch_commands() {
+  local tmp db out rc
+  tmp="$(mktemp -d)"
+  db="$tmp/job_queue.sqlite3"
+
+  {
+    echo '{"task": "one", "repo": "/r/a", "priority": 2}'
+    echo '{"task": "two", "status": "running", "tier": "high"}'
+    echo 'not json'
+    echo ''
+    echo '{"task": "three", "colour": "blue"}'
+    echo '{"repo": "/r/a"}'
+    echo '{"task": "four", "priority": "high"}'
+    echo '[1, 2]'
+    echo '{"task": "five"}'
+  } >"$tmp/enqueue.jsonl"
+  set +e
+  out="$(python3 "$QUEUE" --db "$db" enqueue-batch --file "$tmp/enqueue.jsonl" --chunk-size 2)"
+  rc=$?
+  set -e
+  assert_eq "1" "$rc" "enqueue-batch exit code with rejected lines"
+  assert_eq "1:1 2:2 9:3|3 5 6 7 8" "$(printf '%s' "$out" | python3 -c '
+import json, sys
+data = json.load(sys.stdin)
+print(" ".join("%d:%d" % (j["line"], j["id"]) for j in data["jobs"]) + "|" + " ".join(str(e["line"]) for e in data["errors"]))
+')" "enqueue-batch line results"
+
+  python3 "$QUEUE" --db "$db" claim --owner w1 >/dev/null
+  printf '%s\n' \
+    '{"id": 1, "status": "completed", "exit_code": 0, "owner": "w1", "tokens_in": 10}' \
+    '{"id": 1, "error": "late", "owner": "w1"}' \
+    '{"id": 2, "status": "failed", "exit_code": 4}' \
+    '{"id": 42, "status": "failed"}' \
+    '{"id": 3}' \
+    '{"id": 3, "model": "m", "cost_usd": 0.25}' \
+    | python3 "$QUEUE" --db "$db" update-batch >"$tmp/update.json" && fail "update-batch should report rejected lines"
+  assert_eq "1 3 6|2 4 5" "$(python3 -c '
+import json, sys
+data = json.load(open(sys.argv[1]))
+print(" ".join(str(j["line"]) for j in data["jobs"]) + "|" + " ".join(str(e["line"]) for e in data["errors"]))
+' "$tmp/update.json")" "update-batch line results"
+
+  python3 - "$db" <<'PY' || fail "batch updates were not applied"
+import sqlite3, sys
+conn = sqlite3.connect(sys.argv[1])
+rows = {r[0]: r[1:] for r in conn.execute("SELECT id, status, exit_code, error, lease_owner, tokens_in, model, cost_usd FROM jobs")}
+assert rows[1] == ("completed", 0, "", None, 10, None, None), rows[1]
+assert rows[2] == ("failed", 4, "codex exited with 4", None, None, None, None), rows[2]
+assert rows[3] == ("pending", None, None, None, None, "m", 0.25), rows[3]
+PY
+
+  python3 -c 'import json; [print(json.dumps({"task": f"bulk {i}", "repo": "/r/bulk"})) for i in range(500)]' \
+    | python3 "$QUEUE" --db "$db" enqueue-batch >"$tmp/bulk.json" || fail "bulk enqueue-batch failed"
+  assert_eq "500" "$(python3 -c 'import json,sys; print(json.load(open(sys.argv[1]))["applied"])' "$tmp/bulk.json")" "bulk applied count"
+
+  rm -rf "$tmp"
+  pass "job_queue enqueue-batch/update-batch apply JSONL in chunks with per-line errors"
+}
+
+run_test_queue_retention_archive() {
+  local tmp db out
+  tmp="$(mktemp -d)"
+  db="$tmp/job_queue.sqlite3"
+
+  python3 - "$QUEUE" "$db" <<'PY' || fail "could not seed jobs for archival"
+import pathlib, sys
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue as jq
+q = jq.JobQueue(pathlib.Path(sys.argv[2]))
+now = jq.epoch_now()
+records = []
+for i in range(60):
+    status = "pending" if i % 10 == 0 else "completed"
+    records.append((i, {"task": f"job {i} " + "x" * 4000, "status": "running" if status == "completed" else status}))
+q.enqueue_many(records)
+for i in range(1, 61):
+    if (i - 1) % 10:
+        age_days = 40 if i <= 40 else 1
+        q.update_job(i, status="failed" if i % 7 == 0 else "completed", completed_at=jq.epoch_to_iso(now - age_days * 86400))
+q.close()
+PY
+
+  out="$(python3 "$QUEUE" --db "$db" archive --older-than-days 30 --export "$tmp/export.jsonl.gz" --chunk-size 7)"
+  assert_eq "36 36" "$(printf '%s' "$out" | python3 -c 'import json,sys; d=json.load(sys.stdin); print(d["archived"], d["exported"])')" "archived/exported rows"
+  printf '%s' "$out" | python3 -c 'import json,sys; assert json.load(sys.stdin)["pages_freed"] > 0' || fail "archive did not release pages"
+  assert_eq "36" "$(python3 -c 'import gzip,json,sys; print(sum(1 for l in gzip.open(sys.argv[1], "rt") if json.loads(l)["status"] in ("completed", "failed")))' "$tmp/export.jsonl.gz")" "exported JSONL rows"
+  out="$(python3 "$QUEUE" --db "$db" stats)"
+  assert_eq "24 36 incremental" "$(printf '%s' "$out" | python3 -c 'import json,sys; d=json.load(sys.stdin); print(d["rows"]["hot"], d["rows"]["archived"], d["pages"]["auto_vacuum"])')" "hot/archived counts after archive"
+
+  python3 - "$QUEUE" "$db" "$tmp" <<'PY' || fail "archive file, idempotence or compact checks failed"
+import pathlib, sqlite3, sys
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue as jq
+tmp = pathlib.Path(sys.argv[3])
+q = jq.JobQueue(pathlib.Path(sys.argv[2]))
+row = q.conn.execute("SELECT * FROM jobs_archive WHERE id = 7").fetchone()
+assert row["status"] == "failed" and row["task"].startswith("job 6 ") and row["archived_epoch"], dict(row)
+assert q.archive(30).archived == 0, "a second run should find nothing to move"
+
+# A separate archive file; the rows are gone from the hot table and jobs_archive stays as it was.
+result = q.archive(0, archive_db=tmp / "archive.sqlite3")
+assert result.archived == 18, result
+stats = q.storage_stats(tmp / "archive.sqlite3")
+assert stats["rows"] == {"hot": 6, "archived": 36, "archived_file": 18}, stats
+assert q.fetch_jobs() and all(j.status == "pending" for j in q.fetch_jobs())
+q.close()
+
+# compact converts a database created before incremental auto-vacuum.
+legacy = tmp / "legacy.sqlite3"
+conn = sqlite3.connect(legacy)
+jq._migrate_v1(conn)
+conn.commit()
+conn.close()
+q = jq.JobQueue(legacy)
+assert q.storage_stats()["pages"]["auto_vacuum"] == "none"
+assert q.compact()["auto_vacuum"] == "incremental"
+q.close()
+PY
+
+  rm -rf "$tmp"
+  pass "job_queue archives finished jobs, exports JSONL and vacuums incrementally"
+}
+
+run_test_queue_stats() {
+  local tmp db out
+  tmp="$(mktemp -d)"
+  db="$tmp/job_queue.sqlite3"
+
+  python3 - "$QUEUE" "$db" <<'PY' || fail "could not seed jobs for stats"
+import pathlib, sys
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue as jq
+q = jq.JobQueue(pathlib.Path(sys.argv[2]))
+statuses = ["completed"] * 70 + ["failed"] * 20 + ["running"] * 10
+q.enqueue_many((i, {"task": f"t{i}", "status": status, "repo": f"/r/{i % 3}" if i % 4 else None, "tier": "high" if i % 5 == 0 else None})
+               for i, status in enumerate(statuses, 1))
+q.enqueue("waiting", repo="/r/0")
+# Job i waited i seconds; finished jobs ran 10 * i seconds.
+q.conn.execute("UPDATE jobs SET queue_wait_seconds = id, elapsed_seconds = CASE WHEN status != 'running' THEN 10 * id END WHERE id <= 100")
+q.close()
+PY
+
+  out="$(python3 "$QUEUE" --db "$db" stats)"
+  python3 - "$out" <<'PY' || fail "stats aggregates are wrong"
+import json, sys
+d = json.loads(sys.argv[1])
+assert d["total"] == 101, d
+assert d["by_status"] == {"completed": 70, "failed": 20, "running": 10, "pending": 1}, d["by_status"]
+assert d["by_repo"] == {"": 25, "/r/0": 26, "/r/1": 25, "/r/2": 25}, d["by_repo"]
+assert d["by_tier"] == {"high": 20, "low": 81}, d["by_tier"]
+assert d["queue_wait_seconds"] == {"count": 100, "p50": 50, "p95": 95, "p99": 99}, d["queue_wait_seconds"]
+assert d["run_seconds"] == {"count": 90, "p50": 450, "p95": 860, "p99": 900}, d["run_seconds"]
+assert d["rows"]["hot"] == 101 and d["pages"]["page_count"] > 0, d
+PY
+
+  python3 - "$QUEUE" "$SERVER" "$db" <<'PY' || fail "/api/stats check failed"
+import json, pathlib, sys, threading, urllib.request
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue as jq
+import job_queue_server
+
+db = pathlib.Path(sys.argv[3])
+q = jq.JobQueue(db)
+plan = " ".join(row[3] for row in q.conn.execute("EXPLAIN QUERY PLAN " + jq.JOB_STATS_SQL))
+assert "idx_jobs_queue_wait" in plan and "idx_jobs_elapsed" in plan, plan
+
+server = job_queue_server.QueueHTTPServer("127.0.0.1", 0, db, "", 200, stats_ttl=60)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+url = f"http://127.0.0.1:{server.server_address[1]}/api/stats"
+first = json.load(urllib.request.urlopen(url))
+assert first["total"] == 101 and first["by_status"]["pending"] == 1 and first["db_path"] == str(db), first
+q.enqueue("late")
+assert json.load(urllib.request.urlopen(url)) == first, "stats should be served from the cache within the TTL"
+server.stats_ttl = 0
+server._stats_cache = (0.0, {})
+assert json.load(urllib.request.urlopen(url))["total"] == 102
+server.shutdown()
+server.server_close()
+q.close()
+PY
+
+  rm -rf "$tmp"
+  pass "job_queue stats and /api/stats aggregate the whole table with percentiles"
+}
+
+run_test_queue_change_events() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  python3 - "$QUEUE" "$SERVER" "$tmp/job_queue.sqlite3" <<'PY' || fail "change feed / SSE checks failed"
+import json, pathlib, sys, threading, time, urllib.request
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import job_queue as jq
+import job_queue_server
+
+db = pathlib.Path(sys.argv[3])
+q = jq.JobQueue(db)
+first = q.enqueue("first")
+untouched = q.enqueue("untouched")
+
+# Triggers stamp inserts and updates, whoever writes them.
+assert [j.id for j in q.changes_since(0)] == [first, untouched]
+q.conn.execute("UPDATE jobs SET priority = 1 WHERE id = ?", (first,))
+assert [j.id for j in q.changes_since(2)] == [first] and q.change_seq() == 3
+
+server = job_queue_server.QueueHTTPServer("127.0.0.1", 0, db, "", 200, stats_ttl=60, watch_seconds=0.02)
+stats_calls = []
+job_stats = server.queue.job_stats
+
+def slow_job_stats():
+    stats_calls.append(time.monotonic())
+    time.sleep(1.5)
+    return job_stats()
+
+server.queue.job_stats = slow_job_stats
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base = f"http://127.0.0.1:{server.server_address[1]}"
+page = json.load(urllib.request.urlopen(base + "/api/jobs"))
+assert page["change_seq"] == 3, page["change_seq"]
+
+def read_event(stream):
+    event = {}
+    for raw in stream:
+        line = raw.decode("utf-8").rstrip("\n")
+        if not line:
+            if "data" in event:
+                return event
+            continue
+        key, _, value = line.partition(": ")
+        event[key] = value
+    raise SystemExit("stream closed")
+
+stream = urllib.request.urlopen(base + f"/api/events?since={page['change_seq']}", timeout=10)
+started = time.monotonic()
+added = q.enqueue("added")
+time.sleep(0.1)
+q.update_job(first, status="failed", exit_code=2)
+seen, last_id, stats = {}, None, None
+while set(seen) != {added, first}:
+    event = read_event(stream)
+    data = json.loads(event["data"])
+    if event["event"] == "stats":
+        stats = data
+        continue
+    assert event["event"] == "jobs", event
+    seen.update((j["id"], j) for j in data["jobs"])
+    last_id = event["id"]
+# A slow aggregate is refreshed off the watcher thread, so it never holds up row deltas.
+latency = time.monotonic() - started
+assert latency < 1.0, f"changes took {latency:.2f}s to arrive"
+assert untouched not in seen and seen[first]["status"] == "failed", seen
+# Stats arrive on their own event, refreshed once for both commits within the TTL.
+while stats is None:
+    event = read_event(stream)
+    if event["event"] == "stats":
+        stats = json.loads(event["data"])
+assert stats["by_status"] == {"failed": 1, "pending": 2}, stats
+assert len(stats_calls) == 1, stats_calls
+stream.close()
+
+# Reconnecting with Last-Event-ID resumes after the last delivered change.
+q.update_job(untouched, error="note")
+request = urllib.request.Request(base + "/api/events", headers={"Last-Event-ID": last_id})
+with urllib.request.urlopen(request, timeout=10) as resumed:
+    event = read_event(resumed)
+    while event["event"] != "jobs":
+        event = read_event(resumed)
+assert [j["id"] for j in json.loads(event["data"])["jobs"]] == [untouched], event
+server.shutdown()
+server.server_close()
+q.close()
+PY
+
+  rm -rf "$tmp"
+  pass "job_queue_server streams only changed rows over /api/events"
+}
+
 run_test_server_help_and_fallback() {
   local help_text
   help_text="$(python3 "$SERVER" --help)"
@@ -139,5 +928,16 @@ PY
 }
 
 run_test_queue_lifecycle
+run_test_queue_pooled_connections
+run_test_queue_claim_lease
+run_test_queue_worker_daemon
+run_test_queue_worker_start_failure
+run_test_queue_priority_fair_share
+run_test_queue_keyset_pagination
+run_test_queue_epoch_columns
+run_test_queue_batch_commands
+run_test_queue_retention_archive
+run_test_queue_stats
+run_test_queue_change_events
 run_test_server_help_and_fallback
 pass "all job queue tool tests"
@@ -30,12 +30,15 @@ assert_eq() {
 json_get() {
   local file="$1"
   local keypath="$2"
-  python3 - "$file" "$keypath" <<'PY'
+  python3 - "$file" "$keypath" "$ROOT_DIR/codex-job/scripts" <<'PY'
 import json
 import sys
 
 file_path = sys.argv[1]
 keypath = sys.argv[2].split('.')
+sys.path.insert(0, sys.argv[3])
+from summary_schema import legacy_view
+
 with open(file_path, 'r', encoding='utf-8') as f:
     data = json.load(f)
 
@@ -49,10 +52,9 @@ def traverse(obj, keys):
 try:
     value = traverse(data, keypath)
 except Exception:
-    if "legacy" in data:
-        value = traverse(data["legacy"], keypath)
-    else:
-        raise
+    # v2 summaries have no stored legacy block; read verbose keys through the derived view.
+    legacy_keys = keypath[1:] if keypath[0] == "legacy" else keypath
+    value = traverse(legacy_view(data), legacy_keys)
 
 if isinstance(value, bool):
     print(str(value).lower())
@@ -308,6 +310,179 @@ EOF
   pass "tokens used format parsed as total"
 }
 
+run_test_last_match_wins() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local log="$tmp/last-match.log"
+  local summary="$tmp/last-match.summary.json"
+
+  cat <<'EOF' > "$log"
+input_tokens: 10
+Output_Tokens = 2
+cost: 0.50
+the fix costs $9 and uses many tokens
+INPUT_TOKENS: 1,500
+"completion_tokens": 40
+output_tokens: 300
+tokens used
+9,999
+  Total cost: $1.25
+EOF
+
+  python3 "$ROOT_DIR/codex-job/scripts/parse_codex_run.py" --log "$log" > "$summary"
+
+  assert_eq "1500" "$(json_get "$summary" tok.in)" "last input match"
+  assert_eq "1,500" "$(json_get "$summary" tok.ev.in.raw)" "input evidence raw"
+  assert_eq "300" "$(json_get "$summary" tok.out)" "highest-priority output pattern"
+  assert_eq "9999" "$(json_get "$summary" tok.tot)" "tokens used across lines"
+  assert_eq "1.25" "$(json_get "$summary" cost.usd)" "last cost line"
+  assert_eq "Total cost: \$1.25" "$(json_get "$summary" cost.ev)" "cost evidence"
+
+  rm -rf "$tmp"
+  pass "last match wins per pattern priority"
+}
+
+run_test_large_log_tail_scan() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local log="$tmp/large.log"
+  local summary="$tmp/large.summary.json"
+
+  python3 - "$log" <<'PY'
+import sys
+
+filler = "codex output line that mentions nothing of interest\n" * 40000
+with open(sys.argv[1], "w", encoding="utf-8") as f:
+    f.write(filler)
+    f.write("input_tokens: 900\noutput_tokens: 30\ntokens used\n930\n")
+    f.write(filler)
+    f.write("input_tokens: 1,200\noutput_tokens: 34\ntokens used\n1,234\nestimated_cost_usd: 0.05\n")
+    f.write("codex_exit_code=0\n")
+PY
+
+  python3 "$ROOT_DIR/codex-job/scripts/parse_codex_run.py" --log "$log" > "$summary"
+
+  assert_eq "1200" "$(json_get "$summary" tok.in)" "large log tok.in"
+  assert_eq "34" "$(json_get "$summary" tok.out)" "large log tok.out"
+  assert_eq "1234" "$(json_get "$summary" tok.tot)" "large log tok.tot"
+  assert_eq "0.05" "$(json_get "$summary" cost.usd)" "large log cost.usd"
+
+  # Nothing before the tail can match a higher-priority total pattern, so one chunk is decoded.
+  python3 - "$ROOT_DIR/codex-job/scripts" "$log" <<'PY' || fail "tail scan decoded more than the last chunk"
+import pathlib, sys
+sys.path.insert(0, sys.argv[1])
+import parse_codex_run as p
+
+scanned = []
+scan_text = p.scan_text
+p.scan_text = lambda text, *args, **kwargs: scanned.append(len(text)) or scan_text(text, *args, **kwargs)
+hits, cost = p.scan_log_tail(pathlib.Path(sys.argv[2]))
+assert len(scanned) == 1, scanned
+assert p.resolve_token_usage(hits)["total_tokens"] == 1234 and cost["usd"] == 0.05
+PY
+
+  # Tail and whole-file scans agree, including when an early line outranks the tail.
+  python3 - "$ROOT_DIR/codex-job/scripts" "$tmp" <<'PY' || fail "tail scan disagrees with the whole-file scan"
+import pathlib, random, sys
+sys.path.insert(0, sys.argv[1])
+import parse_codex_run as p
+
+lines = [
+    "prompt_tokens: {n}", "completion_tokens: {n}", "total tokens: {n}", "tokens used\n{n}",
+    '"input_tokens": {n},', "in = {n} tok out = {n} tok", "cost: ${f}", "usd = {f}",
+    "İnput_tokens: {n}", "toKens used {n}", "input tokens: {n}", "café �",
+]
+filler = "codex output line that mentions nothing of interest\n" * 800
+rng = random.Random(7)
+path = pathlib.Path(sys.argv[2]) / "diff.log"
+for trial in range(80):
+    parts = []
+    for _ in range(rng.randint(1, 6)):
+        parts.append(rng.choice(lines).format(n=f"{rng.randint(0, 99999):,}", f=round(rng.random(), 3)) + "\n")
+        parts.append(filler * rng.randint(0, 2))
+    path.write_text("".join(parts), encoding="utf-8")
+    text = path.read_text(encoding="utf-8", errors="replace")
+    chunk = rng.choice([4096, 65536, p.TAIL_CHUNK_BYTES])
+    hits, cost = p.scan_log_tail(path, chunk_bytes=chunk, overlap_bytes=min(chunk, p.TAIL_OVERLAP_BYTES))
+    assert p.resolve_token_usage(hits) == p.extract_token_usage(text), (trial, chunk)
+    assert cost == p.extract_cost(text), (trial, chunk)
+PY
+
+  # An early line for a higher-priority pattern still wins, so the reader walks back for it.
+  python3 - "$log" <<'PY'
+import pathlib, sys
+
+log = pathlib.Path(sys.argv[1])
+log.write_text("prompt_tokens: 7\ntotal tokens: 15\ncost: 9.99\n" + log.read_text(encoding="utf-8"), encoding="utf-8")
+PY
+  python3 "$ROOT_DIR/codex-job/scripts/parse_codex_run.py" --log "$log" > "$summary"
+  assert_eq "1200" "$(json_get "$summary" tok.in)" "outranked log tok.in"
+  assert_eq "15" "$(json_get "$summary" tok.tot)" "outranked log tok.tot"
+  assert_eq "0.05" "$(json_get "$summary" cost.usd)" "outranked log cost.usd"
+
+  # Without any usage lines near the end the reader walks back to the start of the file.
+  sed -i -E -e '/^(input_tokens|output_tokens|tokens used|estimated_cost_usd)|^[0-9,]+$/d' "$log"
+  python3 "$ROOT_DIR/codex-job/scripts/parse_codex_run.py" --log "$log" > "$summary"
+  assert_eq "7" "$(json_get "$summary" tok.in)" "full scan fallback tok.in"
+  assert_eq "15" "$(json_get "$summary" tok.tot)" "full scan fallback tok.tot"
+  assert_eq "9.99" "$(json_get "$summary" cost.usd)" "full scan fallback cost.usd"
+
+  : > "$log"
+  python3 "$ROOT_DIR/codex-job/scripts/parse_codex_run.py" --log "$log" > "$summary"
+  assert_eq "true" "$(json_get "$summary" legacy.token_usage.extraction_incomplete)" "empty log incomplete"
+
+  rm -rf "$tmp"
+  pass "large log parsed from the tail, matching the whole-file scan"
+}
+
+run_test_summary_v2_migrate() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local summary="$tmp/v2.summary.json"
+  local schema="$ROOT_DIR/codex-job/scripts/summary_schema.py"
+
+  mkdir -p "$repo" "$log_dir"
+  make_fake_codex "$fake_codex"
+
+  CODEX_PROGRESS_INTERVAL=0 "$RUNNER" --repo "$repo" --task "Schema task" --codex-bin "$fake_codex" \
+    --log-dir "$log_dir" --json-out "$summary" --no-cache > /dev/null
+
+  assert_eq "2" "$(json_get "$summary" v)" "summary version"
+  python3 - "$summary" <<'PY' || fail "v2 summary still embeds a legacy block"
+import json
+import sys
+
+with open(sys.argv[1], encoding="utf-8") as f:
+    assert "legacy" not in json.load(f)
+PY
+  assert_eq "Schema task" "$(json_get "$summary" legacy.task)" "derived legacy task"
+  assert_eq "1290" "$(json_get "$summary" legacy.token_usage.total_tokens)" "derived legacy total"
+
+  cat > "$log_dir/codex-run-old.summary.json" <<'JSON'
+{"id":"run-old","sid":null,"exit":0,"ok":true,"tok":null,"cost":null,"legacy":{"run_id":"run-old","session_id":"sess-old","task":"Old task","exit_code":0,"success":true,"token_usage":{"input_tokens":10,"output_tokens":5,"total_tokens":15,"evidence":{"input_tokens":{"pattern":"p","raw":"10"}}},"cost":{"usd":0.25,"evidence":"cost: 0.25"}}}
+JSON
+  python3 "$schema" migrate "$log_dir" 2> "$tmp/migrate.err"
+  rg -n 'summaries_migrated=1 current=1 invalid=0' "$tmp/migrate.err" >/dev/null || fail "unexpected migrate report"
+
+  local old="$log_dir/codex-run-old.summary.json"
+  assert_eq "2" "$(json_get "$old" v)" "migrated version"
+  assert_eq "sess-old" "$(json_get "$old" sid)" "migrated sid"
+  assert_eq "15" "$(json_get "$old" tok.tot)" "migrated tok.tot"
+  assert_eq "p" "$(json_get "$old" tok.ev.in.pat)" "migrated evidence"
+  assert_eq "0.25" "$(json_get "$old" cost.usd)" "migrated cost"
+  assert_eq "OK id=run-old exit=0 time=- tok=15 cost=0.25 sid=sess-old task=\"Old task\"" \
+    "$("$ROOT_DIR/codex-job/scripts/summarize_codex_run.py" --summary "$old")" "migrated one-line summary"
+
+  rm -rf "$tmp"
+  pass "v2 summary without legacy block, derived legacy view, and migration"
+}
+
 run_test_cache_hit() {
   local tmp
   tmp="$(mktemp -d)"
@@ -351,10 +526,365 @@ run_test_cache_hit() {
   assert_file_exists "$summary_file"
   assert_eq "hit" "$(json_get "$summary_file" cache.status)" "summary cache status"
 
+  # The entry links a compressed, content-addressed log; it is decompressed only on request.
+  local cache_dir="$tmp/cache-home/codex-job"
+  local cache_key
+  cache_key="$(extract_kv "$output2" cache_key)"
+  [[ ! -e "$cache_dir/$cache_key/log.txt" ]] || fail "cache entry kept an uncompressed log"
+  assert_eq "1" "$(find "$cache_dir/objects" -type f | wc -l | tr -d ' ')" "log objects"
+  local first_log
+  first_log="$(extract_kv "$output1" log_file)"
+  python3 "$ROOT_DIR/codex-job/scripts/codex_cache.py" log --cache-dir "$cache_dir" "$cache_key" > "$tmp/cached.log"
+  head -n "$(wc -l < "$tmp/cached.log")" "$first_log" | cmp -s - "$tmp/cached.log" || fail "cached log does not match the run log"
+
+  # Entries from before compression (and manifests) keep working; gc moves their plain log
+  # into objects and adds a manifest.
+  local log_file
+  log_file="$(find "$cache_dir/$cache_key" -name 'log.txt.*')"
+  python3 "$ROOT_DIR/codex-job/scripts/codex_cache.py" log --cache-dir "$cache_dir" "$cache_key" > "$cache_dir/$cache_key/log.txt"
+  rm -f "$log_file" "$cache_dir/$cache_key/manifest.json" "$cache_dir"/objects/*/*
+  python3 "$ROOT_DIR/codex-job/scripts/codex_cache.py" gc --cache-dir "$cache_dir" > /dev/null 2> "$tmp/gc.err"
+  rg -n 'logs_compressed=1 ' "$tmp/gc.err" >/dev/null || fail "plain log not compressed: $(cat "$tmp/gc.err")"
+  [[ ! -e "$cache_dir/$cache_key/log.txt" ]] || fail "gc kept an uncompressed log"
+  assert_file_exists "$cache_dir/$cache_key/manifest.json"
+  python3 "$ROOT_DIR/codex-job/scripts/codex_cache.py" log --cache-dir "$cache_dir" "$cache_key" | cmp -s - "$tmp/cached.log" \
+    || fail "compressed legacy log does not round-trip"
+
   rm -rf "$tmp"
   pass "cache hit reuses prior result"
 }
 
+run_test_cache_eviction() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local counter="$tmp/counter.txt"
+  local cache_dir="$tmp/cache-home/codex-job"
+  local cache_tool="$ROOT_DIR/codex-job/scripts/codex_cache.py"
+
+  mkdir -p "$repo" "$log_dir"
+  make_fake_codex "$fake_codex"
+
+  run_cached() {
+    COUNTER_FILE="$counter" XDG_CACHE_HOME="$tmp/cache-home" CODEX_CACHE_MAX_ENTRIES=2 CODEX_PROGRESS_INTERVAL=0 \
+      "$RUNNER" --repo "$repo" --task "$1" --codex-bin "$fake_codex" --log-dir "$log_dir" > "$tmp/out.txt"
+    extract_kv "$tmp/out.txt" cache_status
+  }
+
+  assert_eq "stored" "$(run_cached "Task A")" "A stored"
+  assert_eq "stored" "$(run_cached "Task B")" "B stored"
+  assert_eq "hit" "$(run_cached "Task A")" "A hit refreshes recency"
+  assert_eq "stored" "$(run_cached "Task C")" "C stored"
+  assert_eq "2" "$(ls "$cache_dir" | grep -cE '^[0-9a-f]{64}$')" "entry limit enforced"
+  assert_eq "2" "$(find "$cache_dir/objects" -type f | wc -l | tr -d ' ')" "evicted entry's log object removed"
+  assert_eq "hit" "$(run_cached "Task A")" "recently used entry kept"
+  assert_eq "stored" "$(run_cached "Task B")" "least recently used entry evicted"
+  assert_eq "4" "$(wc -l < "$counter" | tr -d ' ')" "codex invocations"
+
+  # An object no entry links to is left for gc: store and lookup release only the
+  # objects of the entries they remove.
+  local stray="$cache_dir/objects/00/$(printf '0%.0s' {1..64}).gz"
+  mkdir -p "${stray%/*}"
+  printf 'stray\n' > "$stray"
+
+  # Age every entry past the TTL: the next lookup must miss and run Codex again.
+  python3 - "$cache_dir/index.sqlite3" <<'PY'
+import sqlite3
+import sys
+
+conn = sqlite3.connect(sys.argv[1])
+conn.execute("UPDATE entries SET stored_at = stored_at - 7200")
+conn.commit()
+PY
+  assert_eq "stored" "$(CODEX_CACHE_TTL_SECONDS=3600 run_cached "Task A")" "expired entry misses"
+  assert_eq "1" "$(ls "$cache_dir" | grep -cE '^[0-9a-f]{64}$')" "expired entries evicted on store"
+  assert_eq "stored" "$(run_cached "Task D")" "D stored"
+  [[ -f "$stray" ]] || fail "store swept unreferenced objects"
+
+  python3 "$cache_tool" gc --cache-dir "$cache_dir" --max-entries 1 > /dev/null 2> "$tmp/gc.err"
+  rg -n 'cache_entries=1 .*evicted=1 ' "$tmp/gc.err" >/dev/null || fail "unexpected gc report: $(cat "$tmp/gc.err")"
+  assert_eq "1" "$(ls "$cache_dir" | grep -cE '^[0-9a-f]{64}$')" "gc entry limit"
+  [[ ! -e "$stray" ]] || fail "gc kept an unreferenced object"
+  assert_eq "1" "$(find "$cache_dir/objects" -type f | wc -l | tr -d ' ')" "objects left after gc"
+
+  # A current index is opened without re-running the schema script.
+  python3 - "$cache_tool" "$cache_dir" <<'PY' || fail "index schema re-applied on open"
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(sys.argv[1]).resolve().parent))
+import codex_cache
+
+def refuse(conn):
+    raise AssertionError("ensure_schema called")
+
+codex_cache.ensure_schema = refuse
+conn = codex_cache.connect(pathlib.Path(sys.argv[2]))
+assert conn.execute("PRAGMA user_version").fetchone()[0] == codex_cache.INDEX_VERSION
+assert conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 1
+PY
+
+  rm -rf "$tmp"
+  pass "cache LRU eviction, TTL expiry, and gc"
+}
+
+run_test_cache_key_dirty_content() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local counter="$tmp/counter.txt"
+
+  mkdir -p "$repo" "$log_dir"
+  make_fake_codex "$fake_codex"
+  git -C "$repo" init -q
+  printf 'one\n' > "$repo/file.txt"
+  git -C "$repo" add file.txt
+  git -C "$repo" -c user.name=t -c user.email=t@example.com commit -q -m init
+
+  run_cached() {
+    COUNTER_FILE="$counter" XDG_CACHE_HOME="$tmp/cache-home" CODEX_PROGRESS_INTERVAL=0 \
+      "$RUNNER" --repo "$repo" --task "Same task" --codex-bin "$fake_codex" --log-dir "$log_dir" > "$tmp/out.txt"
+    extract_kv "$tmp/out.txt" cache_status
+  }
+
+  assert_eq "dirty=clean" "$(python3 "$ROOT_DIR/codex-job/scripts/repo_fingerprint.py" "$repo" | tail -n 1)" "clean fingerprint"
+  assert_eq "stored" "$(run_cached)" "clean tree stored"
+  printf 'two\n' > "$repo/file.txt"
+  assert_eq "stored" "$(run_cached)" "first dirty state misses"
+  assert_eq "hit" "$(run_cached)" "same dirty state hits"
+  printf 'six\n' > "$repo/file.txt"
+  assert_eq "stored" "$(run_cached)" "different dirty content misses"
+  printf 'two\n' > "$repo/file.txt"
+  assert_eq "hit" "$(run_cached)" "earlier dirty content hits again"
+  git -C "$repo" add file.txt
+  assert_eq "hit" "$(run_cached)" "staging the same content keeps the key"
+  printf 'one\n' > "$repo/file.txt"
+  git -C "$repo" add file.txt
+  touch "$repo/file.txt"
+  printf 'build output\n' > "$repo/untracked.o"
+  assert_eq "hit" "$(run_cached)" "touched and untracked files keep the clean key"
+  assert_eq "3" "$(wc -l < "$counter" | tr -d ' ')" "codex invocations"
+
+  rm -rf "$tmp"
+  pass "cache key tracks dirty content, not just a dirty flag"
+}
+
+run_test_cache_task_normalization() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local counter="$tmp/counter.txt"
+  local ignore_file="$tmp/task-ignore.txt"
+
+  mkdir -p "$repo" "$log_dir"
+  make_fake_codex "$fake_codex"
+  printf '# per-run noise\n^Ticket: .*$\n' > "$ignore_file"
+
+  run_cached() {
+    COUNTER_FILE="$counter" XDG_CACHE_HOME="$tmp/cache-home" CODEX_PROGRESS_INTERVAL=0 \
+      CODEX_CACHE_TASK_IGNORE_FILE="$ignore_file" \
+      "$RUNNER" --repo "$repo" --task "$1" --codex-bin "$fake_codex" --log-dir "$log_dir" > "$tmp/out.txt"
+    printf '%s %s' "$(extract_kv "$tmp/out.txt" cache_status)" "$(extract_kv "$tmp/out.txt" cache_reason)"
+  }
+
+  local preamble=$'## Standing Guardrails (apply to this task)\n- Stay in scope.\n\n---\n\n'
+  assert_eq "stored no_prior_entry" "$(run_cached "Fix the bug")" "first run"
+  assert_eq "hit hit" "$(run_cached "Fix the bug")" "exact hit"
+  assert_eq "hit hit:normalized" "$(run_cached $'Fix the   bug  \r\n\n\n')" "whitespace-only difference hits"
+  assert_eq "hit hit:normalized" "$(run_cached $'Ticket: ABC-42\nFix the bug')" "ignore pattern removes ticket line"
+  assert_eq "stored changed:task" "$(run_cached "Fix the other bug")" "different task misses"
+  assert_eq "stored changed:preamble" "$(run_cached "${preamble}Fix the bug")" "preamble is keyed separately"
+  assert_eq "hit hit:normalized" "$(run_cached "${preamble}Fix  the bug")" "preamble task hits"
+
+  local summary_file
+  summary_file="$(extract_kv "$tmp/out.txt" summary_file)"
+  assert_eq "hit:normalized" "$(json_get "$summary_file" cache.reason)" "summary cache reason"
+  assert_eq "3" "$(wc -l < "$counter" | tr -d ' ')" "codex invocations"
+
+  rm -rf "$tmp"
+  pass "cache keys use canonical task text and report miss reasons"
+}
+
+run_test_cache_single_flight() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex.sh"
+  local slow_codex="$tmp/slow_codex.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local counter="$tmp/counter.txt"
+
+  mkdir -p "$repo" "$log_dir"
+  make_fake_codex "$fake_codex"
+  cat > "$slow_codex" <<SLOW
+#!/usr/bin/env bash
+echo x >> "$tmp/started.txt"
+sleep "\${FAKE_SLEEP:-0}"
+exec "$fake_codex" "\$@"
+SLOW
+  chmod +x "$slow_codex"
+
+  run_cached() {
+    COUNTER_FILE="$counter" XDG_CACHE_HOME="$tmp/cache-home" CODEX_PROGRESS_INTERVAL=0 \
+      "$RUNNER" --repo "$repo" --task "$1" --codex-bin "$slow_codex" --log-dir "$log_dir"
+  }
+  wait_for_invocations() {
+    local i
+    for i in $(seq 1 50); do
+      [[ "$(wc -l < "$tmp/started.txt" 2>/dev/null | tr -d ' ')" == "$1" ]] && return 0
+      sleep 0.1
+    done
+    fail "codex was not invoked $1 time(s)"
+  }
+
+  # A second identical run waits for the first one and reuses its result.
+  FAKE_SLEEP=2 run_cached "Coalesce me" > "$tmp/leader.txt" &
+  local leader=$!
+  wait_for_invocations 1
+  run_cached "Coalesce me" > "$tmp/follower.txt" 2> "$tmp/follower.err"
+  wait "$leader"
+  assert_eq "stored" "$(extract_kv "$tmp/leader.txt" cache_status)" "leader stores"
+  assert_eq "hit" "$(extract_kv "$tmp/follower.txt" cache_status)" "follower hits"
+  assert_eq "hit:coalesced" "$(extract_kv "$tmp/follower.txt" cache_reason)" "follower reason"
+  rg -n 'Waiting up to 1800s for an identical in-flight run' "$tmp/follower.err" >/dev/null || fail "follower did not report waiting"
+  assert_eq "1" "$(wc -l < "$counter" | tr -d ' ')" "one codex run for two identical requests"
+
+  # When the leader dies, its lock is released and the waiting run executes Codex itself.
+  FAKE_SLEEP=5 setsid bash -c "$(declare -f run_cached); RUNNER='$RUNNER' counter='$counter' tmp='$tmp' repo='$repo' log_dir='$log_dir' slow_codex='$slow_codex'; run_cached 'Take me over'" > /dev/null 2>&1 &
+  leader=$!
+  wait_for_invocations 2
+  (sleep 1; kill -9 -- "-$leader" 2>/dev/null) &
+  run_cached "Take me over" > "$tmp/takeover.txt" 2>/dev/null
+  wait "$leader" 2>/dev/null || true
+  assert_eq "stored" "$(extract_kv "$tmp/takeover.txt" cache_status)" "waiting run takes over"
+  assert_eq "3" "$(wc -l < "$tmp/started.txt" | tr -d ' ')" "takeover runs codex"
+  # timeout(1) runs Codex in its own process group, so the dead leader's Codex outlives it.
+  pkill -f "$slow_codex" 2>/dev/null || true
+
+  rm -rf "$tmp"
+  pass "identical concurrent runs coalesce into one codex run"
+}
+
+run_test_cache_publish_atomic() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local counter="$tmp/counter.txt"
+  local cache_dir="$tmp/cache-home/codex-job"
+
+  mkdir -p "$repo" "$log_dir"
+  make_fake_codex "$fake_codex"
+
+  run_cached() {
+    COUNTER_FILE="$counter" XDG_CACHE_HOME="$tmp/cache-home" CODEX_PROGRESS_INTERVAL=0 \
+      "$RUNNER" --repo "$repo" --task "Publish me" --codex-bin "$fake_codex" --log-dir "$log_dir" > "$tmp/out.txt"
+    printf '%s %s' "$(extract_kv "$tmp/out.txt" cache_status)" "$(extract_kv "$tmp/out.txt" cache_reason)"
+  }
+
+  assert_eq "stored no_prior_entry" "$(run_cached)" "first run stores"
+  local cache_key
+  cache_key="$(extract_kv "$tmp/out.txt" cache_key)"
+  assert_file_exists "$cache_dir/$cache_key/manifest.json"
+
+  # A torn write (content no longer matching the manifest) is not served; the next run replaces it.
+  printf '{"v":2,"ok":tr' > "$cache_dir/$cache_key/summary.json"
+  assert_eq "stored incomplete" "$(run_cached)" "corrupt entry misses"
+  assert_eq "hit hit" "$(run_cached)" "replaced entry hits"
+  assert_eq "2" "$(wc -l < "$counter" | tr -d ' ')" "codex invocations"
+
+  # Many writers publishing one key leave exactly one valid entry and no staging debris.
+  python3 - "$ROOT_DIR/codex-job/scripts" "$tmp" <<'PY' || fail "concurrent publish left a bad entry"
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, sys.argv[1])
+import codex_cache
+
+tmp = Path(sys.argv[2])
+cache_dir = tmp / "race-cache"
+key = "ab" * 32
+
+
+def write(n: int) -> bool:
+    src = tmp / f"src{n}"
+    src.mkdir()
+    (src / "summary.json").write_text('{"v":2,"n":%d}\n' % n)
+    (src / "meta.json").write_text("{}\n")
+    (src / "log.txt").write_text("line\n" * (1000 + n))
+    sources = {"summary.json": src / "summary.json", "meta.json": src / "meta.json", "log": src / "log.txt"}
+    return codex_cache.store(cache_dir, key, sources, codex_cache.CacheLimits())
+
+
+with ProcessPoolExecutor(8) as pool:
+    assert all(pool.map(write, range(16)))
+assert codex_cache.entry_complete(cache_dir / key), "published entry is incomplete"
+assert not any((cache_dir / ".staging").iterdir()), "staging debris left behind"
+assert not any((cache_dir / ".trash").glob("*")), "trash debris left behind"
+assert codex_cache.lookup(cache_dir, key, codex_cache.CacheLimits())[0]
+PY
+
+  rm -rf "$tmp"
+  pass "cache entries are published atomically and validated on read"
+}
+
+run_test_cache_stats() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local cache_dir="$tmp/cache-home/codex-job"
+  local cache_tool="$ROOT_DIR/codex-job/scripts/codex_cache.py"
+
+  mkdir -p "$repo" "$log_dir"
+  make_fake_codex "$fake_codex"
+
+  local task
+  for task in "Task A" "Task A" "Task B"; do
+    XDG_CACHE_HOME="$tmp/cache-home" CODEX_PROGRESS_INTERVAL=0 \
+      "$RUNNER" --repo "$repo" --task "$task" --codex-bin "$fake_codex" --log-dir "$log_dir" > /dev/null
+  done
+  assert_eq "miss store hit miss store" "$(python3 -c 'import json, sys; print(" ".join(json.loads(l)["ev"] for l in open(sys.argv[1])))' "$cache_dir/events.jsonl")" "cache events"
+
+  # The hit saved one low-tier run: 1234 input and 56 output tokens at 0.10/0.40 USD per 1k.
+  python3 "$cache_tool" stats --cache-dir "$cache_dir" > "$tmp/stats.txt"
+  rg -n '^lookups=3 hits=1 misses=2 hit_rate=0\.3333 stored=2 stored_bytes=[0-9]+ saved_seconds=[0-9]+ saved_usd=0\.1458 ' "$tmp/stats.txt" >/dev/null \
+    || fail "unexpected stats totals: $(cat "$tmp/stats.txt")"
+  rg -n '^miss_reasons changed:task=1 no_prior_entry=1$' "$tmp/stats.txt" >/dev/null || fail "unexpected miss reasons: $(cat "$tmp/stats.txt")"
+  rg -n '^by=tier tier=low lookups=3 hits=1 ' "$tmp/stats.txt" >/dev/null || fail "missing tier breakdown: $(cat "$tmp/stats.txt")"
+  assert_file_exists "$cache_dir/events.rollup.json"
+
+  # Later calls fold in only the new events; a torn trailing line waits for its newline.
+  printf '{"ev":"hit","repo":"r","tier":"high","model":"gpt-5.3-codex","time":60,"in":1000,"out":1000}\n{"ev":"mi' >> "$cache_dir/events.jsonl"
+  assert_eq "0.1458" "$(python3 "$cache_tool" stats --cache-dir "$cache_dir" --by tier --json | python3 -c 'import json, sys; print(json.load(sys.stdin)["by"]["tier"]["low"]["saved_usd"])')" "low tier savings"
+  python3 "$cache_tool" stats --cache-dir "$cache_dir" --by tier > "$tmp/stats.txt"
+  rg -n '^lookups=4 hits=2 misses=2 .*saved_usd=7\.6458 ' "$tmp/stats.txt" >/dev/null || fail "incremental stats wrong: $(cat "$tmp/stats.txt")"
+
+  # A hit whose log only reported a total is counted as unpriced tokens, not as $0 spend.
+  printf 'ss","repo":"r","tier":"high","model":"gpt-5.3-codex","reason":"no_prior_entry"}\n{"ev":"hit","repo":"r","tier":"high","model":"gpt-5.3-codex","time":5,"in":0,"out":0,"tot":500}\n' >> "$cache_dir/events.jsonl"
+  python3 "$cache_tool" stats --cache-dir "$cache_dir" --by tier > "$tmp/stats.txt"
+  rg -n '^lookups=6 hits=3 misses=3 .*saved_usd=7\.6458 unpriced_tokens=500 ' "$tmp/stats.txt" >/dev/null || fail "total-only hit not reported: $(cat "$tmp/stats.txt")"
+  rg -n '^by=tier tier=low .*saved_usd=0\.1458$' "$tmp/stats.txt" >/dev/null || fail "unpriced tokens leaked into low tier: $(cat "$tmp/stats.txt")"
+
+  rm -rf "$tmp"
+  pass "cache stats report hit rate and savings from the event log"
+}
+
 run_test_no_cache() {
   local tmp
   tmp="$(mktemp -d)"
@@ -399,6 +929,103 @@ run_test_no_cache() {
   pass "--no-cache bypasses cache lookup/store"
 }
 
+run_test_runtime_lost() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local summary="$tmp/lost.summary.json"
+  local output="$tmp/lost.output.txt"
+  local errors="$tmp/lost.stderr.txt"
+
+  mkdir -p "$repo" "$log_dir"
+  cat > "$fake_codex" <<'FAKE'
+#!/usr/bin/env bash
+# Kill the runner's runtime coprocess mid-run (it ignores TERM). This runs in the runner's
+# `| tee` pipeline subshell, so the runner is the grandparent.
+runner_pid="$(ps -o ppid= -p "$PPID" | tr -d ' ')"
+pkill -KILL -P "$runner_pid" -f codex_runtime.py || true
+echo "prompt_tokens: 10"
+FAKE
+  chmod +x "$fake_codex"
+
+  set +e
+  "$RUNNER" \
+    --repo "$repo" \
+    --task "Runtime lost task" \
+    --codex-bin "$fake_codex" \
+    --log-dir "$log_dir" \
+    --no-cache \
+    --json-out "$summary" \
+    > "$output" 2> "$errors"
+  set -e
+
+  assert_file_exists "$summary"
+  assert_eq "Runtime lost task" "$(json_get "$summary" task)" "summary task"
+  assert_eq "10" "$(json_get "$summary" tok.in)" "summary tokens parsed without the coprocess"
+  grep -q "codex runtime is not running" "$errors" || fail "lost runtime was not reported on stderr"
+
+  rm -rf "$tmp"
+  pass "summary is written by a one-shot runtime when the coprocess is gone"
+}
+
+run_test_runtime_unavailable() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local summary="$tmp/unavailable.summary.json"
+  local output="$tmp/unavailable.output.txt"
+  local errors="$tmp/unavailable.stderr.txt"
+  local shim_dir="$tmp/bin"
+
+  mkdir -p "$repo" "$log_dir" "$shim_dir"
+  make_fake_codex "$fake_codex"
+  # The runtime coprocess dies at startup; later one-shot runtimes work unless CRASH_ALWAYS=1.
+  cat > "$shim_dir/python3" <<SHIM
+#!/usr/bin/env bash
+if [[ "\${1:-}" == */codex_runtime.py && ( "\${CRASH_ALWAYS:-0}" == 1 || ! -e "$tmp/crashed" ) ]]; then
+  : > "$tmp/crashed"
+  exit 1
+fi
+exec "$(command -v python3)" "\$@"
+SHIM
+  chmod +x "$shim_dir/python3"
+
+  PATH="$shim_dir:$PATH" "$RUNNER" \
+    --repo "$repo" \
+    --task "Runtime unavailable task" \
+    --codex-bin "$fake_codex" \
+    --log-dir "$log_dir" \
+    --json-out "$summary" \
+    > "$output" 2> "$errors" || fail "run aborted without its runtime coprocess: $(cat "$errors")"
+
+  assert_eq "gpt-5.1-codex-mini" "$(json_get "$summary" mdl)" "model mapped by a one-shot runtime"
+  assert_eq "1234" "$(json_get "$summary" tok.in)" "summary parsed by a one-shot runtime"
+  assert_file_exists "$(extract_kv "$output" meta_file)"
+
+  # With no runtime at all the run still goes ahead on Codex's default model.
+  rm -f "$tmp/crashed"
+  set +e
+  CRASH_ALWAYS=1 PATH="$shim_dir:$PATH" "$RUNNER" \
+    --repo "$repo" \
+    --task "Runtime unavailable task" \
+    --codex-bin "$fake_codex" \
+    --log-dir "$log_dir" \
+    > "$output" 2> "$errors"
+  set -e
+
+  grep -q "could not map tier 'low' to a model" "$errors" || fail "missing tier mapping warning: $(cat "$errors")"
+  grep -q "^fake_codex_model=default$" "$output" || fail "expected no --model without a runtime: $(cat "$output")"
+
+  rm -rf "$tmp"
+  pass "runner falls back to one-shot runtimes and never passes an empty --model"
+}
+
 run_test_summarize_flag() {
   local tmp
   tmp="$(mktemp -d)"
@@ -434,13 +1061,194 @@ run_test_summarize_flag() {
   pass "--summarize emits one-line summary"
 }
 
+run_test_incremental_checkpoint() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local log="$tmp/live.log"
+  local ckpt="$tmp/live.ckpt"
+  local progress="$tmp/live.progress.json"
+  local parser="$ROOT_DIR/codex-job/scripts/parse_codex_run.py"
+
+  printf 'input_tokens: 10\ntokens used\n' > "$log"
+  python3 "$parser" --log "$log" --checkpoint "$ckpt" --progress "$progress"
+  assert_eq "10" "$(json_get "$progress" tok.in)" "first step tok.in"
+  assert_eq "null" "$(json_get "$progress" tok.tot)" "first step tok.tot"
+  assert_eq "false" "$(json_get "$progress" done)" "first step done"
+
+  # A partial line is left for the next step; the pending "tokens used" completes across steps.
+  printf '2,500\noutput_tokens: 4' >> "$log"
+  python3 "$parser" --log "$log" --checkpoint "$ckpt" --progress "$progress"
+  assert_eq "2500" "$(json_get "$progress" tok.tot)" "second step tok.tot"
+  assert_eq "null" "$(json_get "$progress" tok.out)" "partial line deferred"
+  assert_eq "$(( $(wc -c < "$log") - 16 ))" "$(json_get "$ckpt" offset)" "offset at last newline"
+
+  printf '0\ncost: 0.25\n' >> "$log"
+  python3 "$parser" --log "$log" --checkpoint "$ckpt" --progress "$progress"
+  assert_eq "40" "$(json_get "$progress" tok.out)" "third step tok.out"
+  assert_eq "0.25" "$(json_get "$progress" cost.usd)" "third step cost"
+  assert_eq "$(wc -c < "$log")" "$(json_get "$progress" bytes)" "all bytes consumed"
+
+  rm -rf "$tmp"
+  pass "incremental parse resumes from checkpoint offset"
+}
+
+run_test_progress_file() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local output="$tmp/progress.output.txt"
+
+  mkdir -p "$repo" "$log_dir"
+  make_fake_codex "$fake_codex"
+
+  CODEX_PROGRESS_INTERVAL=1 "$RUNNER" \
+    --repo "$repo" \
+    --task "Progress task" \
+    --codex-bin "$fake_codex" \
+    --log-dir "$log_dir" \
+    --no-cache \
+    > "$output"
+
+  local progress_file
+  progress_file="$(extract_kv "$output" progress_file)"
+  assert_file_exists "$progress_file"
+  assert_eq "true" "$(json_get "$progress_file" done)" "progress done"
+  assert_eq "1234" "$(json_get "$progress_file" tok.in)" "progress tok.in"
+  assert_eq "0.12" "$(json_get "$progress_file" cost.usd)" "progress cost.usd"
+  [[ ! -e "${progress_file%.json}.ckpt" ]] || fail "progress checkpoint left behind"
+
+  rm -rf "$tmp"
+  pass "runner keeps progress.json next to meta file"
+}
+
+run_test_batch_reparse() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local parser="$ROOT_DIR/codex-job/scripts/parse_codex_run.py"
+
+  mkdir -p "$repo" "$log_dir"
+  make_fake_codex "$fake_codex"
+
+  local task
+  for task in "Batch one" "Batch two" "Batch three"; do
+    CODEX_PROGRESS_INTERVAL=0 "$RUNNER" --repo "$repo" --task "$task" --codex-bin "$fake_codex" \
+      --log-dir "$log_dir" --no-cache > /dev/null
+  done
+
+  python3 "$parser" batch "$log_dir" --jobs 2 --out "$tmp/all.jsonl" 2> "$tmp/batch.err"
+  assert_eq "3" "$(wc -l < "$tmp/all.jsonl" | tr -d ' ')" "batch jsonl lines"
+  rg -n 'parsed=3 .*runs_per_sec=' "$tmp/batch.err" >/dev/null || fail "missing batch throughput report"
+  python3 - "$tmp/all.jsonl" <<'PY' || fail "batch summaries missing token totals"
+import json
+import sys
+
+with open(sys.argv[1], encoding="utf-8") as f:
+    rows = [json.loads(line) for line in f]
+assert sorted(row["task"] for row in rows) == ["Batch one", "Batch three", "Batch two"]
+assert all(row["tok"]["tot"] == 1290 for row in rows)
+PY
+
+  # Resume: a state file listing one finished log leaves only the other two to parse.
+  ls "$log_dir"/codex-run-*.log | head -n1 > "$tmp/state"
+  python3 "$parser" batch "$log_dir" --in-place --state "$tmp/state" 2> "$tmp/resume.err"
+  rg -n 'parsed=2 skipped=1 failed=0' "$tmp/resume.err" >/dev/null || fail "resume did not skip finished run"
+  assert_eq "3" "$(wc -l < "$tmp/state" | tr -d ' ')" "state records every run"
+
+  local summary
+  for summary in "$log_dir"/codex-run-*.summary.json; do
+    assert_eq "1234" "$(json_get "$summary" tok.in)" "in-place tok.in"
+  done
+
+  rm -rf "$tmp"
+  pass "batch re-parse with pool, JSONL output, and resume"
+}
+
+run_test_json_events() {
+  local tmp
+  tmp="$(mktemp -d)"
+
+  local fake_codex="$tmp/fake_codex_json.sh"
+  local repo="$tmp/repo"
+  local log_dir="$tmp/runs"
+  local summary="$tmp/json.summary.json"
+  local output="$tmp/json.output.txt"
+
+  mkdir -p "$repo" "$log_dir"
+  cat > "$fake_codex" <<'FAKE'
+#!/usr/bin/env bash
+set -euo pipefail
+json=0
+for arg in "$@"; do
+  [[ "$arg" == "--json" ]] && json=1
+done
+[[ "$json" -eq 1 ]] || { echo "expected --json" >&2; exit 64; }
+echo '{"type":"thread.started","thread_id":"0199a213-81c0-7800-8aa1-bbab2a035a53"}'
+echo '{"type":"item.completed","item":{"id":"item_0","type":"agent_message","text":"input_tokens: 1"}}'
+echo '{"id":"1","msg":{"type":"token_count","info":{"total_token_usage":{"input_tokens":900,"cached_input_tokens":100,"output_tokens":40,"reasoning_output_tokens":12,"total_tokens":940}}}}'
+echo '{"type":"turn.completed","usage":{"input_tokens":24763,"cached_input_tokens":24448,"output_tokens":122,"reasoning_output_tokens":64,"total_tokens":24885}}'
+FAKE
+  chmod +x "$fake_codex"
+
+  CODEX_PROGRESS_INTERVAL=0 "$RUNNER" \
+    --repo "$repo" \
+    --task "Json task" \
+    --codex-bin "$fake_codex" \
+    --log-dir "$log_dir" \
+    --json-out "$summary" \
+    --json-events \
+    --no-cache \
+    > "$output"
+
+  assert_eq "24763" "$(json_get "$summary" tok.in)" "event tok.in"
+  assert_eq "122" "$(json_get "$summary" tok.out)" "event tok.out"
+  assert_eq "24885" "$(json_get "$summary" tok.tot)" "event tok.tot"
+  assert_eq "24448" "$(json_get "$summary" tok.cached)" "event tok.cached"
+  assert_eq "64" "$(json_get "$summary" tok.reason)" "event tok.reason"
+  assert_eq "turn.completed" "$(json_get "$summary" tok.ev.in.evt)" "event evidence"
+  assert_eq "0199a213-81c0-7800-8aa1-bbab2a035a53" "$(json_get "$summary" sid)" "thread id as session id"
+  assert_eq "jsonl" "$(json_get "$(extract_kv "$output" meta_file)" log_format)" "meta log_format"
+
+  # A JSONL log without usage events falls back to the text patterns.
+  local log="$tmp/plain.log"
+  printf '{"type":"thread.started","thread_id":"t-1"}\nprompt_tokens: 7\ncompletion_tokens: 3\n' > "$log"
+  python3 "$ROOT_DIR/codex-job/scripts/parse_codex_run.py" --log "$log" --format jsonl > "$summary"
+  assert_eq "7" "$(json_get "$summary" tok.in)" "regex fallback tok.in"
+  assert_eq "10" "$(json_get "$summary" tok.tot)" "regex fallback tok.tot"
+
+  rm -rf "$tmp"
+  pass "--json-events parses exact token counts from codex events"
+}
+
 main() {
   run_test_basic
   run_test_advanced_options
   run_test_tier_mapping
   run_test_tokens_used_line
+  run_test_last_match_wins
+  run_test_large_log_tail_scan
+  run_test_incremental_checkpoint
+  run_test_progress_file
+  run_test_batch_reparse
+  run_test_json_events
+  run_test_summary_v2_migrate
   run_test_cache_hit
+  run_test_cache_eviction
+  run_test_cache_key_dirty_content
+  run_test_cache_task_normalization
+  run_test_cache_single_flight
+  run_test_cache_publish_atomic
+  run_test_cache_stats
   run_test_no_cache
+  run_test_runtime_lost
+  run_test_runtime_unavailable
   run_test_summarize_flag
   echo "All tests passed."
 }